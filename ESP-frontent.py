@@ -1,11 +1,14 @@
 """Web frontend on WIFI-Acces Point of home WIFI."""
 
-try: 
-    import usocket as socket
-except:
-    import socket
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 
 import network
+import web_server # from /lib, like the modules web_page imports
+import web_page
+import web_events
 
 import esp
 esp.osdebug(None)
@@ -31,40 +34,21 @@ while ap.active() == False:
 print("Connection successful")
 print(ap.ifconfig())
 
-class WebPage():
-    """A framework for webpages"""
-    def __init__(self,heading:str,rows:int,columns:int) -> None:
-        """Create first html"""
-        self.heading=heading
-        self.rows=rows
-        self.columns=columns
-        self.html:str=''
-
-    def create_html(self):
-        html="""
-        <html>
-            <head>
-            <meta name="viewport", content="width=device-width, initial-scale=1">
-            </head>
-            <body>
-                <h1>"""+self.heading+"""</h1>
-            </body>
-        </html>"""
-        self.html=html
-        return html
-
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.bind(('',80))
-s.listen(5)
-
-while True:
-    conn, addr = s.accept()
-    print("Got a connection from %s" % str(addr))
-    request=conn.recv(1024)
-    print("Content = %s" % str(request))
-    Page=WebPage("Test Page",2,2)
-    response=Page.create_html()
-    conn.send(response)
-    print("Response sent.")
-    conn.close()
-    print("Connection closed")
+async def housekeeping():
+    """Runs next to the connection tasks, the server only uses the CPU while a request is handled."""
+    while True:
+        await asyncio.sleep(10)
+        gc.collect()
+
+async def main():
+    asyncio.create_task(housekeeping())
+    await Server.serve(port=80)
+
+Feed=web_events.EventFeed(max_clients=2) # add values with Feed.add_sensor(), Feed.add_report() and Feed.add_alarms()
+Page=web_page.WebPage("Test Page",0,0,live_url="/events") # values are shown by the live table
+Cache=web_page.PageCache()
+Server=web_server.WebServer(max_connections=4)
+Server.route("/",lambda request: Cache.response(Page))
+Server.route("/events",Feed.handler,("GET",))
+Server.route_prefix("/static/",web_page.StaticFiles("/static/","static"))
+asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Boot time and memory of a small node, eager imports against the lazy device registry.
+    python3 benchmarks/bench_boot.py
+Each variant boots a bilge-only node in a fresh interpreter on the simulated hardware:
+  eager: imports systems, sensors and actuators like the former node.py, then sets up the compartment
+  lazy:  node.Node from a setup file, importing only the modules the setup references
+Reports wall time, memory kept by rctools code after the boot (tracemalloc) and the rctools modules loaded.
+On the board, node.Node().get_profile() reports time and gc.mem_free() deltas per import instead.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+
+SETUP = {"ship_name": "Bilge node", "ship_length": 30,
+         "systems": {"watertight_compartments": [["Bow compartment", 27, 25], ["Aft compartment", 28, 22]]}}
+
+BOOT = """
+import sys, time, tracemalloc, json, io, contextlib
+sys.path.insert(0, {base!r} + "/sim")
+sys.path.append({base!r})
+sys.path.append({base!r} + "/lib")
+import machine, utime, micropython, binascii, gc, json, array, math, struct  # the platform, not part of the measurement
+import importlib.util
+importlib.util.find_spec("warm_up_the_path_finders")
+before = set(sys.modules)
+if {trace!r}:
+    tracemalloc.start()
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    if {variant!r} == "eager":
+        import systems, sensors, actuators
+        import boot_plan
+        for step in boot_plan.load({setup!r}):
+            if step[0] == boot_plan.STEP_COMPARTMENT:
+                systems.BilgeSystem(step[1], step[2], step[3])
+    else:
+        import node
+        node.Node({setup!r})
+elapsed = time.perf_counter() - start
+import os
+allocated = 0
+if {trace!r}:
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, os.path.abspath({base!r}) + "/*")])
+    tracemalloc.stop()
+    allocated = sum(stat.size for stat in snapshot.statistics("filename") if "/sim/" not in str(stat.traceback))
+local = sorted(m for m in set(sys.modules) - before if getattr(sys.modules[m], "__file__", None) and
+               os.path.abspath(sys.modules[m].__file__).startswith(os.path.abspath({base!r})) and "/sim/" not in sys.modules[m].__file__)
+print(json.dumps({{"boot [ms]": round(elapsed * 1000, 2), "allocated [bytes]": allocated, "modules": local}}))
+"""
+
+
+def run_boot(variant: str, setup_file: str, trace: bool) -> dict:
+    code = BOOT.format(base=BASE, variant=variant, setup=setup_file, trace=trace)
+    return json.loads(subprocess.check_output([sys.executable, "-c", code]))
+
+
+def boot(variant: str, setup_file: str, repeats: int = 7) -> dict:
+    """Best boot time of repeats runs, memory from a separate traced run as tracing slows down the boot."""
+    result = run_boot(variant, setup_file, True)
+    result["boot [ms]"] = min(run_boot(variant, setup_file, False)["boot [ms]"] for _ in range(repeats))
+    return result
+
+
+if __name__ == "__main__":
+    folder = tempfile.mkdtemp()
+    setup_file = folder + "/setup.json"
+    with open(setup_file, "w") as f:
+        json.dump(SETUP, f)
+    results = {variant: boot(variant, setup_file) for variant in ("eager", "lazy")}
+    print(json.dumps(results, indent=2))
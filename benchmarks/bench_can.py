@@ -0,0 +1,121 @@
+"""Throughput of the CAN message layer and bus utilisation of a typical node, on the simulated hardware.
+    python3 benchmarks/bench_can.py
+Encoding is timed for pack() alone and for MessageEndpoint.send_value over a LoopbackBus, decoding
+for MessageEndpoint.poll including the handler call. The traffic model sends sensor values,
+actuator commands and alarms at their rates for 10 s and reports frames and load per message class.
+The telemetry comparison runs 12 sensors (two of them moving) for a virtual minute, once with a
+frame and callback per sensor and period, once with the node TelemetryPublisher.
+"""
+import os
+import sys
+import time
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+sys.path.insert(0, BASE + "/sim")
+sys.path.append(BASE)
+sys.path.append(BASE + "/lib")
+
+import math
+
+import can_messages
+import machine
+import utime
+
+# message class: (signals, messages per second and signal)
+TRAFFIC = {
+    can_messages.MSG_VALUE: (12, 10),  # sensors of all nodes at 10 Hz
+    can_messages.MSG_COMMAND: (6, 20),  # actuator set points from the receiver node
+    can_messages.MSG_ALARM: (2, 0.5),
+}
+CLASS_NAMES = {can_messages.MSG_ALARM: 'alarm', can_messages.MSG_COMMAND: 'command', can_messages.MSG_VALUE: 'value'}
+
+
+def per_second(func, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed > 0 else 0
+
+
+def throughput(count: int = 20000) -> dict:
+    bus = can_messages.LoopbackBus()
+    registry = can_messages.MessageRegistry()
+    signal = registry.add_signal(1, "Rudder", "deg", scale=100)
+    sender = can_messages.MessageEndpoint(1, bus.transport(), registry)
+    receiver = can_messages.MessageEndpoint(2, bus.transport(count), registry)
+    received = [0]
+
+    def handler(signal, code, value):
+        received[0] += 1
+    receiver.add_handler(can_messages.MSG_VALUE, handler)
+    buffer = bytearray(can_messages.FRAME_LEN)
+    results = {}
+    results['pack [frames/s]'] = int(per_second(lambda: can_messages.pack(buffer, 3, 0, -12345, 678), count))
+    results['unpack [frames/s]'] = int(per_second(lambda: can_messages.unpack(buffer), count))
+    results['send_value [frames/s]'] = int(per_second(lambda: sender.send_value(signal, 12.34), count))
+    start = time.perf_counter()
+    handled = receiver.poll()
+    elapsed = time.perf_counter() - start
+    assert handled == count and received[0] == count
+    results['poll [frames/s]'] = int(handled / elapsed) if elapsed > 0 else 0
+    return results
+
+
+def utilisation(seconds: int = 10, bitrates=(125000, 250000, 500000)) -> dict:
+    bus = can_messages.LoopbackBus()
+    registry = can_messages.MessageRegistry()
+    endpoint = can_messages.MessageEndpoint(1, bus.transport(), registry)
+    signals = {}
+    for message_class in TRAFFIC:
+        count = TRAFFIC[message_class][0]
+        signals[message_class] = [registry.add_signal(1, CLASS_NAMES[message_class] + str(n)) for n in range(count)]
+    for message_class in TRAFFIC:
+        count, rate = TRAFFIC[message_class]
+        for _ in range(int(rate * seconds)):
+            for signal in signals[message_class]:
+                endpoint.send_raw(message_class, 1, signal.channel, 0, 1000)
+    results = {}
+    for bitrate in bitrates:
+        bus.bitrate = bitrate
+        report = bus.get_report(seconds)
+        loads = {}
+        for message_class in TRAFFIC:
+            loads[CLASS_NAMES[message_class] + ' [%]'] = round(report[message_class]['Load [%]'], 2)
+        loads['total [%]'] = round(report['Load [%]'], 2)
+        results[str(bitrate // 1000) + ' kbit/s'] = loads
+    return results
+
+
+def telemetry(sensor_count: int = 12, seconds: int = 60, period: int = 100) -> dict:
+    import sensors
+    import telemetry
+    machine.reset()
+    bus = can_messages.LoopbackBus()
+    registry = can_messages.MessageRegistry()
+    publisher = telemetry.TelemetryPublisher(can_messages.MessageEndpoint(1, bus.transport(), registry), period, 10)
+    for n in range(sensor_count):
+        pin = 100 + n
+        moving = n < 2
+        machine.script_adc(pin, lambda t, moving=moving: 32768 + (30000 * math.sin(t / 10) if moving else 0) + (t * 977) % 200)
+        sensor = sensors.int_Potentiometer(pin, "Sensor " + str(n), "%")
+        sensor.set_limits(0, 1000)
+        sensor.min_raw_value = 0
+        sensor.max_raw_value = 65535
+        sensor.start_reading()
+        publisher.add_sensor(sensor, deadband=2)
+    publisher.start()
+    utime.sleep(seconds)
+    cycles = publisher.cycles
+    results = {}
+    results['per sensor broadcast'] = {'callbacks': cycles * sensor_count, 'frames': cycles * sensor_count,
+                                       'bus load [%]': round(100 * cycles * sensor_count * can_messages.frame_bits() / (bus.bitrate * seconds), 2)}
+    results['telemetry publisher'] = {'callbacks': cycles, 'frames': publisher.frames_sent,
+                                      'bus load [%]': round(bus.get_report(seconds)['Load [%]'], 2)}
+    results['report'] = publisher.get_report()
+    return results
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps({'throughput': throughput(), 'bus load': utilisation(), 'telemetry': telemetry()}, indent=2))
@@ -0,0 +1,169 @@
+"""Live telemetry push of the web frontend (Server-Sent Events) against a simulated node, on the host.
+    python3 benchmarks/bench_events.py [--seconds 3]
+The virtual clock of sim/ follows the real time in an event loop task: three sensors are read at 20 Hz
+by the node scheduler, an SBUS frame arrives every 10 ms, alarms are dispatched to the feed. The
+WebServer with an EventFeed runs in the same event loop on 127.0.0.1. Clients:
+  fast:     /events?interval=200
+  default:  /events (1000 ms)
+  over cap: a third stream, answered with 503 (max_clients=2)
+  page:     the page loaded while both streams are connected
+Reported per stream: events, values and bytes received and the shortest time between two updates,
+for the feed: changed values found by reading the sources against values sent (coalescing).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+sys.path.insert(0, BASE + "/sim")
+sys.path.append(BASE)
+sys.path.append(BASE + "/lib")
+
+import machine
+from clock import clock
+from sbus_replay import encode_frame
+
+import general
+import sbus_receiver
+import sensors
+import web_events
+import web_page
+import web_server
+
+READ_FREQUENCY = 20  # [Hz] of the sensors
+
+
+def setup_node() -> tuple:
+    """Sensors and SBUS receiver of the simulated node."""
+    machine.script_adc(26, lambda t: 32768 + 30000 * math.sin(t * math.pi))
+    machine.script_adc(27, lambda t: (t * 4000) % 65535)
+    machine.script_adc(28, lambda t: 32768 + 32000 * math.sin(t * math.pi / 2))
+    rudder = sensors.Potentiometer(26, "Rudder", "deg", read_frequency=READ_FREQUENCY)
+    rudder.set_calibration_points([(0, -45), (65535, 45)])
+    throttle = sensors.int_Potentiometer(27, "Throttle", "%", read_frequency=READ_FREQUENCY)
+    throttle.set_calibration_points([(0, 0), (65535, 100)])
+    pressure = sensors.Potentiometer(28, "Oil pressure", "bar", read_frequency=READ_FREQUENCY, queue_length=10)
+    pressure.set_calibration_points([(0, 0), (65535, 6)])
+    pressure.set_max_alarm(5)
+    for sensor in (rudder, throttle, pressure):
+        sensor.start_reading()
+    receiver = sbus_receiver.SBUSReceiver(0)
+    return (rudder, throttle, pressure), receiver
+
+
+async def run_node(receiver, stop: asyncio.Event) -> None:
+    """Advances the virtual clock with the real time, feeds SBUS frames and dispatches alarms."""
+    start = time.perf_counter()
+    frame = 0
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        clock.run_until(int((time.perf_counter() - start) * 1000000))
+        frame += 1
+        receiver.sbus.rx.extend(encode_frame([992 + frame % 200] * 16))
+        if frame % 50 == 0:
+            receiver.sbus.rx.extend(b"\x55\x55")  # noise on the line, the receiver resynchronises
+        receiver.get_new_data()
+        general.alarm_events.dispatch()
+
+
+async def sse_client(port: int, path: str, seconds: float) -> dict:
+    """Reads the event stream at path for seconds."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(("GET " + path + " HTTP/1.1\r\nHost: frontend\r\nAccept: text/event-stream\r\n\r\n").encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    result = {"status": int(head.split()[1])}
+    if result["status"] != 200:
+        writer.close()
+        return result
+    events = {}
+    values = 0
+    received = len(head)
+    gaps = []
+    last = None
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        try:
+            block = await asyncio.wait_for(reader.readuntil(b"\n\n"), end - time.perf_counter())
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            break
+        received += len(block)
+        event = data = ""
+        for line in block.decode().split("\n"):
+            name, _, value = line.partition(": ")
+            if name == "event":
+                event = value
+            elif name == "data":
+                data = value
+        if not event:
+            continue  # retry field or comment
+        events[event] = events.get(event, 0) + 1
+        if event == "values":
+            values += len(json.loads(data))
+            now = time.perf_counter()
+            if last is not None:
+                gaps.append(now - last)
+            last = now
+    writer.close()
+    result.update({"events": events, "values": values, "bytes": received,
+                   "shortest gap [ms]": round(min(gaps, default=0) * 1000)})
+    return result
+
+
+async def get_page(port: int) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET / HTTP/1.1\r\nHost: frontend\r\nConnection: close\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    return {"status": int(response.split()[1]), "bytes": len(response)}
+
+
+async def bench(seconds: float) -> dict:
+    node_sensors, receiver = setup_node()
+    feed = web_events.EventFeed(max_clients=2, period=100)
+    for sensor in node_sensors[:2]:
+        feed.add_sensor(sensor, deadband=0.5)
+    feed.add_sensor(node_sensors[2], average=True, deadband=0.05)
+    feed.add_report("SBUS", receiver.get_rx_report)
+    feed.add_alarms(general.alarm_events)
+    page = web_page.WebPage("Engine room", 0, 0, live_url="/events")
+    cache = web_page.PageCache(max_ram_size=4096)
+    server = web_server.WebServer(max_connections=4)
+    server.route("/", lambda request: cache.response(page))
+    server.route("/events", feed.handler, ("GET",))
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    stop = asyncio.Event()
+    node = asyncio.create_task(run_node(receiver, stop))
+    streams = [asyncio.create_task(sse_client(port, "/events?interval=200", seconds)),
+               asyncio.create_task(sse_client(port, "/events", seconds))]
+    await asyncio.sleep(0.2)
+    over_cap = await sse_client(port, "/events", 0.1)
+    page_result = await get_page(port)
+    fast, default = await asyncio.gather(*streams)
+    feed.close()
+    server.stop()
+    stop.set()
+    await node
+    for _ in range(100):
+        if not server.active:
+            break
+        await asyncio.sleep(0.05)
+    return {"fast (200 ms)": fast, "default (1000 ms)": default, "over cap": over_cap, "page": page_result,
+            "sensor readings": round(len(node_sensors) * READ_FREQUENCY * clock.now_us / 1000000),
+            "feed": feed.get_report(), "alarms": general.alarm_events.get_report(),
+            "sbus": receiver.get_rx_report(), "server": server.get_report()}
+
+
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Live telemetry push of the web frontend.")
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(bench(args.seconds)), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
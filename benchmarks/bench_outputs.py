@@ -0,0 +1,73 @@
+"""I2C traffic of lights on a PCA9685 PWM expander, written at once against the output bank flush.
+    python3 benchmarks/bench_outputs.py
+16 lights on one expander (simulated I2C bus at 400 kHz) run a virtual minute of navigation: a dimming
+group fades all lights every 2 s and the signal groups switch every 5 s. Per variant:
+  immediate: every changed duty is written with its own I2C transaction, as a direct PWMOut write would
+  bank:      the dirty channels are written at the end of every scheduler tick, runs of channels coalesced
+Reports I2C transactions, bytes and bus time, and checks that the expander registers end up equal.
+"""
+import json
+import os
+import sys
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+sys.path.insert(0, BASE + "/sim")
+sys.path.append(BASE)
+sys.path.append(BASE + "/lib")
+
+import machine
+import utime
+
+ADDRESS = 0x40
+SECONDS = 60
+
+
+def run(variant: str) -> dict:
+    machine.reset()
+    machine.attach_i2c(ADDRESS)
+    import actuators
+    import dimming
+    import output_bank
+    import scheduler
+    scheduler._scheduler = None
+    dimming._fader = None
+    bank = output_bank.OutputBank()
+    if variant == "immediate":
+        set_duty = bank.set_duty
+
+        def write_at_once(channel, duty):
+            changed = set_duty(channel, duty)
+            bank.flush()
+            return changed
+        bank.set_duty = write_at_once
+    i2c = machine.I2C(0, freq=400000)
+    expander = output_bank.PCA9685(i2c, ADDRESS)
+    first = bank.add_expander(expander)
+    i2c.reset_counters()
+    lights = [actuators.Light(0, "Light " + str(n), bank=bank, channel=first + n) for n in range(16)]
+    group = dimming.DimmingGroup("Lights")
+    for light in lights:
+        group.add_light(light)
+    for second in range(SECONDS):
+        if second % 2 == 0:
+            group.set_target(255 if second % 4 else 60, 500)
+        if second % 5 == 0:
+            # signal groups: all on, then only every other light
+            for n, light in enumerate(lights):
+                if second % 10 == 0 or n % 2 == 0:
+                    light.switch_on()
+                else:
+                    light.switch_off()
+        utime.sleep(1)
+    bank.flush()
+    return {"I2C transactions": i2c.transactions, "I2C bytes": i2c.bytes,
+            "bus time [ms]": round(i2c.bus_us / 1000, 1), "channel writes": expander.writes,
+            "registers": bytes(machine.i2c_memory(ADDRESS)[0x06:0x46]).hex()}
+
+
+if __name__ == "__main__":
+    results = {variant: run(variant) for variant in ("immediate", "bank")}
+    equal = results["immediate"].pop("registers") == results["bank"].pop("registers")
+    results["registers equal"] = equal
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if equal else 1)
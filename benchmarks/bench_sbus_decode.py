@@ -0,0 +1,114 @@
+"""Benchmark and equivalence check for the SBUS channel decoding.
+Compares the table free shift and mask decoder in sbus_frame.py against the former bit by bit loop
+of SBUSReceiver.decode_frame. Runs on CPython and MicroPython:
+    python3 benchmarks/bench_sbus_decode.py
+    mpremote run benchmarks/bench_sbus_decode.py (with sbus_frame.py copied to the board)
+"""
+import sys
+import array
+import random
+
+sys.path.append(".")
+sys.path.append("..")
+import sbus_frame
+
+try:
+    from utime import ticks_us, ticks_diff
+except ImportError:
+    import time
+
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+
+def reference_decode(frame, channels):
+    """The former bit by bit decoder (fixed to 176 bits, the old loop skipped the MSB of channel 16)."""
+    for i in range(0, 16):
+        channels[i] = 0
+    byte_in_sbus = 1
+    bit_in_sbus = 0
+    ch = 0
+    bit_in_channel = 0
+    for i in range(0, 176):
+        if frame[byte_in_sbus] & (1 << bit_in_sbus):
+            channels[ch] |= (1 << bit_in_channel)
+        bit_in_sbus += 1
+        bit_in_channel += 1
+        if bit_in_sbus == 8:
+            bit_in_sbus = 0
+            byte_in_sbus += 1
+        if bit_in_channel == 11:
+            bit_in_channel = 0
+            ch += 1
+    channels[16] = 1 if frame[23] & 1 else 0
+    channels[17] = 1 if frame[23] & 2 else 0
+
+
+def random_frame():
+    frame = bytearray(sbus_frame.SBUS_FRAME_LEN)
+    for i in range(1, 24):
+        frame[i] = random.getrandbits(8)
+    frame[0] = sbus_frame.SBUS_START_BYTE
+    frame[24] = sbus_frame.SBUS_END_BYTE
+    return frame
+
+
+def check_equivalence(count=5000):
+    """Raises AssertionError on the first frame that decodes differently."""
+    random.seed(1)
+    frames = [random_frame() for _ in range(count)]
+    for fill in (0x00, 0xFF, 0x55, 0xAA):
+        frame = bytearray([fill] * sbus_frame.SBUS_FRAME_LEN)
+        frame[0] = sbus_frame.SBUS_START_BYTE
+        frame[24] = sbus_frame.SBUS_END_BYTE
+        frames.append(frame)
+    expected = array.array('H', [0] * sbus_frame.SBUS_NUM_CHAN)
+    result = array.array('H', [0xFFFF] * sbus_frame.SBUS_NUM_CHAN)
+    for frame in frames:
+        reference_decode(frame, expected)
+        sbus_frame.decode_channels(frame, result)
+        assert result == expected, "Mismatch for frame " + str(bytes(frame))
+    # Bulk decoding has to match the single frame decoder, also out of a memoryview.
+    buffer = bytearray(b"".join(frames))
+    bulk = array.array('H', [0] * (len(frames) * sbus_frame.SBUS_NUM_CHAN))
+    assert sbus_frame.decode_frames(memoryview(buffer), bulk) == len(frames)
+    for n, frame in enumerate(frames):
+        reference_decode(frame, expected)
+        assert bulk[n * sbus_frame.SBUS_NUM_CHAN:(n + 1) * sbus_frame.SBUS_NUM_CHAN] == expected
+    return len(frames)
+
+
+def frames_per_second(decode, frames, channels):
+    start = ticks_us()
+    for frame in frames:
+        decode(frame, channels)
+    elapsed = ticks_diff(ticks_us(), start)
+    return len(frames) * 1000000 / max(elapsed, 1)
+
+
+def run(count=2000):
+    random.seed(2)
+    frames = [random_frame() for _ in range(count)]
+    channels = array.array('H', [0] * sbus_frame.SBUS_NUM_CHAN)
+    results = {}
+    results['bit loop'] = frames_per_second(reference_decode, frames, channels)
+    results['shift and mask'] = frames_per_second(sbus_frame.decode_channels, frames, channels)
+    buffer = bytearray(b"".join(frames))
+    bulk = array.array('H', [0] * (count * sbus_frame.SBUS_NUM_CHAN))
+    start = ticks_us()
+    sbus_frame.decode_frames(buffer, bulk)
+    elapsed = ticks_diff(ticks_us(), start)
+    results['bulk decode_frames'] = count * 1000000 / max(elapsed, 1)
+    return results
+
+
+if __name__ == "__main__":
+    checked = check_equivalence()
+    print("Equivalence check passed for " + str(checked) + " frames.")
+    results = run()
+    base = results['bit loop']
+    for name in results:
+        print("%-20s %10.0f frames/s  x%.1f" % (name, results[name], results[name] / base))
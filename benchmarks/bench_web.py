@@ -0,0 +1,214 @@
+"""Load test of the frontend web server on the host: requests per second and latency percentiles.
+    python3 benchmarks/bench_web.py [--seconds 2] [--clients 8]
+The server runs in its own thread and event loop on 127.0.0.1, the clients send GET requests as
+fast as the answers arrive. Scenarios:
+  async:              lib/web_server.WebServer, keep-alive connections
+  async, slow client: the same with one more client that connects and stays silent (a phone joining the WiFi)
+  blocking:           the former accept/recv(1024)/send/close loop, one connection per request
+  blocking, slow client
+  pool limit:         more simultaneous connections than max_connections, the surplus gets 503
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+sys.path.append(BASE + "/lib")
+
+import web_server
+
+PAGE = "<html><head><meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"></head>" \
+       "<body><h1>Test Page</h1></body></html>"
+REQUEST = b"GET / HTTP/1.1\r\nHost: frontend\r\nUser-Agent: bench\r\n\r\n"
+SLOW_CLIENT_DELAY = 1.0  # [s] before the slow client sends its request
+
+
+def start_async_server(max_connections: int = 16) -> tuple:
+    """Runs a WebServer in a thread, returns (port, server, stop function)."""
+    server = web_server.WebServer(max_connections=max_connections)
+    server.route("/", lambda request: PAGE)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    port = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        listener = loop.run_until_complete(server.start("127.0.0.1", 0))
+        port.append(listener.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    async def shutdown():
+        server.stop()
+        for _ in range(100):
+            if not server.active:
+                break
+            await asyncio.sleep(0.01)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    return port[0], server, stop
+
+
+def start_blocking_server() -> tuple:
+    """The former ESP-frontent.py loop, serving one connection at a time."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    running = [True]
+
+    def run():
+        while running[0]:
+            try:
+                conn, addr = listener.accept()
+            except OSError:
+                break
+            conn.recv(1024)
+            conn.send(("HTTP/1.1 200 OK\r\nContent-Length: " + str(len(PAGE)) + "\r\n\r\n" + PAGE).encode())
+            conn.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    def stop():
+        running[0] = False
+        listener.close()
+    return listener.getsockname()[1], None, stop
+
+
+async def read_response(reader) -> tuple:
+    """Reads one response, returns its status and whether the server closes the connection."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    close = True
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "connection":
+            close = value.strip().lower() == "close"
+    await reader.readexactly(length)
+    return status, close
+
+
+async def client(port: int, end: float, keep_alive: bool, latencies: list, errors: list, delay: float) -> None:
+    reader = writer = None
+    await asyncio.sleep(delay)  # connect one after the other, a full listen backlog costs a 1 s SYN retry
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(REQUEST)
+            await writer.drain()
+            status, close = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append(0)
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+        if close or not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(port: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await asyncio.sleep(SLOW_CLIENT_DELAY)
+    writer.write(REQUEST)
+    await writer.drain()
+    try:
+        await asyncio.wait_for(read_response(reader), 5)
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        pass
+    writer.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def load(port: int, seconds: float, clients: int, keep_alive: bool, slow: bool) -> dict:
+    latencies = []
+    errors = []
+    end = time.perf_counter() + seconds
+    tasks = [client(port, end, keep_alive, latencies, errors, 0.005 * i) for i in range(clients)]
+    if slow:
+        tasks.append(slow_client(port))
+        await asyncio.sleep(0.05)  # the slow client connects first
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return {"requests": len(latencies), "req/s": int(len(latencies) / elapsed),
+            "p50 [ms]": round(percentile(latencies, 0.5) * 1000, 2),
+            "p99 [ms]": round(percentile(latencies, 0.99) * 1000, 2),
+            "max [ms]": round(max(latencies, default=0) * 1000, 2),
+            "stalled (>100 ms)": sum(1 for latency in latencies if latency > 0.1), "errors": len(errors)}
+
+
+def scenario(start_server, seconds: float, clients: int, keep_alive: bool, slow: bool) -> dict:
+    port, server, stop = start_server()
+    result = asyncio.run(load(port, seconds, clients, keep_alive, slow))
+    stop()  # waits for the connection handlers to close
+    if server is not None:
+        result["server"] = server.get_report()
+    return result
+
+
+async def pool_limit(port: int, connections: int) -> dict:
+    """Opens connections at once, all sending one request."""
+    async def one():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await asyncio.sleep(0.2)  # hold the connection while the others connect
+        writer.write(REQUEST)
+        await writer.drain()
+        try:
+            return (await read_response(reader))[0]
+        except (OSError, asyncio.IncompleteReadError):
+            return 0
+        finally:
+            writer.close()
+    statuses = await asyncio.gather(*[one() for _ in range(connections)])
+    return {str(status): statuses.count(status) for status in sorted(set(statuses))}
+
+
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Load test of the frontend web server.")
+    parser.add_argument('--seconds', type=float, default=2)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args(argv)
+    results = {}
+    results["async"] = scenario(start_async_server, args.seconds, args.clients, True, False)
+    results["async, slow client"] = scenario(start_async_server, args.seconds, args.clients, True, True)
+    results["blocking"] = scenario(start_blocking_server, args.seconds, args.clients, False, False)
+    results["blocking, slow client"] = scenario(start_blocking_server, args.seconds, args.clients, False, True)
+    port, server, stop = start_async_server(max_connections=4)
+    statuses = asyncio.run(pool_limit(port, 6))
+    stop()
+    results["pool limit"] = {"max connections": 4, "statuses": statuses, "server": server.get_report()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
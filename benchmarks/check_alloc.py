@@ -0,0 +1,106 @@
+"""Checks that the sensor read path, alarm recording and logging included, does not allocate.
+On the board every allocation raises MemoryError while the heap is locked:
+    mpremote run benchmarks/check_alloc.py (with lib/ copied to the board)
+On the host the simulated hardware in sim/ is used:
+    python3 benchmarks/check_alloc.py
+CPython boxes ints above 256 and has no count of all allocations, so the host run is weaker than the
+board: tracemalloc checks that no memory is kept per reading and that the peak while reading stays
+within PEAK_SLACK bytes, which finds temporary strings, lists etc. larger than the boxed numbers.
+Small temporary objects (a bound method, a tuple of two values) are only found on the board.
+Float values are heap objects on most MicroPython ports, so the check uses an int_Sensor without queue.
+"""
+import sys
+import array
+
+ON_BOARD = sys.implementation.name == "micropython"
+if not ON_BOARD:
+    base = sys.path[0] + "/.."
+    sys.path.insert(0, base + "/sim")
+    sys.path.append(base + "/lib")
+
+import general
+import log
+
+PEAK_SLACK = 256  # [bytes] boxed ints and floats alive at the same time on the host, about 180 measured
+SAMPLES = array.array('l', [100, 20000, 40000, 65000, 64000, 500])
+
+_log = log.get_logger("check_alloc")
+EVENT_SAMPLE = _log.event(log.INFO, "sample {}: {}")
+
+
+class ReplaySensor(general.int_Sensor):
+    """int_Sensor reading raw values from a preallocated array."""
+    def __init__(self) -> None:
+        super().__init__("Alloc check", "-")
+        self.index = 0
+
+    def read_raw(self) -> int:
+        self.index += 1
+        if self.index == len(SAMPLES):
+            self.index = 0
+        _log.write(EVENT_SAMPLE, self.index, SAMPLES[self.index])
+        return SAMPLES[self.index]
+
+
+def setup():
+    sensor = ReplaySensor()
+    sensor.set_limits(0, 1000)
+    sensor.set_calibration_points([(0, 0), (65535, 1000)])
+    sensor.set_min_alarm(10)
+    sensor.set_max_alarm(900)
+    general.alarm_events.stop_auto_dispatch()
+    # Warm up: raw range, attribute dictionaries etc. are allocated during the first readings.
+    for _ in range(2 * len(SAMPLES)):
+        sensor.callback_read_value(None)
+    general.alarm_events.dispatch()
+    log.drain()
+    return sensor
+
+
+def check_board(sensor, count):
+    import micropython
+    micropython.heap_lock()
+    try:
+        for _ in range(count):
+            sensor.callback_read_value(None)
+    finally:
+        micropython.heap_unlock()
+
+
+def check_host(sensor, count):
+    # CPython boxes every int above 256, so the latest counter values always occupy some memory.
+    # What must not happen is memory growing with the number of readings or temporary objects larger than those.
+    import tracemalloc
+    memory = array.array('q', [0, 0])  # start and peak, new int objects here would count as kept
+    tracemalloc.start()
+    for _ in range(count):
+        sensor.callback_read_value(None)
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    memory[0] = tracemalloc.get_traced_memory()[0]
+    for _ in range(count):
+        sensor.callback_read_value(None)
+    memory[1] = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    peak = memory[1] - memory[0]
+    assert peak <= PEAK_SLACK, "Read path allocated up to " + str(peak) + " bytes at a time."
+    retained = 0
+    for stat in after.compare_to(before, 'filename'):
+        if stat.traceback[0].filename.endswith(("general.py", "simple_queue.py", "log.py", "check_alloc.py")):
+            retained += stat.size_diff
+    assert retained <= 0, "Read path kept " + str(retained) + " bytes."
+
+
+if __name__ == "__main__":
+    sensor = setup()
+    count = 1000
+    if ON_BOARD:
+        check_board(sensor, count)
+    else:
+        check_host(sensor, count)
+    report = general.alarm_events.get_report()
+    assert report['Recorded'] > 0 and report['Dropped'] > 0, "Alarm path was not exercised."
+    log_report = log.get_report()
+    assert log_report['Recorded'] > 0 and log_report['Dropped'] > 0, "Log path was not exercised."
+    print("Read path allocation free for " + str(count) + " readings, alarm events: " + str(report) + ", log: " + str(log_report))
@@ -0,0 +1,399 @@
+"""Benchmark suite for the rctools hot paths, run on CPython against the simulated hardware in sim/.
+
+    python3 benchmarks/run.py                    # print results as JSON
+    python3 benchmarks/run.py --save-baseline    # store results in benchmarks/baseline.json
+    python3 benchmarks/run.py --check            # exit code 1 if a benchmark got slower than the threshold
+                                                 # or the regression SBUS capture replays differently
+
+Per benchmark: time per operation, calls per second, peak traced memory during a run and memory kept
+per call (tracemalloc), and the time relative to a calibration loop of plain Python measured in the
+same run. --check compares the relative times, so the baseline does not depend on the speed of the
+machine or its load at the time. Benchmarks above the threshold are measured again before they count
+as regression, a single slow run is noise.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BASE = os.path.dirname(os.path.abspath(__file__)) + "/.."
+sys.path.insert(0, BASE + "/sim")
+sys.path.append(BASE)
+sys.path.append(BASE + "/lib")
+
+import machine
+
+BASELINE_FILE = os.path.dirname(os.path.abspath(__file__)) + "/baseline.json"
+DEFAULT_THRESHOLD = 0.35  # slower than the baseline by this fraction of the relative time counts as regression
+RETRIES = 2  # measurements of a benchmark above the threshold before it counts as regression
+
+
+def setup_sbus_decode_frame():
+    import sbus_receiver
+    from sbus_replay import encode_frame
+    receiver = sbus_receiver.SBUSReceiver(0)
+    receiver.sbusFrame = encode_frame([172 + 97 * ch for ch in range(16)], 0x01)
+    return receiver.decode_frame
+
+
+def setup_sbus_get_new_data():
+    import sbus_receiver
+    from sbus_replay import encode_frame
+    receiver = sbus_receiver.SBUSReceiver(0)
+    frame = bytes(encode_frame([992] * 16))
+    uart = receiver.sbus
+
+    def poll():
+        uart.rx.extend(frame)
+        receiver.get_new_data()
+    return poll
+
+
+def setup_queue_put():
+    import simple_queue
+    queue = simple_queue.Queue(50)
+    for i in range(50):
+        queue.put(i)
+    return lambda: queue.put(1234.5)
+
+
+def setup_queue_get_avg():
+    import simple_queue
+    queue = simple_queue.Queue(50)
+    for i in range(50):
+        queue.put(i * 1.5)
+    return queue.get_avg
+
+
+def setup_stats_queue_put():
+    import simple_queue
+    queue = simple_queue.StatsQueue(50)
+    values = [((i * 7919) % 1000) / 10 for i in range(64)]
+    state = [0]
+
+    def put():
+        state[0] = (state[0] + 1) & 63
+        queue.put(values[state[0]])
+    return put
+
+
+def setup_sensor_read():
+    import sensors
+    machine.script_adc(26, [1000, 20000, 40000, 65000, 30000])
+    sensor = sensors.Potentiometer(26, "Rudder", "deg", queue_length=50)
+    sensor.set_limits(-45, 45)
+    sensor.set_max_alarm(40)
+    for _ in range(10):
+        sensor.callback_read_value(None)
+    return lambda: sensor.callback_read_value(None)
+
+
+def setup_int_sensor_read():
+    import sensors
+    machine.script_adc(27, [1000, 20000, 40000, 65000, 30000])
+    sensor = sensors.int_Potentiometer(27, "Throttle", "%", queue_length=50)
+    sensor.set_limits(0, 100)
+    for _ in range(10):
+        sensor.callback_read_value(None)
+    return lambda: sensor.callback_read_value(None)
+
+
+def setup_set_dimmer():
+    import systems
+    nav = systems.NavigationSignals(30)
+    nav.setup_position_lights(13, 2, 3, 6)
+    nav.setup_towlights(10, 11)
+    nav.setup_restricted_manueverability(7, 8, 9)
+    nav.start_moving()
+    nav.set_darkness()
+    state = [0]
+
+    def dim():
+        state[0] = (state[0] + 1) & 1
+        nav.set_dimmer(1000 + 1000 * state[0])
+    return dim
+
+
+def setup_navigation_transitions():
+    import systems
+    nav = systems.NavigationSignals(30)
+    nav.setup_position_lights(13, 2, 3, 6)
+    nav.setup_towlights(10, 11)
+    nav.setup_restricted_manueverability(7, 8, 9)
+    nav.setup_anchor_lights(12)
+    # An evening of signals, including repeated commands that must not touch the lights again
+    steps = [nav.start_moving, nav.set_darkness, nav.start_towing, nav.set_darkness, nav.start_moving,
+             nav.stop_towing, nav.start_restricted_movement, nav.stop_restricted_movement, nav.stop_moving,
+             nav.start_anchor, nav.stop_anchor, nav.set_daylight]
+
+    def transitions():
+        for step in steps:
+            step()
+    return transitions
+
+
+def setup_dimming_fade():
+    import actuators
+    import dimming
+    group = dimming.DimmingGroup("Bench lights")
+    for pin in range(2, 11):
+        light = actuators.Light(pin, "Light " + str(pin))
+        group.add_light(light)
+        light.switch_on()
+    fader = dimming.get_fader()
+    # Keep the tick running, restarting the simulated timer for every fade would queue timer events
+    fader.Scheduler.add(lambda timer: None, frequency=1)
+    state = [0]
+
+    def fade():
+        # One tick of a fade between two levels, restarted when done
+        if not group.is_fading():
+            state[0] ^= 1
+            group.set_target(40 + 160 * state[0], 200)
+        fader.callback_fade(None)
+    return fade
+
+
+def setup_output_flush():
+    import output_bank
+    machine.attach_i2c(0x40)
+    bank = output_bank.OutputBank()
+    first = bank.add_expander(output_bank.PCA9685(machine.I2C(0), 0x40))
+    state = [0]
+
+    def flush():
+        # A fade tick of 12 of the 16 expander channels
+        state[0] = (state[0] + 1) & 255
+        for channel in range(first, first + 12):
+            bank.set_duty(channel, state[0] << 8)
+        bank.flush()
+    return flush
+
+
+def setup_set_duty_percent():
+    import actuators
+    pump = actuators.Pump(22, "Bench pump")
+    state = [0]
+
+    def set_duty():
+        state[0] = (state[0] + 1) % 101
+        pump.set_duty_percent(state[0])
+    return set_duty
+
+
+def setup_log_write():
+    import log
+    logger = log.get_logger("bench")
+    event = logger.event(log.WARNING, "{}: value {} at {}")
+    state = [0]
+
+    def write():
+        # Stored events, the ring is emptied before it fills up
+        state[0] += 1
+        if state[0] == log.RING_SIZE - 1:
+            state[0] = 0
+            log.ring.clear()
+        logger.write(event, "Bench", state[0], 7)
+    return write
+
+
+def setup_bilge_callback():
+    import systems
+    machine.script_adc(28, 50000)
+    bilge = systems.BilgeSystem("Bench compartment", 28, 22)
+    bilge.WaterSensor.callback_read_value(None)
+    return lambda: bilge.callback_timer(None)
+
+
+def setup_rpm_read():
+    import sensors
+    import utime
+    sensor = sensors.RPMSensor("Shaft", 1, 21, 2, broadcast=False)
+    machine.script_pin_edges(21, [(t, level) for i in range(1, 20) for t, level in ((i * 5000, 1), (i * 5000 + 100, 0))])
+    utime.sleep_ms(100)
+    return lambda: sensor.callback_read_value(None)
+
+
+def setup_boot_plan(cached: bool):
+    import shutil
+    import tempfile
+    import boot_plan
+    folder = tempfile.mkdtemp()
+    shutil.copy(BASE + "/setup.json", folder)
+    setup_file = folder + "/setup.json"
+    plan_file = boot_plan.get_plan_file(setup_file)
+    boot_plan.load(setup_file)
+    if cached:
+        return lambda: boot_plan.load(setup_file)
+
+    def load_changed():
+        # Without a valid cached plan, as after changing setup.json
+        os.remove(plan_file)
+        boot_plan.load(setup_file)
+    return load_changed
+
+
+def calibration_loop() -> int:
+    """Fixed plain Python work (loop, arithmetic, list and attribute access), the unit of the relative times."""
+    values = [0] * 16
+    total = 0
+    for i in range(100):
+        values[i & 15] += (i * 3) >> 1
+        total += values.__len__()
+    return total
+
+
+BENCHMARKS = {
+    'sbus.decode_frame': setup_sbus_decode_frame,
+    'sbus.get_new_data': setup_sbus_get_new_data,
+    'queue.put': setup_queue_put,
+    'queue.get_avg': setup_queue_get_avg,
+    'stats_queue.put': setup_stats_queue_put,
+    'sensor.callback_read_value': setup_sensor_read,
+    'int_sensor.callback_read_value': setup_int_sensor_read,
+    'navigation.set_dimmer': setup_set_dimmer,
+    'navigation.transitions': setup_navigation_transitions,
+    'dimming.fade_tick': setup_dimming_fade,
+    'output_bank.flush': setup_output_flush,
+    'actuators.set_duty_percent': setup_set_duty_percent,
+    'log.write': setup_log_write,
+    'bilge.callback_timer': setup_bilge_callback,
+    'rpm.callback_read_value': setup_rpm_read,
+    'boot_plan.load_changed': lambda: setup_boot_plan(False),
+    'boot_plan.load_cached': lambda: setup_boot_plan(True),
+}
+
+
+def measure(func, iterations: int, repeats: int = 5) -> dict:
+    """Times func (best of repeats) and traces its memory use."""
+    for _ in range(min(iterations, 100)):
+        func()
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(iterations):
+        func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {}
+    result['ns_per_op'] = round(best / iterations, 1)
+    result['calls_per_s'] = int(iterations * 1000000000 / best) if best else 0
+    result['peak_bytes'] = max(peak - before, 0)
+    result['retained_bytes_per_call'] = round(max(current - before, 0) / iterations, 2)
+    return result
+
+
+def time_batch(func, iterations: int) -> int:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter_ns() - start
+
+
+def measure_relative(func, iterations: int, rounds: int = 15) -> float:
+    """Time of func relative to calibration_loop: short batches of both alternate, so they see the same
+    machine load, the median of the per round ratios ignores rounds disturbed by other processes."""
+    batch = max(iterations // 10, 10)
+    calibration_batch = max(batch // 10, 10)
+    ratios = []
+    for _ in range(rounds):
+        calibration = time_batch(calibration_loop, calibration_batch) / calibration_batch
+        elapsed = time_batch(func, batch) / batch
+        ratios.append(elapsed / calibration)
+    ratios.sort()
+    return ratios[len(ratios) // 2]
+
+
+def run_one(name: str, iterations: int) -> dict:
+    import contextlib
+    import io
+    machine.reset()
+    machine.record_pwm(False)
+    # Hot paths that print would measure the console, keep their output out of the results.
+    with contextlib.redirect_stdout(io.StringIO()):
+        func = BENCHMARKS[name]()
+        result = measure(func, iterations)
+        result['relative'] = round(measure_relative(func, iterations), 4)
+    return result
+
+
+def run(names=None, iterations: int = 5000) -> dict:
+    """Runs the benchmarks, each measured absolute and relative to the calibration loop."""
+    results = {}
+    for name in BENCHMARKS:
+        if names and name not in names:
+            continue
+        results[name] = run_one(name, iterations)
+    return results
+
+
+def check(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns the names of benchmarks whose relative time exceeds the baseline by more than threshold."""
+    slower = []
+    for name in results:
+        if name not in baseline or 'relative' not in baseline[name]:
+            continue
+        old = baseline[name]['relative']
+        if old > 0 and results[name]['relative'] > old * (1 + threshold):
+            slower.append(name)
+    return slower
+
+
+def confirm(results: dict, baseline: dict, threshold: float, iterations: int) -> list:
+    """Measures the benchmarks above the threshold again, keeps their best relative time and returns
+    messages for those still above it."""
+    slower = check(results, baseline, threshold)
+    for _ in range(RETRIES):
+        if not slower:
+            break
+        for name in slower:
+            result = run_one(name, iterations)
+            if result['relative'] < results[name]['relative']:
+                results[name] = result
+        slower = check({name: results[name] for name in slower}, baseline, threshold)
+    return [name + ": " + str(results[name]['relative']) + " x calibration, baseline "
+            + str(baseline[name]['relative']) for name in slower]
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks for the rctools hot paths.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run, default all")
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help="compare against the baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+    results = run(args.names, args.iterations)
+    report = {'python': sys.version.split()[0], 'results': results}
+    regressions = []
+    if args.check:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)['results']
+        regressions = confirm(results, baseline, args.threshold, args.iterations)
+        import sbus_replay
+        regressions += sbus_replay.check_capture()
+        report['regressions'] = regressions
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            f.write(text + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
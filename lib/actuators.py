@@ -3,7 +3,15 @@
 
 import machine
 import utime
+import general
 import sensors
+import log
+
+_log=log.get_logger("actuators")
+EVENT_DUTY=_log.event(log.DEBUG,"{}: duty {} ({} %)")
+EVENT_RPM_SET=_log.event(log.INFO,"RPM set to {}.")
+EVENT_RPM_ABOVE_MAX=_log.event(log.WARNING,"Requested RPM {} more than max_rpm!")
+EVENT_RPM_BELOW_MIN=_log.event(log.WARNING,"Requested RPM {} below min_rpm!")
 
 def convert(x:float, in_min:float, in_max:float, out_min:float, out_max:float):
     """A function to map values"""
@@ -20,21 +28,38 @@ def convert_int(x:int, in_min:int, in_max:int, out_min:int, out_max:int):
         return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
 class PWMOut():
-    def __init__(self,pin_number:int,name:str,frequency:int=10000) -> None:
-        if pin_number==0: #Class initialized without actual output, can be to control remote (I2C etc) PWM.
-            pin_number=25 #Set pin to built-in LED (Raspi Pico)
+    """A PWM output on a GPIO pin, or a channel of an output_bank.OutputBank.
+    With a bank the output is written by the bank at the end of the scheduler tick, pin_number 0 with
+    a bank channel controls a remote output, e.g. of an I2C PWM expander. Unchanged values are not written."""
+    def __init__(self,pin_number:int,name:str,frequency:int=10000,bank=None,channel:int=-1) -> None:
+        self.name=name
+        self.bank=bank
+        self.channel=channel # bank channel
+        if bank is not None:
+            if pin_number:
+                self.channel=bank.add_pin(pin_number,frequency)
+            elif channel<0:
+                raise general.SetupError(name+": pin 0 needs a channel of the output bank.")
+            else:
+                bank.set_duty(channel,0)
+        elif pin_number==0: #Output without pin, to control remote (I2C etc) PWM.
+            raise general.SetupError(name+": pin 0 needs an output bank channel, e.g. of a PWM expander.")
         else:
             self.PWM=machine.PWM(machine.Pin(pin_number))
-        self.name=name
-        self.PWM.freq(frequency) #[Hz]
-        self.PWM.duty_u16(0) # 0-65535 
+            self.PWM.freq(frequency) #[Hz]
+            self.PWM.duty_u16(0) # 0-65535 
         self.min_pwm=0
         self.max_pwm=65535
-        self.raw_duty:int
+        self.raw_duty:int=0
 
     def set_raw_duty_cycle(self,raw_duty:int)->None:
+        if raw_duty==self.raw_duty:
+            return
         self.raw_duty=raw_duty
-        self.PWM.duty_u16(raw_duty)
+        if self.bank is None:
+            self.PWM.duty_u16(raw_duty)
+        else:
+            self.bank.set_duty(self.channel,raw_duty)
 
     def set_min_pwm(self,min_pwm:int)->None:
         self.min_pwm=min_pwm
@@ -45,24 +70,60 @@ class PWMOut():
     def set_duty_percent(self,duty_percent:int)->None:
         raw_duty=convert_int(duty_percent,0,100,self.min_pwm,self.max_pwm)
         self.set_raw_duty_cycle(raw_duty)
-        print(str(raw_duty)+", "+str(duty_percent)+"%")
+        _log.write(EVENT_DUTY,self.name,raw_duty,duty_percent)
 
 class Light(PWMOut):
-    def __init__(self, pin_number: int, name:str, frequency: int = 100) -> None:
-        super().__init__(pin_number, name, frequency)
+    """A light, when on its PWM value is the brightness (0-65535, set by a dimming group) mapped into
+    min_pwm to max_pwm, less dim_value."""
+    def __init__(self, pin_number: int, name:str, frequency: int = 100, bank=None, channel: int = -1) -> None:
+        super().__init__(pin_number, name, frequency, bank, channel)
         self.on_state:bool=False  # If light is currently on or off.
         self.dim_value=0  #Dimmer Value
+        self.brightness:int=65535
+        self.on_duty:int=self.max_pwm # PWM value when switched on
         self.name=name
 
     def set_dim_value(self,dim_value:int)->None:
         self.dim_value=dim_value
+        self.update_on_duty()
+
+    def set_min_pwm(self,min_pwm:int)->None:
+        self.min_pwm=min_pwm
+        self.update_on_duty()
+
+    def set_max_pwm(self,max_pwm:int)->None:
+        self.max_pwm=max_pwm
+        self.update_on_duty()
+
+    def set_brightness(self,brightness:int)->bool:
+        """Sets the brightness used when on, returns True if the output was written."""
+        self.brightness=brightness
+        return self.update_on_duty()
+
+    def get_on_duty(self)->int:
+        """PWM value when on."""
+        span=self.max_pwm-self.min_pwm
+        if span==65535:
+            duty=self.brightness
+        else:
+            duty=self.min_pwm+span*(self.brightness>>4)//4095 # 12 bit, stays a small int on MicroPython
+        duty-=self.dim_value
+        return duty if duty>self.min_pwm else self.min_pwm
+
+    def update_on_duty(self)->bool:
+        """Recomputes the PWM value used when on. Writes the output only if the light is on and the value
+        changed, returns True if it was written."""
+        duty=self.get_on_duty()
+        if duty==self.on_duty:
+            return False
+        self.on_duty=duty
         if self.on_state:
-            duty=self.max_pwm-dim_value
             self.set_raw_duty_cycle(duty)
+            return True
+        return False
 
     def switch_on(self)->None:
-        duty=self.max_pwm-self.dim_value
-        self.set_raw_duty_cycle(duty)
+        self.set_raw_duty_cycle(self.on_duty)
         self.on_state=True
 
     def switch_off(self)->None:
@@ -120,11 +181,11 @@ class Motor:
         if rpm_in>self.min_rpm:
             if rpm_in<self.max_rpm:
                 self.requested_rpm=rpm_in
-                print("RPM set to "+str(rpm_in)+".")
+                _log.write(EVENT_RPM_SET,rpm_in)
             else:
-                print("Requested RPM more than max_rpm!")
+                _log.write(EVENT_RPM_ABOVE_MAX,rpm_in)
         else:
-            print("Requested RPM below min_rpm!")
+            _log.write(EVENT_RPM_BELOW_MIN,rpm_in)
             
     def get_rpm(self)->float:
         """Method returns the actual speed."""
@@ -141,8 +202,8 @@ class Valve:
 
 class Pump(PWMOut):
     """A class for a pump"""
-    def __init__(self, pin_number: int, name:str, frequency: int = 10000) -> None:
-        super().__init__(pin_number, name, frequency)
+    def __init__(self, pin_number: int, name:str, frequency: int = 10000, bank=None, channel: int = -1) -> None:
+        super().__init__(pin_number, name, frequency, bank, channel)
         self.on_pwm:int=65535 # PWM value when switched on (default=maximum)
         self.on_state:bool=False  #Is pump running?
 
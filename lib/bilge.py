@@ -0,0 +1,63 @@
+# Bilge system of a watertight compartment
+import sensors
+import actuators
+import scheduler
+import utime
+
+class BilgeSystem:
+    """A system to monitor a compartment for water in bilge, operates bilge pump and gives appropriate feedback."""
+    def __init__(self,compartment_name:str,pin_water,pin_pump) -> None:
+        self.name=compartment_name
+        self.status_operational:bool=False # If set True, system is up and running with automatic bilge pumps.
+        name_wd=compartment_name+" bilge alarm"
+        self.WaterSensor=sensors.WaterDetector(pin_water,name_wd)
+        name_bp=compartment_name+" bilge pump"
+        self.BilgePump=actuators.Pump(pin_pump,name_bp)
+        self.check_period:int=1 # How many seconds pass until system checks status
+        self.Scheduler=scheduler.get_scheduler()
+        self.check_task=None
+        self.last_water_detected=0
+        self.has_water_in_bilge:bool=False
+        self.bilge_pump_running:bool=False
+        self.additional_runtime:int=5000 # ms additional runtime of pump after last water was detected.
+
+    def callback_timer(self,timer):
+        if self.WaterSensor.check_for_water():
+            self.last_water_detected=utime.ticks_ms()
+            self.BilgePump.switch_on()
+            self.has_water_in_bilge=True
+            self.bilge_pump_running=True
+        else:
+            if self.bilge_pump_running:
+                self.has_water_in_bilge=False
+                now=utime.ticks_ms()
+                if utime.ticks_diff(now,self.last_water_detected)>self.additional_runtime:
+                    self.BilgePump.switch_off()
+                    self.bilge_pump_running=False
+
+    def start_system(self):
+        """Starts monitoring the bilge and operates pump as needed."""
+        self.WaterSensor.start_reading()
+        utime.sleep_ms(500)
+        self.check_task=self.Scheduler.add(self.callback_timer,period=self.check_period*1000,name=self.name+" bilge check")
+        self.status_operational=True
+
+    def stop_system(self):
+        """Stops automatic operation of the system.
+        Only possible when bilge pump is not running!"""
+        if not self.bilge_pump_running:
+            self.Scheduler.remove(self.check_task)
+            self.check_task=None
+            self.WaterSensor.stop_reading()
+            self.status_operational=False
+
+    def in_operation(self):
+        """Returns True if system is running, False if in standby."""
+        return self.status_operational
+
+
+if __name__=="__main__":
+    WTC1=BilgeSystem("Compartment 1",27,25)
+    WTC1.start_system()
+    utime.sleep(60)
+    WTC1.stop_system()
@@ -0,0 +1,187 @@
+"""Boot plan: setup.json validated and resolved once into a list of setup steps, cached on flash.
+
+The plan is stored as text next to setup.json (setup.plan) together with the CRC32 of the JSON
+it was compiled from. Later boots only read the JSON bytes for the CRC and split the cached plan
+into its fields, the JSON is parsed and validated again only after it was changed.
+Plan steps are tuples (step, arguments...):
+    (STEP_SHIP, name, length)
+    (STEP_POSITION_LIGHTS, top, port side, starboard, rear, second top or 0)
+    (STEP_TOWLIGHTS, pin 1, pin 2, pin 3 or 0)
+    (STEP_RESTRICTED_MANEUVERABILITY, pin 1, pin 2, pin 3)
+    (STEP_ANCHOR_LIGHTS, pin 1, pin 2 or 0)
+    (STEP_DIM_POTI, adc pin)
+    (STEP_COMPARTMENT, name, water detector adc pin, pump pin, check period [s])"""
+import binascii
+import json
+import utime
+import log
+
+SETUP_FILE="setup.json"
+PLAN_VERSION=1 # increase if the plan format changes, cached plans of other versions are recompiled
+
+STEP_SHIP=0
+STEP_POSITION_LIGHTS=1
+STEP_TOWLIGHTS=2
+STEP_RESTRICTED_MANEUVERABILITY=3
+STEP_ANCHOR_LIGHTS=4
+STEP_DIM_POTI=5
+STEP_COMPARTMENT=6
+TEXT_STEPS=(STEP_SHIP,STEP_COMPARTMENT) # steps with a name as first argument
+
+PLAN_HEADER="rctools boot plan"
+
+MAX_PIN=28 # GPIO 0 to 28 of the RP2040
+ADC_PINS=(26,27,28)
+
+_report={}
+
+_log=log.get_logger("boot_plan")
+EVENT_SHARED_PIN=_log.event(log.WARNING,"Setup: pin {} of {} is also used by {}.")
+EVENT_NOT_STORED=_log.event(log.WARNING,"Setup: could not store the boot plan in {}.")
+
+class SetupFileError(Exception):
+    """Error class for an invalid setup.json."""
+    pass
+
+def get_plan_file(setup_file:str)->str:
+    """Cached plan next to the setup file, setup.json -> setup.plan"""
+    if setup_file.endswith(".json"):
+        setup_file=setup_file[:-5]
+    return setup_file+".plan"
+
+def check_name(name)->str:
+    """Names are stored in the plan as they are, so they must not contain tabs or line breaks."""
+    if not isinstance(name,str) or "\t" in name or "\n" in name or "\r" in name:
+        raise SetupFileError("Invalid name "+repr(name)+".")
+    return name
+
+def check_pins(name:str,pins,min_count:int,max_count:int,adc:bool=False)->list:
+    """Checks a list of pin numbers and returns it padded with 0 to max_count pins."""
+    if not isinstance(pins,list) or not min_count<=len(pins)<=max_count:
+        raise SetupFileError(name+": "+str(min_count)+" to "+str(max_count)+" pins expected.")
+    for pin in pins:
+        if not isinstance(pin,int) or pin<0 or pin>MAX_PIN:
+            raise SetupFileError(name+": invalid pin "+str(pin)+".")
+        if adc and pin not in ADC_PINS:
+            raise SetupFileError(name+": pin "+str(pin)+" is no ADC pin.")
+    return pins+[0]*(max_count-len(pins))
+
+def compile_setup(setup:dict)->tuple:
+    """Validates the parsed setup.json and returns the plan, raises SetupFileError if it is invalid."""
+    if not isinstance(setup,dict):
+        raise SetupFileError("Setup has to be a JSON object.")
+    length=setup.get("ship_length")
+    if not isinstance(length,(int,float)) or length<=0:
+        raise SetupFileError("ship_length has to be a positive number.")
+    plan=[(STEP_SHIP,check_name(setup.get("ship_name","Ship")),length)]
+    systems=setup.get("systems",{})
+    used={} # pin -> first user, only used for warnings as compartments may share detectors and pumps
+    def use(name,pins):
+        for pin in pins:
+            if pin and pin in used and used[pin]!=name:
+                _log.write(EVENT_SHARED_PIN,pin,name,used[pin])
+            elif pin:
+                used[pin]=name
+    nav=systems.get("navigation_signals")
+    if nav is not None:
+        if "position_lights" in nav:
+            pins=check_pins("position_lights",nav["position_lights"],4,5)
+            if length>50 and not pins[4]:
+                raise SetupFileError("Ship is longer than 50m, second top light required!")
+            use("position lights",pins)
+            plan.append((STEP_POSITION_LIGHTS,)+tuple(pins))
+        if "towlights" in nav:
+            pins=check_pins("towlights",nav["towlights"],2,3)
+            use("towlights",pins)
+            plan.append((STEP_TOWLIGHTS,)+tuple(pins))
+        key="restricted_maneuverability" if "restricted_maneuverability" in nav else "restricted_maneuverabilitiy" # spelling of older setup files
+        if key in nav:
+            pins=check_pins(key,nav[key],3,3)
+            use("restricted maneuverability lights",pins)
+            plan.append((STEP_RESTRICTED_MANEUVERABILITY,)+tuple(pins))
+        if "anchor_lights" in nav:
+            pins=check_pins("anchor_lights",nav["anchor_lights"],1,2)
+            if length>50 and not pins[1]:
+                raise SetupFileError("Ship is longer than 50m, second anchor light is required.")
+            use("anchor lights",pins)
+            plan.append((STEP_ANCHOR_LIGHTS,)+tuple(pins))
+        if "dim_potentiometer" in nav:
+            pins=check_pins("dim_potentiometer",[nav["dim_potentiometer"]],1,1,adc=True)
+            use("dimmer",pins)
+            plan.append((STEP_DIM_POTI,pins[0]))
+    for compartment in systems.get("watertight_compartments",[]):
+        if not isinstance(compartment,list) or len(compartment) not in (3,4) or not isinstance(compartment[0],str):
+            raise SetupFileError("Compartments are [name, water pin, pump pin] or [name, water pin, pump pin, check period].")
+        name=check_name(compartment[0])
+        check_pins(name+" water detector",[compartment[1]],1,1,adc=True)
+        check_pins(name+" bilge pump",[compartment[2]],1,1)
+        period=compartment[3] if len(compartment)==4 else 1
+        if not isinstance(period,int) or period<1:
+            raise SetupFileError(name+": check period has to be at least 1 s.")
+        plan.append((STEP_COMPARTMENT,name,compartment[1],compartment[2],period))
+    return tuple(plan)
+
+def write_plan(plan_file:str,plan:tuple,crc:int)->None:
+    """Stores the plan as text, a header line and one line of tab separated fields per step."""
+    text=PLAN_HEADER+" "+str(PLAN_VERSION)+" "+str(crc)+"\n"
+    for step in plan:
+        text+="\t".join([str(field) for field in step])+"\n"
+    with open(plan_file,'wb') as f:
+        f.write(text.encode())
+
+def read_plan(plan_file:str,crc:int):
+    """Returns the cached plan if it was compiled from a setup file with this CRC, else None."""
+    try:
+        with open(plan_file,'rb') as f:
+            lines=f.read().decode().split("\n")
+    except (OSError,UnicodeError):
+        return None
+    if lines[0]!=PLAN_HEADER+" "+str(PLAN_VERSION)+" "+str(crc):
+        return None
+    plan=[]
+    try:
+        for line in lines[1:]:
+            if not line:
+                continue
+            fields=line.split("\t")
+            kind=int(fields[0])
+            step=[kind]
+            for i in range(1,len(fields)):
+                field=fields[i]
+                if i==1 and kind in TEXT_STEPS:
+                    step.append(field)
+                elif "." in field:
+                    step.append(float(field))
+                else:
+                    step.append(int(field))
+            plan.append(tuple(step))
+    except ValueError:
+        return None
+    return tuple(plan)
+
+def load(setup_file:str=SETUP_FILE,plan_file:str="")->tuple:
+    """Returns the plan of setup_file, compiling and caching it if the setup file changed."""
+    start=utime.ticks_us()
+    if not plan_file:
+        plan_file=get_plan_file(setup_file)
+    with open(setup_file,'rb') as f:
+        source=f.read()
+    crc=binascii.crc32(source)
+    plan=read_plan(plan_file,crc)
+    compiled=plan is None
+    if compiled:
+        plan=compile_setup(json.loads(source))
+        try:
+            write_plan(plan_file,plan,crc)
+        except OSError:
+            _log.write(EVENT_NOT_STORED,plan_file)
+    _report['Setup File']=setup_file
+    _report['Source CRC']=crc
+    _report['Compiled']=compiled
+    _report['Steps']=len(plan)
+    _report['Load [us]']=utime.ticks_diff(utime.ticks_us(),start)
+    return plan
+
+def get_report()->dict:
+    """Used to retrieve how the last plan was loaded."""
+    return dict(_report)
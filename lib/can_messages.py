@@ -0,0 +1,330 @@
+"""Compact binary messages between the nodes of a model on a CAN bus.
+
+Every message fits one classic CAN frame with 8 data bytes. The 11 bit identifier holds the message
+class in the upper 5 bits and the node id in the lower 6 bits, so alarms win the arbitration over
+commands and commands over sensor values:
+    can_id=(message class<<6)|node id
+Sensor values, alarms and commands share one layout, values are sent as scaled integers:
+    channel (B), code (B), value (i, value*scale), timestamp [ms] (H)
+Value blocks carry up to three 16 bit values of channels first to first+2 of a node, mask bit n set
+if channel first+n is included:
+    first channel (B), mask (B), values (3h)
+The transport is pluggable: anything with send(can_id,data)->bool and recv_into(buffer)->can_id
+(-1 if nothing was received) can be used, LoopbackBus connects endpoints within one process."""
+import struct
+import utime
+
+# Message classes, lower classes win the arbitration. Up to 31 classes, there are gaps for new ones.
+MSG_ALARM=1 # code: general.ALARM_*
+MSG_COMMAND=2 # node id is the receiving node, code: CMD_*
+MSG_VALUE=4 # code: FLAG_*
+MSG_VALUE_BLOCK=5 # received as MSG_VALUE per included value
+
+CMD_SET_VALUE=1
+CMD_ON=2
+CMD_OFF=3
+
+FLAG_NONE=0
+FLAG_REFRESH=1 # value sent although it did not change, e.g. periodic refresh
+
+FRAME_FORMAT="<BBiH"
+BLOCK_FORMAT="<BBhhh"
+BLOCK_VALUES=3
+FRAME_LEN=8
+MAX_NODE_ID=0x3F
+INT32_MIN=-0x80000000
+INT32_MAX=0x7FFFFFFF
+INT16_MIN=-0x8000
+INT16_MAX=0x7FFF
+
+def make_id(message_class:int,node_id:int)->int:
+    """CAN identifier of a message class sent by (or, for commands, to) node_id."""
+    return (message_class<<6)|(node_id&MAX_NODE_ID)
+
+def split_id(can_id:int):
+    """Returns message class and node id of a CAN identifier."""
+    return can_id>>6,can_id&MAX_NODE_ID
+
+def frame_bits(length:int=FRAME_LEN)->int:
+    """Bits on the bus for a standard data frame of length bytes, including worst case bit stuffing
+    and the interframe space."""
+    stuffed=34+8*length # SOF up to the CRC are stuffed
+    return stuffed+(stuffed-1)//4+13
+
+def pack(buffer,channel:int,code:int,raw:int,timestamp:int,offset:int=0)->None:
+    """Writes a frame into buffer without allocating."""
+    struct.pack_into(FRAME_FORMAT,buffer,offset,channel,code,raw,timestamp&0xFFFF)
+
+def unpack(buffer,offset:int=0):
+    """Returns channel, code, raw value and timestamp of a frame."""
+    return struct.unpack_from(FRAME_FORMAT,buffer,offset)
+
+def pack_block(buffer,first_channel:int,mask:int,raw0:int,raw1:int,raw2:int,offset:int=0)->None:
+    """Writes a value block into buffer without allocating."""
+    struct.pack_into(BLOCK_FORMAT,buffer,offset,first_channel,mask,raw0,raw1,raw2)
+
+def unpack_block(buffer,offset:int=0):
+    """Returns first channel, mask and the three raw values of a value block."""
+    return struct.unpack_from(BLOCK_FORMAT,buffer,offset)
+
+class Signal():
+    """A value sent over the bus: node, channel, name and fixed point scaling.
+    raw=round((value-offset)*scale), e.g. scale=10 sends a temperature with one decimal."""
+    def __init__(self,node_id:int,channel:int,name:str,unit:str="",scale:float=1,offset:float=0) -> None:
+        self.node_id=node_id
+        self.channel=channel
+        self.name=name
+        self.unit=unit
+        self.scale=scale
+        self.offset=offset
+        self.sensor=None # local sensor sending on this signal, if any
+
+    def to_raw(self,value)->int:
+        """Scales a value to the integer sent, clipped to the int32 range."""
+        raw=(value-self.offset)*self.scale
+        raw=int(raw+0.5) if raw>=0 else -int(0.5-raw)
+        if raw>INT32_MAX:
+            return INT32_MAX
+        if raw<INT32_MIN:
+            return INT32_MIN
+        return raw
+
+    def from_raw(self,raw:int)->float:
+        """Scales a received integer back to the value."""
+        if self.scale==1:
+            return raw+self.offset
+        return raw/self.scale+self.offset
+
+class MessageRegistry():
+    """Signals of all nodes by node id and channel, the same on every node of a model.
+    Channels are numbered per node in the order the signals are added."""
+    def __init__(self) -> None:
+        self.signals={} # (node_id<<8)|channel -> Signal
+        self.channel_count={} # node id -> number of channels
+        self.sensor_signals={} # id(sensor) -> Signal
+
+    def add_signal(self,node_id:int,name:str,unit:str="",scale:float=1,offset:float=0)->Signal:
+        """Adds a signal to node_id with the next free channel and returns it."""
+        if node_id<0 or node_id>MAX_NODE_ID:
+            raise ValueError("node id out of range")
+        channel=self.channel_count.get(node_id,0)
+        if channel>0xFF:
+            raise ValueError("too many channels")
+        signal=Signal(node_id,channel,name,unit,scale,offset)
+        self.signals[(node_id<<8)|channel]=signal
+        self.channel_count[node_id]=channel+1
+        return signal
+
+    def add_sensor(self,node_id:int,sensor,scale:float=1,offset:float=0)->Signal:
+        """Adds a signal for a general.Sensor of this node."""
+        signal=self.add_signal(node_id,sensor.name,sensor.unit,scale,offset)
+        signal.sensor=sensor
+        self.sensor_signals[id(sensor)]=signal
+        return signal
+
+    def get_signal(self,node_id:int,channel:int)->Signal:
+        """Returns the signal or None if it is unknown."""
+        return self.signals.get((node_id<<8)|channel)
+
+    def get_sensor_signal(self,sensor)->Signal:
+        """Returns the signal of a sensor added with add_sensor or None."""
+        return self.sensor_signals.get(id(sensor))
+
+class MessageEndpoint():
+    """Sends and receives the messages of one node over a transport.
+    Received messages are passed to handler(signal,code,value) per message class, the signal is
+    None for channels missing in the registry (value is the raw integer then)."""
+    def __init__(self,node_id:int,transport,registry:MessageRegistry) -> None:
+        self.node_id=node_id
+        self.transport=transport
+        self.registry=registry
+        self.tx_buffer=bytearray(FRAME_LEN)
+        self.rx_buffer=bytearray(FRAME_LEN)
+        self.handlers={} # message class -> handler
+        self.sent:int=0
+        self.send_errors:int=0
+        self.received:int=0
+        self.unknown:int=0 # received frames of unknown signals
+
+    def add_handler(self,message_class:int,handler)->None:
+        """Calls handler(signal,code,value) for every received message of message_class."""
+        self.handlers[message_class]=handler
+
+    def send_raw(self,message_class:int,node_id:int,channel:int,code:int,raw:int)->bool:
+        """Packs and sends one frame, returns False if the transport could not take it."""
+        pack(self.tx_buffer,channel,code,raw,utime.ticks_ms())
+        if self.transport.send(make_id(message_class,node_id),self.tx_buffer):
+            self.sent+=1
+            return True
+        self.send_errors+=1
+        return False
+
+    def send_value(self,signal:Signal,value,flags:int=FLAG_NONE)->bool:
+        """Sends a value of a signal of this node."""
+        return self.send_raw(MSG_VALUE,self.node_id,signal.channel,flags,signal.to_raw(value))
+
+    def send_sensor(self,sensor,flags:int=FLAG_NONE)->bool:
+        """Sends the last value of a sensor added to the registry."""
+        signal=self.registry.get_sensor_signal(sensor)
+        return self.send_value(signal,sensor.value,flags)
+
+    def send_value_block(self,first_channel:int,mask:int,raw0:int=0,raw1:int=0,raw2:int=0)->bool:
+        """Sends up to three raw 16 bit values of channels first_channel to first_channel+2 of this node."""
+        pack_block(self.tx_buffer,first_channel,mask,raw0,raw1,raw2)
+        if self.transport.send(make_id(MSG_VALUE_BLOCK,self.node_id),self.tx_buffer):
+            self.sent+=1
+            return True
+        self.send_errors+=1
+        return False
+
+    def send_alarm(self,signal:Signal,code:int,value)->bool:
+        """Sends an alarm of a signal of this node."""
+        return self.send_raw(MSG_ALARM,self.node_id,signal.channel,code,signal.to_raw(value))
+
+    def send_alarm_event(self,alarm)->None:
+        """Handler for general.alarm_events: sends alarms of sensors in the registry."""
+        signal=self.registry.get_sensor_signal(alarm.sensor)
+        if signal is not None:
+            self.send_alarm(signal,alarm.code,alarm.value)
+
+    def send_command(self,signal:Signal,command:int,value=0)->bool:
+        """Sends a command to the node owning signal, e.g. an actuator of another node."""
+        return self.send_raw(MSG_COMMAND,signal.node_id,signal.channel,command,signal.to_raw(value))
+
+    def poll(self)->int:
+        """Receives and handles all pending frames, returns the number of frames handled."""
+        count=0
+        buffer=self.rx_buffer
+        while True:
+            can_id=self.transport.recv_into(buffer)
+            if can_id<0:
+                return count
+            count+=1
+            self.received+=1
+            message_class,node_id=split_id(can_id)
+            if message_class==MSG_COMMAND and node_id!=self.node_id:
+                continue
+            if message_class==MSG_VALUE_BLOCK:
+                self.handle_block(node_id,buffer)
+                continue
+            handler=self.handlers.get(message_class)
+            if handler is None:
+                continue
+            channel,code,raw,timestamp=unpack(buffer)
+            signal=self.registry.get_signal(node_id,channel)
+            if signal is None:
+                self.unknown+=1
+                handler(None,code,raw)
+            else:
+                handler(signal,code,signal.from_raw(raw))
+
+    def handle_block(self,node_id:int,buffer)->None:
+        """Passes the values of a value block to the MSG_VALUE handler."""
+        handler=self.handlers.get(MSG_VALUE)
+        if handler is None:
+            return
+        first_channel,mask,raw0,raw1,raw2=unpack_block(buffer)
+        for n in range(BLOCK_VALUES):
+            if not mask&(1<<n):
+                continue
+            raw=raw0 if n==0 else raw1 if n==1 else raw2
+            signal=self.registry.get_signal(node_id,first_channel+n)
+            if signal is None:
+                self.unknown+=1
+                handler(None,FLAG_NONE,raw)
+            else:
+                handler(signal,FLAG_NONE,signal.from_raw(raw))
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the messages of this node."""
+        rep={}
+        rep['Sent']=self.sent
+        rep['Send Errors']=self.send_errors
+        rep['Received']=self.received
+        rep['Unknown']=self.unknown
+        return rep
+
+class LoopbackBus():
+    """In-process CAN bus for tests and simulations. Every frame sent by one transport is received
+    by all other transports of the bus. Counts frames and bits per message class to estimate the
+    bus utilisation at a bitrate."""
+    def __init__(self,bitrate:int=250000) -> None:
+        self.bitrate=bitrate
+        self.transports=[]
+        self.frames={} # message class -> frames
+        self.bits={} # message class -> bits
+
+    def transport(self,queue_frames:int=32):
+        """Returns a new transport connected to this bus."""
+        transport=LoopbackTransport(self,queue_frames)
+        self.transports.append(transport)
+        return transport
+
+    def transmit(self,sender,can_id:int,data)->bool:
+        message_class=can_id>>6
+        self.frames[message_class]=self.frames.get(message_class,0)+1
+        self.bits[message_class]=self.bits.get(message_class,0)+frame_bits(len(data))
+        for transport in self.transports:
+            if transport is not sender:
+                transport.deliver(can_id,data)
+        return True
+
+    def get_report(self,elapsed_s:float)->dict:
+        """Frames and bus utilisation [%] per message class over elapsed_s seconds of traffic."""
+        rep={}
+        total=0
+        for message_class in self.frames:
+            bits=self.bits[message_class]
+            total+=bits
+            rep[message_class]={'Frames':self.frames[message_class],'Load [%]':100*bits/(self.bitrate*elapsed_s) if elapsed_s else 0}
+        rep['Load [%]']=100*total/(self.bitrate*elapsed_s) if elapsed_s else 0
+        return rep
+
+    def reset_report(self)->None:
+        self.frames={}
+        self.bits={}
+
+class LoopbackTransport():
+    """Transport of a LoopbackBus with a preallocated receive ring, full rings drop new frames."""
+    def __init__(self,bus:LoopbackBus,queue_frames:int=32) -> None:
+        self.bus=bus
+        self.size=queue_frames+1 # one slot stays empty to tell a full ring from an empty one
+        self.ids=[0]*self.size
+        self.data=bytearray(FRAME_LEN*self.size)
+        self.view=memoryview(self.data)
+        self.read_index:int=0
+        self.write_index:int=0
+        self.dropped:int=0
+
+    def send(self,can_id:int,data)->bool:
+        return self.bus.transmit(self,can_id,data)
+
+    def deliver(self,can_id:int,data)->None:
+        index=self.write_index
+        next_index=index+1
+        if next_index==self.size:
+            next_index=0
+        if next_index==self.read_index:
+            self.dropped+=1
+            return
+        self.ids[index]=can_id
+        start=index*FRAME_LEN
+        self.view[start:start+FRAME_LEN]=data
+        self.write_index=next_index
+
+    def recv_into(self,buffer)->int:
+        index=self.read_index
+        if index==self.write_index:
+            return -1
+        can_id=self.ids[index]
+        start=index*FRAME_LEN
+        buffer[0:FRAME_LEN]=self.view[start:start+FRAME_LEN]
+        index+=1
+        if index==self.size:
+            index=0
+        self.read_index=index
+        return can_id
+
+    def any(self)->int:
+        """Number of received frames waiting."""
+        return (self.write_index-self.read_index)%self.size
@@ -0,0 +1,92 @@
+"""Device registry: device classes by name, their modules are imported on first use.
+
+A node only pays boot time and RAM for the modules its setup references, e.g. a node with bilge
+systems only never imports navigation.py or propulsion.py. All imports and setup steps can be
+timed by the BootProfiler, which also records the change of gc.mem_free() on the board."""
+import gc
+import utime
+
+# device name -> (module, class)
+DEVICES={
+    "BilgeSystem":("bilge","BilgeSystem"),
+    "NavigationSignals":("navigation","NavigationSignals"),
+    "Propulsion":("propulsion","Propulsion"),
+    "WaterCoolingSystem":("propulsion","WaterCoolingSystem"),
+    "Potentiometer":("sensors","Potentiometer"),
+    "int_Potentiometer":("sensors","int_Potentiometer"),
+    "WaterDetector":("sensors","WaterDetector"),
+    "TempSensor":("sensors","TempSensor"),
+    "RPMSensor":("sensors","RPMSensor"),
+    "Light":("actuators","Light"),
+    "Pump":("actuators","Pump"),
+    "Motor":("actuators","Motor"),
+    "PCA9685":("output_bank","PCA9685"),
+    "SBUSReceiver":("sbus_receiver","SBUSReceiver"),
+}
+
+_mem_free=getattr(gc,"mem_free",None) # MicroPython only
+
+class BootProfiler():
+    """Records time [us] and heap use [bytes] of imports and setup steps by name.
+    The heap is only measured on MicroPython, where gc.mem_free() exists."""
+    def __init__(self) -> None:
+        self.entries=[] # [name, time, heap]
+        self.start=utime.ticks_us()
+
+    def heap_used(self)->int:
+        if _mem_free is None:
+            return 0
+        gc.collect()
+        return -_mem_free()
+
+    def measure(self,name:str,function,*args):
+        """Calls function(*args), records its time and heap use and returns its result."""
+        heap=self.heap_used()
+        start=utime.ticks_us()
+        result=function(*args)
+        duration=utime.ticks_diff(utime.ticks_us(),start)
+        self.entries.append([name,duration,self.heap_used()-heap])
+        return result
+
+    def import_module(self,name:str):
+        """Imports a module and records it as 'import name'."""
+        return self.measure("import "+name,__import__,name)
+
+    def get_report(self)->dict:
+        """Used to retrieve time and heap use per entry and in total since the profiler was created."""
+        rep={}
+        for name,duration,heap in self.entries:
+            rep[name]={'Time [us]':duration,'Heap [bytes]':heap}
+        rep['Total [us]']=utime.ticks_diff(utime.ticks_us(),self.start)
+        if _mem_free is not None:
+            rep['Free Heap [bytes]']=_mem_free()
+        return rep
+
+class DeviceRegistry():
+    """Returns device classes by name, importing their module when a class is first requested."""
+    def __init__(self,profiler:BootProfiler=None) -> None:
+        self.devices=dict(DEVICES)
+        self.profiler=profiler
+        self.modules={} # module name -> module
+
+    def register(self,name:str,module:str,class_name:str="")->None:
+        """Adds a device class, e.g. of a custom module on this node."""
+        self.devices[name]=(module,class_name if class_name else name)
+
+    def get_module(self,module:str):
+        """Imports module on first use."""
+        if module not in self.modules:
+            if self.profiler is not None:
+                self.modules[module]=self.profiler.import_module(module)
+            else:
+                self.modules[module]=__import__(module)
+        return self.modules[module]
+
+    def get(self,name:str):
+        """Returns the device class name, raises KeyError for unknown devices."""
+        module,class_name=self.devices[name]
+        return getattr(self.get_module(module),class_name)
+
+    def loaded_modules(self)->list:
+        """Names of the modules imported so far."""
+        return list(self.modules)
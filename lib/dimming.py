@@ -0,0 +1,121 @@
+"""Dimming groups: lights dimmed together with gamma correction and smooth fades.
+
+A group maps its brightness level (0 to LEVELS-1) through a precomputed gamma lookup table to the
+brightness (0-65535) of its lights, each light maps it into its min_pwm to max_pwm range. Changing
+the target starts a fade, all fading groups are stepped by one shared scheduler task, which is only
+registered while a fade is running. Lights are only written when their PWM value changes."""
+import array
+import scheduler
+
+LEVELS=256 # brightness levels of a group, a 16 bit input uses its upper 8 bits
+FADE_FREQUENCY=50 # [Hz] of the shared fade task
+
+def gamma_table(gamma:float=2.2,max_duty:int=65535,levels:int=LEVELS):
+    """Brightness values for brightness levels, perceived brightness grows about linear with the level."""
+    table=array.array('H',[0]*levels)
+    for level in range(1,levels):
+        table[level]=max(int(max_duty*(level/(levels-1))**gamma+0.5),1) # only level 0 is off
+    return table
+
+_tables={} # gamma -> table, groups with the same gamma share their table
+
+class DimmingGroup():
+    """Lights with a common brightness. set_target() fades to a new level within fade_time [ms]."""
+    def __init__(self,name:str,gamma:float=2.2,fade_time:int=300) -> None:
+        self.name=name
+        if gamma not in _tables:
+            _tables[gamma]=gamma_table(gamma)
+        self.table=_tables[gamma]
+        self.fade_time=fade_time
+        self.lights=[]
+        self.level:int=LEVELS-1
+        self.target:int=LEVELS-1
+        self.step:int=0 # levels per fade tick
+        self.duty:int=self.table[self.level]
+        self.writes:int=0 # PWM writes caused by this group
+
+    def add_light(self,light)->None:
+        """Adds a light, it takes over the brightness of the group."""
+        self.lights.append(light)
+        light.set_brightness(self.duty)
+
+    def set_target(self,level:int,fade_time:int=-1)->None:
+        """Fades to level within fade_time [ms], the group's fade_time if not given, 0 to switch at once."""
+        if level<0:
+            level=0
+        elif level>=LEVELS:
+            level=LEVELS-1
+        if fade_time<0:
+            fade_time=self.fade_time
+        self.target=level
+        if level==self.level:
+            return
+        ticks=fade_time*FADE_FREQUENCY//1000
+        if ticks<=1:
+            self.level=level
+            self.update_lights()
+            return
+        distance=level-self.level if level>self.level else self.level-level
+        self.step=(distance+ticks-1)//ticks
+        get_fader().start_fade(self)
+
+    def set_target_u16(self,value:int,fade_time:int=-1)->None:
+        """Sets the target from a 16 bit value, e.g. a potentiometer reading."""
+        self.set_target(value>>8,fade_time)
+
+    def fade_step(self)->bool:
+        """Moves one step towards the target, returns True when the target is reached."""
+        if self.level<self.target:
+            self.level=min(self.level+self.step,self.target)
+        elif self.level>self.target:
+            self.level=max(self.level-self.step,self.target)
+        self.update_lights()
+        return self.level==self.target
+
+    def update_lights(self)->None:
+        """Passes the brightness of the current level to all lights, if it changed."""
+        duty=self.table[self.level]
+        if duty==self.duty:
+            return
+        self.duty=duty
+        for light in self.lights:
+            if light.set_brightness(duty):
+                self.writes+=1
+
+    def is_fading(self)->bool:
+        return self.level!=self.target
+
+class Fader():
+    """Steps all fading groups with one scheduler task."""
+    def __init__(self,frequency:int=FADE_FREQUENCY) -> None:
+        self.frequency=frequency
+        self.Scheduler=scheduler.get_scheduler()
+        self.task=None
+        self.fading=[]
+
+    def start_fade(self,group:DimmingGroup)->None:
+        if group not in self.fading:
+            self.fading.append(group)
+        if self.task is None:
+            self.task=self.Scheduler.add(self.callback_fade,frequency=self.frequency,name="Dimming fades")
+
+    def callback_fade(self,timer)->None:
+        """Steps all fades, removes finished ones and the task once no group is fading."""
+        done=False
+        for group in self.fading:
+            if group.fade_step():
+                done=True
+        if done:
+            self.fading=[group for group in self.fading if group.is_fading()]
+            if not self.fading:
+                self.Scheduler.remove(self.task)
+                self.task=None
+
+_fader=None
+
+def get_fader()->Fader:
+    """Returns the fader shared by all dimming groups of this node."""
+    global _fader
+    if _fader is None:
+        _fader=Fader()
+    return _fader
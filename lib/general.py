@@ -1,7 +1,18 @@
 """All general purpose classes and functions."""
-import machine
 import utime
+import array
+import json
+import micropython
 import simple_queue
+import scheduler
+import log
+
+_log=log.get_logger("general")
+EVENT_ALARM=_log.event(log.WARNING,"{}")
+_sensor_log=log.get_logger("sensors") # events of the Sensor base classes, shared with sensors.py
+EVENT_NEW_MIN_RAW=_sensor_log.event(log.DEBUG,"{}: New minimum raw value set to {}")
+EVENT_NEW_MAX_RAW=_sensor_log.event(log.DEBUG,"{}: New maximum raw value set to {}")
+EVENT_VALUE=_sensor_log.event(log.INFO,"{}: {} {}")
 
 def convert(x:float, in_min:float, in_max:float, out_min:float, out_max:float):
     """A function to convert sensor values"""
@@ -17,17 +28,271 @@ def convert_int(x:int, in_min:int, in_max:int, out_min:int, out_max:int):
     else:
         return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
     
+CALIBRATION_FILE="calibration.json" # Fixed calibration points of all sensors on this node, stored by sensor name
+
+class SetupError(Exception):
+    """Error class for invalid setup."""
+    pass
+
 class NoAvgValues(Exception):
     """Raises an error, if no avg values are present, but are requested."""
     pass
 
 class Alarm(Exception):
-    """Raises an Alarm when measured value is below minimum alarm or over maximum alarm value."""
+    """Alarm when measured value is below minimum alarm or over maximum alarm value.
+    Passed to the handlers of AlarmEvents with the attributes sensor, code, value and timestamp."""
     pass
 
+class Calibration():
+    """Converts raw readings into values. Slope and offset of every segment are precomputed whenever the
+    calibration changes, so the conversion is a multiplication and an addition (plus a shift for integers).
+    Without fixed points the raw range is taken from the sensor (auto-ranging), with two fixed points the
+    conversion is linear and with more points it is piecewise linear, e.g. for NTC thermistors."""
+    RANGE_BITS:int=29 # integer products stay below 2**29 to remain small ints on MicroPython
+    RAW_SPAN:int=65536 # raw differences the integer conversion is dimensioned for (16 bit ADC)
+    MAX_SHIFT:int=20
+
+    def __init__(self,integer:bool=False) -> None:
+        self.integer=integer
+        self.points=[] # fixed (raw, value) calibration points, sorted by raw value. Empty for auto-ranging.
+        self.segments:int=1
+        self.shift:int=0
+        self.breakpoints=array.array('l',[0]) # first raw value of each segment
+        self.slopes=array.array('l' if integer else 'f',[0])
+        self.offsets=array.array('l' if integer else 'f',[0])
+
+    def is_fixed(self)->bool:
+        """Returns True if fixed calibration points are used instead of auto-ranging."""
+        return len(self.points)>1
+
+    def set_range(self,in_min:float,in_max:float,out_min:float,out_max:float)->None:
+        """Linear conversion from the raw range to the value range, used for auto-ranging."""
+        if in_max==in_min:
+            self._compile([(in_min,0),(in_min+1,0)])
+        else:
+            self._compile([(in_min,out_min),(in_max,out_max)])
+
+    def set_points(self,points)->None:
+        """Sets fixed calibration points [(raw, value), ...], at least two. Auto-ranging is disabled."""
+        if len(points)<2:
+            raise ValueError("At least two calibration points are required.")
+        self.points=sorted([(p[0],p[1]) for p in points])
+        self._compile(self.points)
+
+    def clear_points(self)->None:
+        """Removes the fixed calibration points, the sensor falls back to auto-ranging."""
+        self.points=[]
+
+    def _compile(self,points)->None:
+        """Precomputes breakpoints, slopes and offsets of all segments."""
+        segments=len(points)-1
+        slopes=[]
+        for i in range(segments):
+            (x0,y0),(x1,y1)=points[i],points[i+1]
+            slopes.append((y1-y0)/(x1-x0) if x1!=x0 else 0)
+        shift=0
+        if self.integer:
+            # Integer segments compute y0+((raw-x0)*slope>>shift). Largest fixed point shift for which the
+            # product stays a small int for raw differences up to RAW_SPAN (extrapolation included).
+            largest=1
+            for i in range(segments):
+                largest=max(largest,abs(slopes[i])*max(self.RAW_SPAN,points[i+1][0]-points[i][0]))
+            while shift<self.MAX_SHIFT and largest*(2<<shift)<(1<<self.RANGE_BITS):
+                shift+=1
+        typecode='l' if self.integer else 'f'
+        self.breakpoints=array.array('l',[int(points[i][0]) for i in range(segments)])
+        self.slopes=array.array(typecode,[0]*segments)
+        self.offsets=array.array(typecode,[0]*segments)
+        for i in range(segments):
+            x0,y0=points[i]
+            if self.integer:
+                self.slopes[i]=round(slopes[i]*(1<<shift))
+                self.offsets[i]=int(y0)
+            else:
+                self.slopes[i]=slopes[i]
+                self.offsets[i]=y0-x0*slopes[i]
+        self.shift=shift
+        self.segments=segments
+
+    def convert(self,raw):
+        """Converts a raw reading into a value."""
+        i=0
+        if self.segments>1:
+            # Binary search for the last segment starting at or below raw, outside the table the first/last segment extrapolates.
+            lo=0
+            hi=self.segments-1
+            breakpoints=self.breakpoints
+            while lo<hi:
+                mid=(lo+hi+1)>>1
+                if breakpoints[mid]<=raw:
+                    lo=mid
+                else:
+                    hi=mid-1
+            i=lo
+        if self.integer:
+            return self.offsets[i]+((raw-self.breakpoints[i])*self.slopes[i]>>self.shift)
+        return raw*self.slopes[i]+self.offsets[i]
+
+    def to_list(self)->list:
+        """Returns the fixed calibration points as list, e.g. to store them."""
+        return [[p[0],p[1]] for p in self.points]
+
+ALARM_NONE=0
+ALARM_BELOW_MIN=1
+ALARM_ABOVE_MAX=2
+
+BURST_MEAN=0 # Reduction of burst samples to one raw value
+BURST_MEDIAN=1
+BURST_TRIMMED_MEAN=2 # mean without the lowest and highest quarter of the samples
+
+class AlarmEvents():
+    """Preallocated ring of alarm events (sensor id, code, value, timestamp).
+    Recording an event only stores numbers, so it can be done inside timer callbacks without
+    allocating. Messages are built and handlers called later by dispatch(), from the main loop
+    or from a callback scheduled with micropython.schedule (start_auto_dispatch)."""
+    def __init__(self,size:int=16) -> None:
+        self.size=size+1 # one slot stays empty to tell a full ring from an empty one
+        self.sensor_ids=array.array('H',[0]*self.size)
+        self.codes=bytearray(self.size)
+        self.values=array.array('f',[0]*self.size)
+        self.timestamps=array.array('L',[0]*self.size)
+        self.read_index:int=0 # only changed by dispatch()
+        self.write_index:int=0 # only changed by record()
+        self.recorded:int=0
+        self.dispatched:int=0
+        self.dropped:int=0 # events lost because the ring was full
+        self.sensors=[] # sensor objects by sensor id
+        self.handlers=[]
+        self.auto_dispatch:bool=False
+        self.dispatch_scheduled:bool=False
+        self._dispatch_ref=self._scheduled_dispatch # bound once, creating it in record() would allocate
+
+    def register_sensor(self,sensor)->int:
+        """Registers a sensor and returns its sensor id."""
+        self.sensors.append(sensor)
+        return len(self.sensors)-1
+
+    def add_handler(self,handler)->None:
+        """Adds a function to be called as handler(Alarm) for every dispatched event."""
+        self.handlers.append(handler)
+
+    def start_auto_dispatch(self)->None:
+        """Dispatches events automatically via micropython.schedule after they are recorded."""
+        self.auto_dispatch=True
+
+    def stop_auto_dispatch(self)->None:
+        """Events have to be dispatched by calling dispatch()."""
+        self.auto_dispatch=False
+
+    def record(self,sensor_id:int,code:int,value)->None:
+        """Stores an event, to be called from the read path. Does not allocate."""
+        index=self.write_index
+        next_index=index+1
+        if next_index==self.size:
+            next_index=0
+        if next_index==self.read_index:
+            self.dropped+=1
+            return
+        self.sensor_ids[index]=sensor_id
+        self.codes[index]=code
+        self.values[index]=value
+        self.timestamps[index]=utime.ticks_ms()
+        self.write_index=next_index
+        self.recorded+=1
+        if self.auto_dispatch and not self.dispatch_scheduled:
+            self.dispatch_scheduled=True # set first, the scheduled dispatch may run before schedule() returns
+            try:
+                micropython.schedule(self._dispatch_ref,0)
+            except RuntimeError: # schedule queue full, try again with the next event
+                self.dispatch_scheduled=False
+
+    def _scheduled_dispatch(self,arg)->None:
+        self.dispatch_scheduled=False
+        self.dispatch()
+
+    def pending(self)->int:
+        """Number of recorded events not dispatched yet."""
+        return (self.write_index-self.read_index)%self.size
+
+    def format_event(self,index:int)->str:
+        """Builds the alarm message of the event in slot index."""
+        sensor=self.sensors[self.sensor_ids[index]]
+        if self.codes[index]==ALARM_BELOW_MIN:
+            return sensor.name+": measured value "+str(self.values[index])+" "+sensor.unit+" below set Alarm point of "+str(sensor.min_alarm_value)+" "+sensor.unit+"."
+        return sensor.name+": measured value "+str(self.values[index])+" "+sensor.unit+" above set Alarm point of "+str(sensor.max_alarm_value)+" "+sensor.unit+"."
+
+    def dispatch(self)->int:
+        """Formats all pending events and passes them as Alarm to the handlers (logged if there are none).
+        Returns the number of events dispatched."""
+        count=0
+        while self.read_index!=self.write_index:
+            index=self.read_index
+            alarm=Alarm(self.format_event(index))
+            alarm.sensor=self.sensors[self.sensor_ids[index]]
+            alarm.code=self.codes[index]
+            alarm.value=self.values[index]
+            alarm.timestamp=self.timestamps[index]
+            index+=1
+            if index==self.size:
+                index=0
+            self.read_index=index
+            count+=1
+            self.dispatched+=1
+            if self.handlers:
+                for handler in self.handlers:
+                    handler(alarm)
+            else:
+                self.log_alarm(alarm)
+        return count
+
+    def log_alarm(self,alarm)->None:
+        """Logs an alarm, done for every event while there are no handlers. Can be added as handler."""
+        _log.write(EVENT_ALARM,alarm)
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the alarm events."""
+        rep={}
+        rep['Recorded']=self.recorded
+        rep['Dispatched']=self.dispatched
+        rep['Pending']=self.pending()
+        rep['Dropped']=self.dropped
+        return rep
+
+alarm_events=AlarmEvents() # Alarm events of all sensors on this node
+
+class DebugMode():
+    """Debug level of the "sensors" logger while at least one sensor is in debug mode. The previous
+    level is restored when the last one leaves, the log is drained automatically meanwhile unless
+    that was set up already."""
+    def __init__(self) -> None:
+        self.sensors:int=0 # sensors in debug mode
+        self.previous_level:int=_sensor_log.level
+        self.started_drain:bool=False
+
+    def enter(self)->None:
+        if self.sensors==0:
+            self.previous_level=_sensor_log.level
+            _sensor_log.set_level(log.DEBUG)
+            self.started_drain=not log.is_auto_draining()
+            if self.started_drain:
+                log.start_auto_drain()
+        self.sensors+=1
+
+    def leave(self)->None:
+        self.sensors-=1
+        if self.sensors==0:
+            _sensor_log.set_level(self.previous_level)
+            if self.started_drain:
+                log.stop_auto_drain()
+                self.started_drain=False
+
+debug_mode=DebugMode()
+
 class Sensor():
     """A class with general sensor attributes and methods, to be inherited by the specific
     sensor classes."""
+    queue_typecode:str='d' # array typecode of the values stored in QueueValues, see simple_queue.Queue
+    integer_values:bool=False # Calibration in integer fixed point arithmetic
     def __init__(self,name:str,unit:str,read_frequency:int=10,queue_length:int=0,broadcast:bool=False) -> None:
         self.name=name
         self.unit=unit
@@ -41,18 +306,25 @@ class Sensor():
         self.min_read_value:float=64000
         self.max_read_value:float=0
         self.read_frequency=read_frequency #[Hz]
-        self.TimerR=machine.Timer()
+        self.Calibration=Calibration(self.integer_values)
+        self.Scheduler=scheduler.get_scheduler()
+        self.read_task=None
+        self.broadcast_task=None
         self.broadcast=broadcast
         self.min_alarm_value:float=0
         self.check_min_alarm:bool=False
         self.max_alarm_value:float=64000
         self.check_max_alarm:bool=False
+        self.alarm_state:int=ALARM_NONE # Alarm code of the last reading, events are only recorded on changes
+        self.sensor_id:int=alarm_events.register_sensor(self)
         self.avg_value:float=0
-        if broadcast:
-            self.TimerB=machine.Timer()
-            self.broadcast_period:int=1000 #[ms]
+        self.burst_samples:int=1 # ADC samples per reading, see set_burst()
+        self.burst_mode:int=BURST_MEAN
+        self.burst_buffer=None
+        self.broadcast_period:int=1000 #[ms]
+        self.publisher=None # telemetry.TelemetryPublisher sending the values instead of an own broadcast task
         if queue_length>0:
-            self.QueueValues=simple_queue.Queue(queue_length)
+            self.QueueValues=simple_queue.StatsQueue(queue_length,self.queue_typecode)
             self._avg_counter:int=0
             self.use_queue=True
         else:
@@ -69,8 +341,51 @@ class Sensor():
         """Use this method to set upper and lower limits for this sensor."""
         self.min_value=min_value
         self.max_value=max_value
+        self.update_calibration()
         return self.name+": New limits set to "+str(self.min_value)+" "+self.unit+" min and "+str(self.max_value)+" "+self.unit+" max."
     
+    def update_calibration(self)->None:
+        """Recomputes the conversion after limits or the auto-ranged raw range changed."""
+        if not self.Calibration.is_fixed():
+            self.Calibration.set_range(self.min_raw_value,self.max_raw_value,self.min_value,self.max_value)
+
+    def set_calibration_points(self,points)->str:
+        """Sets fixed calibration points [(raw, value), ...]. With two points the conversion is linear,
+        with more points piecewise linear. Replaces auto-ranging of the raw values."""
+        self.Calibration.set_points(points)
+        return self.name+": "+str(len(points))+" calibration points set."
+
+    def clear_calibration_points(self)->str:
+        """Returns to auto-ranging between the minimum and maximum raw value read."""
+        self.Calibration.clear_points()
+        self.update_calibration()
+        return self.name+": Calibration points removed, auto-ranging."
+
+    def save_calibration(self,filename:str=CALIBRATION_FILE)->str:
+        """Stores the calibration points of this sensor persistently on flash."""
+        try:
+            with open(filename) as f:
+                calibrations=json.load(f)
+        except (OSError,ValueError):
+            calibrations={}
+        calibrations[self.name]=self.Calibration.to_list()
+        with open(filename,"w") as f:
+            json.dump(calibrations,f)
+        return self.name+": Calibration saved."
+
+    def load_calibration(self,filename:str=CALIBRATION_FILE)->bool:
+        """Loads stored calibration points of this sensor, returns False if none are stored."""
+        try:
+            with open(filename) as f:
+                calibrations=json.load(f)
+        except (OSError,ValueError):
+            return False
+        points=calibrations.get(self.name)
+        if not points:
+            return False
+        self.Calibration.set_points(points)
+        return True
+
     def set_min_alarm(self,min_alarm_value:float)->str:
         self.min_alarm_value=min_alarm_value
         self.check_min_alarm=True
@@ -81,6 +396,48 @@ class Sensor():
         self.check_max_alarm=True
         return "Max Alarm set to "+str(self.max_alarm_value)
 
+    def set_burst(self,samples:int,mode:int=BURST_MEAN)->str:
+        """Take several ADC samples per reading and reduce them to one raw value with mode
+        (BURST_MEAN, BURST_MEDIAN or BURST_TRIMMED_MEAN). Allows lower read frequencies with less noise."""
+        self.burst_samples=max(samples,1)
+        self.burst_mode=mode
+        self.burst_buffer=array.array('H',[0]*self.burst_samples)
+        return self.name+": Burst of "+str(self.burst_samples)+" samples per reading."
+
+    def read_adc(self,adc):
+        """Reads adc once or, in burst mode, reduces several samples collected in the preallocated buffer."""
+        count=self.burst_samples
+        if count==1:
+            return adc.read_u16()
+        buff=self.burst_buffer
+        for i in range(count):
+            buff[i]=adc.read_u16()
+        first=0
+        last=count
+        if self.burst_mode!=BURST_MEAN:
+            # Insertion sort in place, burst sizes are small.
+            for i in range(1,count):
+                sample=buff[i]
+                j=i-1
+                while j>=0 and buff[j]>sample:
+                    buff[j+1]=buff[j]
+                    j-=1
+                buff[j+1]=sample
+            if self.burst_mode==BURST_MEDIAN:
+                if count&1:
+                    return buff[count>>1]
+                first=(count>>1)-1
+                last=first+2
+            else:
+                first=count>>2
+                last=count-first
+        total=0
+        for i in range(first,last):
+            total+=buff[i]
+        if self.integer_values:
+            return total//(last-first)
+        return total/(last-first)
+
     def read_raw(self)->float:
         """Raw reading. This method has to be overwritten by the Sensor specific child class."""
         raw_value=90 #Placeholder
@@ -92,43 +449,55 @@ class Sensor():
         # Adjust maximum and minimum values if necessary:
         if read_value<self.min_raw_value:
             self.min_raw_value=read_value
+            self.update_calibration()
             if self.debug: 
-                print("New minimum raw value set to "+str(self.min_raw_value))
+                _sensor_log.write(EVENT_NEW_MIN_RAW,self.name,self.min_raw_value)
         if read_value>self.max_raw_value:
             self.max_raw_value=read_value
+            self.update_calibration()
             if self.debug: 
-                print("New maximum raw value set to "+str(self.max_raw_value))
+                _sensor_log.write(EVENT_NEW_MAX_RAW,self.name,self.max_raw_value)
         if self.unit=="RPM":
             self.value=read_value
         else:
-            self.value=self.convert(read_value,self.min_raw_value,self.max_raw_value,self.min_value,self.max_value)
+            self.value=self.Calibration.convert(read_value)
         if self.value<self.min_read_value:
             self.min_read_value=self.value
         if self.value>self.max_read_value:
             self.max_read_value=self.value
         if self.use_queue:
             self.QueueValues.put(self.value)
-        if self.check_min_alarm:
-            if self.value<self.min_alarm_value:
-                message=self.name+": measured value "+str(self.value)+" "+self.unit+"below set Alarm point of "+str(self.min_alarm_value)+" "+self.unit+"."
-                raise Alarm(message)
-        if self.check_max_alarm:
-            if self.value>self.max_alarm_value:
-                message=self.name+": measured value "+str(self.value)+" "+self.unit+"above set Alarm point of "+str(self.max_alarm_value)+" "+self.unit+"."
-                raise Alarm(message)
+        state=ALARM_NONE
+        if self.check_min_alarm and self.value<self.min_alarm_value:
+            state=ALARM_BELOW_MIN
+        elif self.check_max_alarm and self.value>self.max_alarm_value:
+            state=ALARM_ABOVE_MAX
+        if state!=self.alarm_state:
+            self.alarm_state=state
+            if state!=ALARM_NONE:
+                alarm_events.record(self.sensor_id,state,self.value)
+
+    def get_alarm_state(self)->int:
+        """Returns ALARM_NONE, ALARM_BELOW_MIN or ALARM_ABOVE_MAX for the last reading."""
+        return self.alarm_state
 
     def start_reading(self)->str:
-        """Starts timer and reads values regularly."""
-        self.TimerR.init(mode=machine.Timer.PERIODIC,freq=self.read_frequency,callback=self.callback_read_value)
+        """Registers with the node scheduler and reads values regularly."""
+        if self.read_task is not None:
+            self.Scheduler.remove(self.read_task)
+        self.read_task=self.Scheduler.add(self.callback_read_value,frequency=self.read_frequency,name=self.name+" read")
         return self.name+": Start reading values."
 
     def set_read_frequency(self,frequency:int):
-        """Set the reading frequency"""
-        self.TimerR.init(mode=machine.Timer.PERIODIC,freq=frequency,callback=self.callback_read_value)
+        """Set the reading frequency and (re-)starts reading."""
+        self.read_frequency=frequency
+        self.start_reading()
 
     def stop_reading(self)->str:
         """Stops reading values."""
-        self.TimerR.deinit()
+        if self.read_task is not None:
+            self.Scheduler.remove(self.read_task)
+            self.read_task=None
         return self.name+": Reading stopped."
 
     def get_value(self)->float:
@@ -136,27 +505,31 @@ class Sensor():
         return self.value
     
     def callback_print_value(self,timer):
-        """Prints value (later to given broadcast channel)."""
-        if self.debug: 
-            print("Here is the output:")
-        print(self.name+": "+str(self.value)+' '+self.unit)
+        """Logs the value (later to given broadcast channel)."""
+        _sensor_log.write(EVENT_VALUE,self.name,self.value,self.unit)
     
     def start_broadcasting(self)->str:
         """Starts to broadcast values"""
-        self.TimerB.init(mode=machine.Timer.PERIODIC,period=self.broadcast_period,callback=self.callback_print_value)
+        if self.publisher is not None:
+            self.broadcast=True
+            return self.name+": Start publishing values with the node telemetry"
+        if self.broadcast_task is not None:
+            self.Scheduler.remove(self.broadcast_task)
+        self.broadcast_task=self.Scheduler.add(self.callback_print_value,period=self.broadcast_period)
         self.broadcast=True
         return self.name+": Start broadcasting values"
     
     def set_broadcast_period(self,period:int)->str:
         """Sets a new broadcast period [ms] and (re)-starts broadcast."""
         self.broadcast_period=period
-        self.TimerB.init(mode=machine.Timer.PERIODIC,period=self.broadcast_period,callback=self.callback_print_value)
-        self.broadcast=True
+        self.start_broadcasting()
         return self.name+": Broadcast period set to "+str(self.broadcast_period)+"ms, broadcast restarted."
 
     def stop_broadcasting(self)->str:
         """Stops broadcasting position values."""
-        self.TimerB.deinit()
+        if self.broadcast_task is not None:
+            self.Scheduler.remove(self.broadcast_task)
+            self.broadcast_task=None
         self.broadcast=False
         return self.name+": Stopped broadcasting."
     
@@ -166,6 +539,13 @@ class Sensor():
             raise NoAvgValues()
         self.avg_value=self.QueueValues.get_avg()
         return self.avg_value
+
+    def get_window_stats(self)->dict:
+        """Returns min, max, mean, variance and approximate median of the values in the queue,
+        raises an exception if no queue is used."""
+        if not self.use_queue:
+            raise NoAvgValues()
+        return self.QueueValues.get_stats()
     
     def get_min_read_value(self)->float:
         """Returns the minimum measured value."""
@@ -176,16 +556,23 @@ class Sensor():
         return self.max_read_value
     
     def start_debug(self)->str:
-        """Starts debug mode of this sensor."""
-        self.debug=True
+        """Starts debug mode of this sensor, its debug events are logged by the "sensors" logger and
+        printed by the automatic log drain (see DebugMode)."""
+        if not self.debug:
+            self.debug=True
+            debug_mode.enter()
         return self.name+": Start debug mode."
     
     def stop_debug(self)->str:
-        """Stops debug mode of this sensor."""
-        self.debug=False
+        """Stops debug mode of this sensor, the log level is restored with the last sensor leaving debug mode."""
+        if self.debug:
+            self.debug=False
+            debug_mode.leave()
         return self.name+": Stopped debug mode."
   
 class int_Sensor(Sensor):
+    queue_typecode:str='l'
+    integer_values:bool=True
     def __init__(self, name: str, unit: str, read_frequency: int = 10, queue_length: int = 0, broadcast: bool = False) -> None:
         super().__init__(name, unit, read_frequency, queue_length, broadcast)
         self.min_raw_value:int=64000
@@ -210,6 +597,7 @@ class int_Sensor(Sensor):
         """Use this method to set upper and lower limits for this sensor."""
         self.min_value=min_value
         self.max_value=max_value
+        self.update_calibration()
         return self.name+": New limits set to "+str(self.min_value)+" "+self.unit+" min and "+str(self.max_value)+" "+self.unit+" max."
     
     def set_min_alarm(self,min_alarm_value:int)->str:
@@ -0,0 +1,123 @@
+"""Opt-in instrumentation of callback execution time and inter-arrival jitter.
+
+Call enable() before the systems are set up. Callbacks registered afterwards are wrapped and
+measured with utime.ticks_us into fixed size histograms. While disabled, wrap() returns the callback
+itself, so there is no cost at all."""
+import array
+import utime
+
+BUCKETS=16 # log2 histogram: bucket 0 counts 0 us, bucket i counts values of 2**(i-1) to 2**i-1 us, the last one everything above
+
+_enabled=[False]
+_probes={} # name -> Probe
+
+def enable()->None:
+    """Instruments all callbacks registered from now on."""
+    _enabled[0]=True
+
+def disable()->None:
+    """Callbacks registered from now on are not instrumented, existing wrappers keep measuring."""
+    _enabled[0]=False
+
+def is_enabled()->bool:
+    return _enabled[0]
+
+def bucket(value:int)->int:
+    """Histogram bucket of a value in us."""
+    index=0
+    while value and index<BUCKETS-1:
+        value>>=1
+        index+=1
+    return index
+
+class Probe():
+    """Execution time and inter-arrival statistics of one callback."""
+    def __init__(self,name:str,period_us:int=0) -> None:
+        self.name=name
+        self.period_us=period_us # nominal period, jitter is the deviation from it. 0: deviation from the previous interval
+        self.calls:int=0
+        self.total_exec_us:int=0
+        self.max_exec_us:int=0
+        self.max_jitter_us:int=0
+        self.last_start:int=0
+        self.last_interval:int=0
+        self.exec_histogram=array.array('L',[0]*BUCKETS)
+        self.jitter_histogram=array.array('L',[0]*BUCKETS)
+
+    def record(self,start:int,end:int)->None:
+        """Adds one call that started and ended at the given ticks_us values."""
+        duration=utime.ticks_diff(end,start)
+        self.total_exec_us+=duration
+        if duration>self.max_exec_us:
+            self.max_exec_us=duration
+        self.exec_histogram[bucket(duration)]+=1
+        if self.calls:
+            interval=utime.ticks_diff(start,self.last_start)
+            reference=self.period_us if self.period_us else self.last_interval
+            if reference:
+                jitter=interval-reference
+                if jitter<0:
+                    jitter=-jitter
+                if jitter>self.max_jitter_us:
+                    self.max_jitter_us=jitter
+                self.jitter_histogram[bucket(jitter)]+=1
+            self.last_interval=interval
+        self.last_start=start
+        self.calls+=1
+
+    def reset(self)->None:
+        self.calls=0
+        self.total_exec_us=0
+        self.max_exec_us=0
+        self.max_jitter_us=0
+        self.last_interval=0
+        for i in range(BUCKETS):
+            self.exec_histogram[i]=0
+            self.jitter_histogram[i]=0
+
+    def get_report(self)->dict:
+        """Used to retrieve the stats of this callback."""
+        rep={}
+        rep['Calls']=self.calls
+        rep['Avg Exec [us]']=self.total_exec_us//self.calls if self.calls else 0
+        rep['Max Exec [us]']=self.max_exec_us
+        rep['Max Jitter [us]']=self.max_jitter_us
+        rep['Exec Histogram']=list(self.exec_histogram)
+        rep['Jitter Histogram']=list(self.jitter_histogram)
+        return rep
+
+def get_probe(name:str,period_us:int=0)->Probe:
+    """Returns the probe with this name, creating it if necessary."""
+    probe=_probes.get(name)
+    if probe is None:
+        probe=Probe(name,period_us)
+        _probes[name]=probe
+    return probe
+
+def wrap(name:str,callback,period_us:int=0):
+    """Returns callback measured by the probe name if instrumentation is enabled, else callback itself.
+    period_us is the nominal call period for the jitter statistics, if known."""
+    if not _enabled[0]:
+        return callback
+    probe=get_probe(name,period_us)
+    ticks_us=utime.ticks_us
+    def instrumented(*args):
+        start=ticks_us()
+        try:
+            return callback(*args)
+        finally:
+            probe.record(start,ticks_us())
+    return instrumented
+
+def get_report()->dict:
+    """Used to retrieve the stats of all instrumented callbacks by name.
+    Histogram bucket i counts values below 2**i us."""
+    rep={}
+    for name in _probes:
+        rep[name]=_probes[name].get_report()
+    return rep
+
+def reset()->None:
+    """Clears the stats of all probes."""
+    for name in _probes:
+        _probes[name].reset()
@@ -0,0 +1,191 @@
+"""Leveled log of the lib modules, used instead of print().
+
+Every module registers its messages once as events with a level and a format text:
+    _log=log.get_logger("sensors")
+    EVENT_WATER=_log.event(log.WARNING,"{}: Water ingress detected!")
+    _log.write(EVENT_WATER,self.name)
+write() stores the event id, a timestamp and up to three arguments in a preallocated ring without
+allocating, the text is only formatted when the log is drained: by drain() from the main loop or by
+a scheduler task (start_auto_drain). Events below the level of their module are not stored, events
+arriving while the ring is full are counted as dropped."""
+import array
+import utime
+import scheduler
+
+DEBUG=10
+INFO=20
+WARNING=30
+ERROR=40
+LEVEL_NAMES={DEBUG:"DEBUG",INFO:"INFO",WARNING:"WARNING",ERROR:"ERROR"}
+DEFAULT_LEVEL=INFO
+RING_SIZE=64 # events
+ARGS=3 # arguments per event
+MAX_EVENTS=1024 # event ids are stored as 16 bit
+
+class Logger():
+    """Events and log level of one module."""
+    def __init__(self,name:str,level:int=DEFAULT_LEVEL) -> None:
+        self.name=name
+        self.level=level
+
+    def event(self,level:int,text:str)->int:
+        """Registers a message, text is formatted with str.format() and the arguments of write()."""
+        return ring.add_event(self,level,text)
+
+    def set_level(self,level:int)->None:
+        """Events below level are not logged."""
+        self.level=level
+
+    def is_enabled(self,level:int)->bool:
+        return level>=self.level
+
+    def write(self,event:int,a=None,b=None,c=None)->None:
+        """Logs an event with up to three arguments, does not allocate."""
+        if ring.event_levels[event]>=self.level:
+            ring.record(event,a,b,c)
+
+class LogRing():
+    """Logged events in a ring, the oldest are formatted first."""
+    def __init__(self,size:int=RING_SIZE) -> None:
+        self.size=size
+        self.events=array.array('H',[0]*size)
+        self.timestamps=array.array('L',[0]*size)
+        self.args=[None]*(ARGS*size) # references only, the arguments are converted when drained
+        self.read_index:int=0 # only changed by drain()
+        self.write_index:int=0 # only changed by record()
+        self.recorded:int=0
+        self.drained:int=0
+        self.dropped:int=0 # events lost because the ring was full
+        self.event_loggers=[] # event id -> Logger
+        self.event_levels=array.array('B') # event id -> level
+        self.event_texts=[] # event id -> format text
+        self.handlers=[]
+        self.drain_task=None
+        self.drain_max:int=0
+
+    def add_event(self,logger:Logger,level:int,text:str)->int:
+        if len(self.event_texts)>=MAX_EVENTS:
+            raise ValueError("Too many log events.")
+        self.event_loggers.append(logger)
+        self.event_levels.append(level)
+        self.event_texts.append(text)
+        return len(self.event_texts)-1
+
+    def record(self,event:int,a,b,c)->None:
+        """Stores an event, to be called from callbacks. Does not allocate."""
+        index=self.write_index
+        next_index=index+1
+        if next_index==self.size:
+            next_index=0
+        if next_index==self.read_index:
+            self.dropped+=1
+            return
+        self.events[index]=event
+        self.timestamps[index]=utime.ticks_ms()
+        slot=ARGS*index
+        self.args[slot]=a
+        self.args[slot+1]=b
+        self.args[slot+2]=c
+        self.write_index=next_index
+        self.recorded+=1
+
+    def pending(self)->int:
+        """Number of events not drained yet."""
+        return (self.write_index-self.read_index)%self.size
+
+    def format_event(self,index:int)->str:
+        """Builds the log line of the event in slot index."""
+        event=self.events[index]
+        slot=ARGS*index
+        message=self.event_texts[event].format(self.args[slot],self.args[slot+1],self.args[slot+2])
+        level=LEVEL_NAMES.get(self.event_levels[event],str(self.event_levels[event]))
+        return str(self.timestamps[index])+" "+level+" "+self.event_loggers[event].name+": "+message
+
+    def drain(self,max_events:int=0)->int:
+        """Formats pending events and passes the lines to the handlers (printed if there are none).
+        Drains at most max_events, all if 0. Returns the number of events drained."""
+        count=0
+        while self.read_index!=self.write_index:
+            if max_events and count>=max_events:
+                break
+            index=self.read_index
+            line=self.format_event(index)
+            slot=ARGS*index
+            self.args[slot]=None # release the arguments
+            self.args[slot+1]=None
+            self.args[slot+2]=None
+            index+=1
+            if index==self.size:
+                index=0
+            self.read_index=index
+            count+=1
+            self.drained+=1
+            if self.handlers:
+                for handler in self.handlers:
+                    handler(line)
+            else:
+                print(line)
+        return count
+
+    def clear(self)->None:
+        """Discards all pending events."""
+        while self.read_index!=self.write_index:
+            slot=ARGS*self.read_index
+            self.args[slot]=None
+            self.args[slot+1]=None
+            self.args[slot+2]=None
+            self.read_index=(self.read_index+1)%self.size
+
+    def callback_drain(self,timer)->None:
+        self.drain(self.drain_max)
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the log."""
+        rep={}
+        rep['Recorded']=self.recorded
+        rep['Drained']=self.drained
+        rep['Pending']=self.pending()
+        rep['Dropped']=self.dropped
+        return rep
+
+ring=LogRing() # Log of all modules on this node
+_loggers={} # module name -> Logger
+
+def get_logger(name:str)->Logger:
+    """Returns the logger of a module, created on first use."""
+    if name not in _loggers:
+        _loggers[name]=Logger(name)
+    return _loggers[name]
+
+def set_level(name:str,level:int)->None:
+    """Sets the log level of a module, e.g. log.set_level("sensors",log.DEBUG)."""
+    get_logger(name).set_level(level)
+
+def get_levels()->dict:
+    """Log level by module."""
+    return {name:logger.level for name,logger in _loggers.items()}
+
+def add_handler(handler)->None:
+    """Adds a function to be called as handler(line) for every drained event instead of print()."""
+    ring.handlers.append(handler)
+
+def drain(max_events:int=0)->int:
+    return ring.drain(max_events)
+
+def start_auto_drain(period:int=200,max_events:int=8)->None:
+    """Drains at most max_events every period [ms] from a scheduler task, so printing stays out of
+    the callbacks that log and a burst of events is spread over several ticks."""
+    stop_auto_drain()
+    ring.drain_max=max_events
+    ring.drain_task=scheduler.get_scheduler().add(ring.callback_drain,period=period,name="Log drain")
+
+def stop_auto_drain()->None:
+    if ring.drain_task is not None:
+        scheduler.get_scheduler().remove(ring.drain_task)
+        ring.drain_task=None
+
+def is_auto_draining()->bool:
+    return ring.drain_task is not None
+
+def get_report()->dict:
+    return ring.get_report()
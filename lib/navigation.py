@@ -0,0 +1,232 @@
+# Navigation lights and shapes
+import general
+import sensors
+import actuators
+import scheduler
+import dimming
+import log
+
+_log=log.get_logger("navigation")
+EVENT_DIMMER=_log.event(log.DEBUG,"Navigation lights dimmed, value {}.")
+EVENT_PLACEHOLDER=_log.event(log.INFO,"Placeholder, {}.") # shapes are not implemented yet
+EVENT_DIM_POTI=_log.event(log.DEBUG,"Dimmer potentiometer {}")
+
+# State flags, a NavigationSignals state is the combination of these bits
+STATE_DARK=1
+STATE_MOVING=2
+STATE_TOWING=4
+STATE_RESTRICTED=8
+STATE_ANCHORED=16
+STATE_FLAGS=5 # number of flags, the light table has 2**STATE_FLAGS entries
+
+class NavigationSignals:
+    """This class manages all navigation lights and shapes.
+    Possible states: 
+    0 - docked. All lights and shapes available for manual operation
+    1 - moving. Navigation lights switched on (manual, brightness sensor or sunset / sunrise data)
+    2 - restricted maneuverability. If dark, navigation lights and restricted maneuverability lights lightened, during daylight shapes of ball rhomb and ball are set.
+    3 - towing. 
+    4 - At anchor.
+    Other states / setups to be includes, as per https://de.wikipedia.org/wiki/Lichterf%C3%BChrung
+    Every light has a bit in the light masks. At setup, the lights required in every combination of the
+    STATE_* flags are precomputed into light_table, a transition only switches the lights whose bit
+    differs between the new mask and the lights actually on, so lights switched directly are corrected."""
+
+    def __init__(self,ship_length:float) -> None:
+        self.ship_length=ship_length
+        self.is_dark=False # Indicates if it is dark or daylight
+        self.towing=False  # Trigger for towing signals
+        self.restricted_maneuver=False 
+        self.anchored=False
+        self.moving=True
+        self.state:int=STATE_MOVING
+        self.all_lights=[] # light n has bit 1<<n in the masks
+        self.signal_groups=[] # [state flag, light mask]: lights on if it is dark and the flag is set
+        self.light_table=[0]*(1<<STATE_FLAGS) # state -> mask of lights to be on
+        self.lights_on:int=0 # mask of the lights on after the last transition
+        self.DimGroup=dimming.DimmingGroup("Navigation lights") # brightness of all lights
+        self.dimmer:int=0
+        self.has_dim_potentiometer:bool=False
+        self.debug=False
+    
+    def setup_position_lights(self,Pin_Toplight,Pin_PSLight,Pin_SBLight,Pin_RearLight,Pin_Toplight2=0):
+        self.PSLight=actuators.Light(Pin_PSLight,"Port side navigation light")
+        self.SBLight=actuators.Light(Pin_SBLight,"Starboard side navigation light")
+        self.RearLight=actuators.Light(Pin_RearLight,"Rear navigation light")
+        self.Toplight=actuators.Light(Pin_Toplight,"Navigation Toplight")
+        self.Position_Lights=[self.PSLight,self.SBLight,self.RearLight,self.Toplight]
+        if self.ship_length>50:
+            if Pin_Toplight2 == 0:
+                raise general.SetupError("Ship is longer than 50m, second top light required!")
+            self.Toplight2=actuators.Light(Pin_Toplight2,"Second Toplight for navigation")
+            self.Position_Lights.append(self.Toplight2)
+        self.add_signal_group(self.Position_Lights,STATE_MOVING)
+
+    def setup_towlights(self,Pin_Towlight1,Pin_Towlight2,Pin_Towlight3=0):
+        self.Towlight1=actuators.Light(Pin_Towlight1,"First towlight")
+        self.Towlight2=actuators.Light(Pin_Towlight2,"Second towlight")
+        self.towlights=[self.Towlight1,self.Towlight2]
+        if Pin_Towlight3>0:
+            self.Towlight3=actuators.Light(Pin_Towlight3,"Third towlight")
+            self.towlights.append(self.Towlight3)
+        self.add_signal_group(self.towlights,STATE_TOWING)
+        self.rhomb="Placeholder for a servo / winch to pull up the rhomb signal."
+
+    def setup_restricted_manueverability(self,Pin_RM1,Pin_RM2,Pin_RM3):
+        self.RMLight1=actuators.Light(Pin_RM1,"First light for reduced maneuverability")
+        self.RMLight2=actuators.Light(Pin_RM2,"Second light for reduced maneuverability")
+        self.RMLight3=actuators.Light(Pin_RM3,"Third light for reduced maneuverability")
+        self.rm_lights=[self.RMLight1,self.RMLight2,self.RMLight3]
+        self.add_signal_group(self.rm_lights,STATE_RESTRICTED)
+        self.BallRhombBall="Placeholder for a ball rhomb ball shape to be set"
+
+    def add_signal_group(self,lights:list,state_flag:int)->None:
+        """Adds lights to be on when it is dark and state_flag is set, and rebuilds the light table."""
+        mask=0
+        for light in lights:
+            mask|=1<<len(self.all_lights)
+            self.all_lights.append(light)
+            self.DimGroup.add_light(light)
+        self.signal_groups.append([state_flag,mask])
+        self.build_light_table()
+        self.apply_state()
+
+    def build_light_table(self)->None:
+        """Precomputes the lights to be on for every state."""
+        for state in range(1<<STATE_FLAGS):
+            mask=0
+            if state&STATE_DARK:
+                for flag,group_mask in self.signal_groups:
+                    if state&flag:
+                        mask|=group_mask
+            self.light_table[state]=mask
+
+    def get_lights_on(self)->int:
+        """Mask of the lights switched on, read from the lights."""
+        mask=0
+        bit=1
+        for light in self.all_lights:
+            if light.on_state:
+                mask|=bit
+            bit<<=1
+        return mask
+
+    def apply_state(self)->int:
+        """Switches the lights whose state differs from the light table, returns the number switched."""
+        target=self.light_table[self.state]
+        diff=target^self.get_lights_on()
+        switched=0
+        index=0
+        while diff:
+            if diff&1:
+                if target&(1<<index):
+                    self.all_lights[index].switch_on()
+                else:
+                    self.all_lights[index].switch_off()
+                switched+=1
+            diff>>=1
+            index+=1
+        self.lights_on=target
+        return switched
+
+    def set_state(self,flag:int,active:bool)->int:
+        """Sets or clears a STATE_* flag and switches the lights that change."""
+        if active:
+            self.state|=flag
+        else:
+            self.state&=~flag
+        self.is_dark=bool(self.state&STATE_DARK)
+        self.moving=bool(self.state&STATE_MOVING)
+        self.towing=bool(self.state&STATE_TOWING)
+        self.restricted_maneuver=bool(self.state&STATE_RESTRICTED)
+        self.anchored=bool(self.state&STATE_ANCHORED)
+        return self.apply_state()
+
+    def dim_pot_callback(self,timer):
+        raw_value=self.DimPotentiometer.get_value()
+        if ((raw_value<self.dimmer-100) or (raw_value>self.dimmer+100)):
+            self.dimmer=raw_value
+            self.set_dimmer(self.dimmer)
+            if self.debug:
+                _log.write(EVENT_DIM_POTI,self.dimmer)
+
+    def setup_dim_poti(self,pin_dim_poti):
+        self.DimPotentiometer=sensors.int_Potentiometer(pin_dim_poti,"Navigation Light Dimmer"," ")
+        self.DimPotentiometer.set_burst(8,general.BURST_TRIMMED_MEAN) # 8 samples per reading instead of reading at 100 Hz
+        self.DimPotentiometer.set_read_frequency(10)
+        self.DimPotentiometer.start_reading()
+        self.dim_task=scheduler.get_scheduler().add(self.dim_pot_callback,frequency=10,name="Navigation dimmer")
+        self.has_dim_potentiometer=True
+
+    def setup_anchor_lights(self,Pin_AL1,Pin_AL2=0):
+        self.AnchorLight1=actuators.Light(Pin_AL1,"Anchorlight")
+        self.anchor_lights=[self.AnchorLight1]
+        if self.ship_length>50:  # Ships < 50m need only one anchor light.
+            if Pin_AL2==0:
+                raise general.SetupError("Ship is longer than 50m, second anchor light is required.")
+            self.AnchorLight2=actuators.Light(Pin_AL2,"Second anchorlight")
+            self.anchor_lights.append(self.AnchorLight2)
+        self.add_signal_group(self.anchor_lights,STATE_ANCHORED)
+        self.BallShape="Placeholder for ball shape in daylight anchoring."
+
+    def set_daylight(self):
+        self.set_state(STATE_DARK,False)
+        #set shapes, if necessary
+        if self.towing:
+            _log.write(EVENT_PLACEHOLDER,"towing shape to be set")
+        if self.restricted_maneuver:
+            _log.write(EVENT_PLACEHOLDER,"signs for restricted maneuver to be set")
+        if self.anchored:
+            _log.write(EVENT_PLACEHOLDER,"signs for anchor to be set")
+
+    def set_darkness(self):
+        self.set_state(STATE_DARK,True)
+        if self.anchored:
+            _log.write(EVENT_PLACEHOLDER,"anchor shape to be taken down")
+        if self.towing:
+            _log.write(EVENT_PLACEHOLDER,"towing shape to be taken down")
+        if self.restricted_maneuver:
+            _log.write(EVENT_PLACEHOLDER,"shape for restricted maneuver to be taken in")
+
+    def start_moving(self):
+        self.set_state(STATE_MOVING,True)
+
+    def stop_moving(self):
+        self.set_state(STATE_MOVING,False)
+
+    def start_anchor(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"anchor sign to be set")
+        self.set_state(STATE_ANCHORED,True)
+
+    def stop_anchor(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"anchor shape to be taken in")
+        self.set_state(STATE_ANCHORED,False)
+
+    def start_towing(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"twing shape to be set")
+        self.set_state(STATE_TOWING,True)
+
+    def stop_towing(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"towing shape to be taken in")
+        self.set_state(STATE_TOWING,False)
+
+    def start_restricted_movement(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"ball rhomb ball to be set")
+        self.set_state(STATE_RESTRICTED,True)
+
+    def stop_restricted_movement(self):
+        if not self.is_dark:
+            _log.write(EVENT_PLACEHOLDER,"shapes to be taken down")
+        self.set_state(STATE_RESTRICTED,False)
+
+    def set_dimmer(self,dim_value:int):
+        """Fades all lights to the brightness of dim_value (0 brightest, 65535 off)."""
+        self.dimmer=dim_value
+        self.DimGroup.set_target_u16(65535-dim_value)
+        if self.debug:
+            _log.write(EVENT_DIMMER,dim_value)
@@ -0,0 +1,248 @@
+"""Output bank: shadow duty values of the PWM outputs of a node, written to the hardware once per tick.
+
+Setting a duty only updates the shadow value and marks the channel dirty if the value changed. At the
+end of every scheduler tick the bank writes the dirty channels of each driver: GPIO outputs with
+duty_u16(), channels of a PCA9685 PWM expander coalesced into auto increment I2C transactions.
+All changes of one tick reach the outputs together and unchanged values are never written."""
+import array
+import machine
+import utime
+import general
+import scheduler
+
+GPIO_PINS=30 # GPIO 0 to 29 of the RP2040
+
+class OutputDriver():
+    """Shadow duties (16 bit) and a dirty bit per channel of a group of outputs written together."""
+    def __init__(self,name:str,channels:int) -> None:
+        self.name=name
+        self.channels=channels
+        self.duties=array.array('H',[0]*channels)
+        self.dirty:int=0 # bit n: channel n changed since the last flush
+        self.writes:int=0 # channels written
+        self.transactions:int=0 # hardware accesses
+
+    def write(self,dirty:int)->int:
+        """Writes the channels with a bit in dirty, returns the number of channels written.
+        This method has to be overwritten by the driver specific child class."""
+        return 0
+
+    def get_report(self)->dict:
+        rep={}
+        rep['Channels']=self.channels
+        rep['Writes']=self.writes
+        rep['Transactions']=self.transactions
+        return rep
+
+class PinOutputs(OutputDriver):
+    """PWM outputs on the GPIO pins of the node, channel n is GPIO n."""
+    def __init__(self,name:str="GPIO") -> None:
+        super().__init__(name,GPIO_PINS)
+        self.PWMs=[None]*self.channels
+
+    def add_pin(self,pin:int,frequency:int)->int:
+        """Configures the PWM of a pin, returns its channel."""
+        if self.PWMs[pin] is not None:
+            raise general.SetupError(self.name+": pin "+str(pin)+" is already used.")
+        pwm=machine.PWM(machine.Pin(pin))
+        pwm.freq(frequency) #[Hz]
+        pwm.duty_u16(0)
+        self.PWMs[pin]=pwm
+        return pin
+
+    def write(self,dirty:int)->int:
+        written=0
+        channel=0
+        while dirty:
+            if dirty&1:
+                self.PWMs[channel].duty_u16(self.duties[channel])
+                written+=1
+            dirty>>=1
+            channel+=1
+        self.writes+=written
+        self.transactions+=written
+        return written
+
+class PCA9685(OutputDriver):
+    """16 channel, 12 bit I2C PWM expander. Its registers are written with auto increment, so a run of
+    dirty channels takes one transaction. Unchanged channels in gaps of up to max_gap channels are
+    written again with their run, that costs 4 bytes per channel instead of a transaction with address
+    and register byte."""
+    CHANNELS=16
+    MODE1=0x00
+    PRESCALE=0xFE
+    LED0_ON_L=0x06 # 4 registers per channel: ON_L, ON_H, OFF_L, OFF_H
+    ALL_LED_OFF_H=0xFD
+    MODE1_SLEEP=0x10
+    MODE1_AI=0x20 # register auto increment
+    FULL=0x10 # full on bit in ON_H, full off bit in OFF_H
+    OSCILLATOR=25000000 #[Hz]
+
+    def __init__(self,i2c,address:int=0x40,frequency:int=1000,max_gap:int=1,name:str="") -> None:
+        super().__init__(name if name else "PCA9685 "+hex(address),self.CHANNELS)
+        self.i2c=i2c
+        self.address=address
+        self.max_gap=max_gap
+        self.buffer=bytearray(4*self.CHANNELS)
+        self.view=memoryview(self.buffer)
+        self.bytes:int=0 # data bytes written to the LED registers
+        self.set_frequency(frequency)
+
+    def set_frequency(self,frequency:int)->None:
+        """Sets the PWM frequency [Hz] of all channels and switches them off."""
+        prescale=int(self.OSCILLATOR/(4096*frequency)+0.5)-1
+        prescale=min(max(prescale,3),255)
+        self.i2c.writeto_mem(self.address,self.MODE1,bytes([self.MODE1_SLEEP|self.MODE1_AI])) # prescaler is only writable in sleep
+        self.i2c.writeto_mem(self.address,self.PRESCALE,bytes([prescale]))
+        self.i2c.writeto_mem(self.address,self.MODE1,bytes([self.MODE1_AI]))
+        utime.sleep_us(500) # oscillator start up
+        self.i2c.writeto_mem(self.address,self.ALL_LED_OFF_H,bytes([self.FULL]))
+        self.transactions+=4
+        for channel in range(self.CHANNELS):
+            self.duties[channel]=0
+        self.dirty=0
+
+    def encode(self,channel:int,offset:int)->None:
+        """Puts the registers of channel into the buffer at offset, 16 bit duty to 12 bit."""
+        duty=self.duties[channel]
+        buffer=self.buffer
+        buffer[offset]=0
+        buffer[offset+2]=0
+        if duty>=65535:
+            buffer[offset+1]=self.FULL
+            buffer[offset+3]=0
+        elif duty==0:
+            buffer[offset+1]=0
+            buffer[offset+3]=self.FULL
+        else:
+            duty=duty>>4 if duty>=16 else 1
+            buffer[offset+1]=0
+            buffer[offset+2]=duty&0xFF
+            buffer[offset+3]=duty>>8
+
+    def write_run(self,first:int,last:int)->None:
+        """Writes channels first to last in one transaction."""
+        offset=0
+        for channel in range(first,last+1):
+            self.encode(channel,offset)
+            offset+=4
+        self.i2c.writeto_mem(self.address,self.LED0_ON_L+4*first,self.view[:offset])
+        self.transactions+=1
+        self.writes+=last-first+1
+        self.bytes+=offset
+
+    def write(self,dirty:int)->int:
+        written=self.writes
+        first=-1
+        last=-1
+        channel=0
+        while dirty:
+            if dirty&1:
+                if first<0:
+                    first=channel
+                elif channel-last-1>self.max_gap:
+                    self.write_run(first,last)
+                    first=channel
+                last=channel
+            dirty>>=1
+            channel+=1
+        if first>=0:
+            self.write_run(first,last)
+        return self.writes-written
+
+    def get_report(self)->dict:
+        rep=super().get_report()
+        rep['Bytes']=self.bytes
+        return rep
+
+class OutputBank():
+    """All bank outputs of a node by bank channel. The dirty channels of all drivers are written at
+    the end of every scheduler tick, after all tasks of that tick ran."""
+    def __init__(self) -> None:
+        self.drivers=[]
+        self.channel_driver=[] # bank channel -> driver
+        self.channel_number=[] # bank channel -> channel of its driver
+        self.pins=None # PinOutputs, created with the first GPIO output
+        self.pending:bool=False # a driver has dirty channels
+        self.running:bool=False
+        self.flushes:int=0
+
+    def add_driver(self,driver:OutputDriver)->None:
+        self.drivers.append(driver)
+        if not self.running:
+            self.start()
+
+    def add_channel(self,driver:OutputDriver,number:int)->int:
+        """Maps channel number of driver to a new bank channel and returns it."""
+        self.channel_driver.append(driver)
+        self.channel_number.append(number)
+        return len(self.channel_driver)-1
+
+    def add_pin(self,pin:int,frequency:int)->int:
+        """Adds a GPIO PWM output, returns its bank channel."""
+        if self.pins is None:
+            self.pins=PinOutputs()
+            self.add_driver(self.pins)
+        return self.add_channel(self.pins,self.pins.add_pin(pin,frequency))
+
+    def add_expander(self,expander:OutputDriver)->int:
+        """Adds all channels of a PWM expander, returns the bank channel of its first channel."""
+        self.add_driver(expander)
+        first=len(self.channel_driver)
+        for number in range(expander.channels):
+            self.add_channel(expander,number)
+        return first
+
+    def set_duty(self,channel:int,duty:int)->bool:
+        """Sets the duty of a bank channel, to be written with the next flush. Returns True if it changed."""
+        driver=self.channel_driver[channel]
+        number=self.channel_number[channel]
+        if driver.duties[number]==duty:
+            return False
+        driver.duties[number]=duty
+        driver.dirty|=1<<number
+        self.pending=True
+        return True
+
+    def get_duty(self,channel:int)->int:
+        return self.channel_driver[channel].duties[self.channel_number[channel]]
+
+    def flush(self,timer=None)->int:
+        """Writes all dirty channels, returns the number of channels written."""
+        if not self.pending:
+            return 0
+        self.pending=False
+        written=0
+        for driver in self.drivers:
+            if driver.dirty:
+                dirty=driver.dirty
+                driver.dirty=0
+                written+=driver.write(dirty)
+        self.flushes+=1
+        return written
+
+    def start(self)->None:
+        """Flushes at the end of every scheduler tick."""
+        scheduler.get_scheduler().add_tick_end(self.flush)
+        self.running=True
+
+    def stop(self)->None:
+        scheduler.get_scheduler().remove_tick_end(self.flush)
+        self.running=False
+
+    def get_report(self)->dict:
+        """Used to retrieve writes and hardware accesses per driver."""
+        rep={}
+        rep['Flushes']=self.flushes
+        for driver in self.drivers:
+            rep[driver.name]=driver.get_report()
+        return rep
+
+_bank=None
+
+def get_output_bank()->OutputBank:
+    """Returns the output bank of this node."""
+    global _bank
+    if _bank is None:
+        _bank=OutputBank()
+    return _bank
@@ -0,0 +1,23 @@
+# Propulsion and its cooling
+import sensors
+import actuators
+
+class WaterCoolingSystem:
+    """A water cooling system for any other system."""
+    def __init__(self):
+        #Example:
+        self.WatertempInSensor=sensors.TempSensor("Cooling water inlet temperature",1,0)
+        self.WatertempOutSensor=sensors.TempSensor("Cooling water outlet temperature",1,0)
+        self.waterpressure_in:float=0
+        self.max_watertemp_in:float=30
+        self.max_watertemp_out:float=60
+        self.min_waterpressure_in:float=0.5
+    pass
+
+class Propulsion:
+    """A class for a propulsion system, e.g. Controller, Motor, Sensors and water cooling system"""
+    def __init__(self,number_of_motors:int=1) -> None:
+        self.motors=[]
+        for motor in range(1,number_of_motors):
+            motor=actuators.Motor(1)
+            self.motors.append(motor)
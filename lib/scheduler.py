@@ -0,0 +1,165 @@
+"""Node level scheduler: one periodic machine.Timer dispatches all sensor reads, broadcasts and system checks."""
+import machine
+import utime
+import instrument
+
+class Scheduler:
+    """Runs registered callbacks on a common tick. Every task runs every n-th tick (its rate group),
+    with a phase offset chosen so tasks of the same rate are spread over different ticks.
+    Callbacks are called with the scheduler as only argument, like a machine.Timer callback.
+    A task raising an exception is counted and keeps its place, the tick and all other tasks go on;
+    an exception leaving the timer callback would stop the timer and with it every task of the node."""
+    def __init__(self,tick_frequency:int=100) -> None:
+        self.tick_frequency=tick_frequency #[Hz]
+        self.tick_period_us:int=1000000//tick_frequency
+        self.Timer=machine.Timer()
+        self.running:bool=False
+        self.tasks=[] # [callback, divider, countdown, errors] per task, replaced on change so a running tick is not affected
+        self.tick_end=[] # callbacks run after the tasks of every tick, e.g. output flushes
+        self.tick_count:int=0
+        self.busy_us:int=0 # sum of tick durations
+        self.max_tick_us:int=0
+        self.last_tick_us:int=0
+        self.max_tasks_per_tick:int=0
+        self.overruns:int=0 # ticks that took longer than the tick period
+        self.task_errors:int=0
+        self.last_error=None # last exception raised by a task or tick end callback
+
+    def get_divider(self,frequency:float=0,period:int=0)->int:
+        """Number of ticks between two runs for a frequency [Hz] or period [ms]."""
+        if frequency>0:
+            divider=int(self.tick_frequency/frequency+0.5)
+        else:
+            divider=int(period*self.tick_frequency/1000+0.5)
+        return max(divider,1)
+
+    def get_phase(self,divider:int)->int:
+        """Returns the offset within divider ticks that collides with the fewest other tasks."""
+        best_phase=0
+        best_count=len(self.tasks)+1
+        for phase in range(divider):
+            count=0
+            for task in self.tasks:
+                # Two tasks meet every lcm(dividers) ticks if their phases are equal modulo gcd(dividers).
+                a=divider
+                b=task[1]
+                while b:
+                    a,b=b,a%b
+                if (phase-task[2]+1)%a==0:
+                    count+=1
+            if count<best_count:
+                best_count=count
+                best_phase=phase
+                if count==0:
+                    break
+        return best_phase
+
+    def add(self,callback,frequency:float=0,period:int=0,name:str="")->list:
+        """Registers callback to be run with frequency [Hz] or every period [ms] and starts the tick if necessary.
+        A named callback is measured if instrumentation is enabled. Returns the task, to be passed to remove()."""
+        divider=self.get_divider(frequency,period)
+        if name:
+            callback=instrument.wrap(name,callback,divider*self.tick_period_us)
+        # A task runs when its countdown reaches 0, so countdown-1 is its offset from the next tick.
+        task=[callback,divider,self.get_phase(divider)+1,0]
+        self.tasks=self.tasks+[task]
+        if not self.running:
+            self.start()
+        return task
+
+    def remove(self,task)->None:
+        """Unregisters a task returned by add(), stops the tick if no tasks are left."""
+        self.tasks=[t for t in self.tasks if t is not task]
+        if not self.tasks and not self.tick_end and self.running:
+            self.stop()
+
+    def add_tick_end(self,callback)->None:
+        """Registers callback to be run at the end of every tick, after all tasks of that tick."""
+        self.tick_end=self.tick_end+[callback]
+        if not self.running:
+            self.start()
+
+    def remove_tick_end(self,callback)->None:
+        self.tick_end=[c for c in self.tick_end if c!=callback] # bound methods are equal, not identical
+        if not self.tasks and not self.tick_end and self.running:
+            self.stop()
+
+    def start(self)->None:
+        """Starts the periodic tick."""
+        self.Timer.init(mode=machine.Timer.PERIODIC,freq=self.tick_frequency,callback=self.callback_tick)
+        self.running=True
+
+    def stop(self)->None:
+        """Stops the periodic tick."""
+        self.Timer.deinit()
+        self.running=False
+
+    def callback_tick(self,timer)->None:
+        """Runs all tasks due in this tick. Exceptions are counted, not raised."""
+        start=utime.ticks_us()
+        ran=0
+        for task in self.tasks:
+            task[2]-=1
+            if task[2]<=0:
+                task[2]=task[1]
+                ran+=1
+                try:
+                    task[0](self)
+                except Exception as e:
+                    task[3]+=1
+                    self.task_errors+=1
+                    self.last_error=e
+        for callback in self.tick_end:
+            try:
+                callback(self)
+            except Exception as e:
+                self.task_errors+=1
+                self.last_error=e
+        self.tick_count+=1
+        duration=utime.ticks_diff(utime.ticks_us(),start)
+        self.last_tick_us=duration
+        self.busy_us+=duration
+        if duration>self.max_tick_us:
+            self.max_tick_us=duration
+        if duration>self.tick_period_us:
+            self.overruns+=1
+        if ran>self.max_tasks_per_tick:
+            self.max_tasks_per_tick=ran
+
+    def get_load_report(self)->dict:
+        """Used to retrieve some stats about the scheduler load."""
+        rep={}
+        rep['Ticks']=self.tick_count
+        rep['Tasks']=len(self.tasks)
+        rep['Avg Tick [us]']=self.busy_us//self.tick_count if self.tick_count else 0
+        rep['Max Tick [us]']=self.max_tick_us
+        rep['Last Tick [us]']=self.last_tick_us
+        rep['Load [%]']=100*self.busy_us//(self.tick_count*self.tick_period_us) if self.tick_count else 0
+        rep['Max Tasks per Tick']=self.max_tasks_per_tick
+        rep['Overruns']=self.overruns
+        rep['Task Errors']=self.task_errors
+        rep['Last Error']=repr(self.last_error) if self.last_error is not None else ""
+        return rep
+
+    def get_task_errors(self,task)->int:
+        """Number of exceptions raised by a task returned by add()."""
+        return task[3]
+
+    def reset_load_report(self)->None:
+        """Resets the load statistics."""
+        self.tick_count=0
+        self.busy_us=0
+        self.max_tick_us=0
+        self.max_tasks_per_tick=0
+        self.overruns=0
+        self.task_errors=0
+        self.last_error=None
+
+_scheduler=None
+
+def get_scheduler(tick_frequency:int=100)->Scheduler:
+    """Returns the scheduler of this node, tick_frequency only applies to the first call."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler=Scheduler(tick_frequency)
+    return _scheduler
@@ -2,7 +2,14 @@
 
 import machine
 import utime
+import math
+import array
 import general
+import log
+
+_log=log.get_logger("sensors")
+EVENT_WATER=_log.event(log.WARNING,"{}: Water ingress detected!")
+EVENT_RAW=_log.event(log.DEBUG,"{}: Raw Readout: {}")
 
 class Potentiometer(general.Sensor):
     """A Class to connect any potentiometer."""
@@ -12,7 +19,7 @@ class Potentiometer(general.Sensor):
 
     def read_raw(self)->float:
         """Raw reading at the input pin."""
-        raw_value=self.PotentiometerIn.read_u16() # read input voltage as 0-65535 in range of 0-ARef
+        raw_value=self.read_adc(self.PotentiometerIn) # read input voltage as 0-65535 in range of 0-ARef
         return raw_value
 
 class int_Potentiometer(general.int_Sensor):
@@ -23,7 +30,7 @@ class int_Potentiometer(general.int_Sensor):
 
     def read_raw(self)->int:
         """Raw reading at the input pin."""
-        raw_value=self.PotentiometerIn.read_u16() # read input voltage as 0-65535 in range of 0-ARef
+        raw_value=self.read_adc(self.PotentiometerIn) # read input voltage as 0-65535 in range of 0-ARef
         return raw_value
 
 class WaterDetector(general.int_Sensor):
@@ -38,10 +45,11 @@ class WaterDetector(general.int_Sensor):
 
     def read_raw(self)->int:
         """Raw reading at the input pin."""
-        raw_value=self.PinIn.read_u16() # read input voltage as 0-65535 in range of 0-ARef
+        raw_value=self.read_adc(self.PinIn) # read input voltage as 0-65535 in range of 0-ARef
         if raw_value<self.switchpoint:
+            if not self.water_detected:
+                _log.write(EVENT_WATER,self.name)
             self.water_detected=True
-            print(self.name+": Water ingress detected!")
         else:
             self.water_detected=False
         return raw_value
@@ -70,38 +78,121 @@ class TempSensor(general.Sensor):
     def read_raw(self) -> float:
         """Reads raw value, overwrites parent method."""
         if self.sensor_type == 1: # Analog Sensor based on ADC voltage reading
-            raw_value=self.ADCin.read_u16() # read input voltage as 0-65535 in range of 0-ARef
+            raw_value=self.read_adc(self.ADCin) # read input voltage as 0-65535 in range of 0-ARef
         else:
             raw_value=0
         if self.debug:
-            print("Raw Readout: "+str(raw_value))
+            _log.write(EVENT_RAW,self.name,raw_value)
         return raw_value
+
+    def set_ntc(self,r_series:float,r_nominal:float=10000,t_nominal:float=25,beta:float=3950,t_min:float=-20,t_max:float=130,points:int=16)->str:
+        """Calibrates the sensor for an NTC thermistor between ADC pin and ground with r_series [Ohm] to ARef.
+        The beta equation is evaluated once for a piecewise linear lookup table, not per reading."""
+        table=[]
+        for i in range(points):
+            temperature=t_min+(t_max-t_min)*i/(points-1)
+            kelvin=temperature+273.15
+            resistance=r_nominal*math.exp(beta*(1/kelvin-1/(t_nominal+273.15)))
+            table.append((65535*resistance/(resistance+r_series),temperature))
+        return self.set_calibration_points(table)
     
 class RPMSensor(general.Sensor):
-    """A Class for all kinds of rpm sensors."""
-    def __init__(self,name:str,sensortype:int,sensor_pin:int,impulses_per_rotation:int,broadcast:bool=True):
+    """A Class for all kinds of rpm sensors.
+    Supported types:
+    1 : Impulses on a digital input, impulses_per_rotation per rotation.
+    The interrupt only stores the time between two impulses in a ring buffer, reading computes the rpm
+    from the median (or mean) of the last averaged_periods periods and never waits for an impulse.
+    Without an impulse for timeout_ms the shaft counts as stopped."""
+    PERIOD_BUFFER=16 # number of periods kept
+    def __init__(self,name:str,sensortype:int,sensor_pin:int,impulses_per_rotation:int,broadcast:bool=True,timeout_ms:int=1000,averaged_periods:int=8,use_median:bool=True):
         super().__init__(name,"RPM",queue_length=50,broadcast=broadcast)
         self.sensor_type=sensortype
+        self.impulses_per_rotation=max(impulses_per_rotation,1)
+        self.timeout_us:int=timeout_ms*1000
+        self.averaged_periods:int=min(max(averaged_periods,1),self.PERIOD_BUFFER)
+        self.use_median:bool=use_median
+        self.periods=array.array('L',[0]*self.PERIOD_BUFFER) # [us] between two impulses, written by the interrupt
+        self.sorted_periods=array.array('L',[0]*self.PERIOD_BUFFER) # scratch for the median
+        self.period_index:int=0 # next position to write
+        self.period_count:int=0 # valid periods in the buffer
+        self.last_impulse:int=0 # ticks_us of the last impulse
+        self.impulse_seen:bool=False
+        self.impulse_count:int=0 # impulses since the last reset_impulse_count()
         if sensortype == 1: #Based on simple interrupt
-            self.start_time_ticks:int=0
-            self.interrupt_flag:bool=False
-            self.sensor_pin=machine.Pin(22,mode=machine.Pin.IN,pull=machine.Pin.PULL_DOWN)
-            self.sensor_pin.irq(trigger=self.sensor_pin.IRQ_RISING,handler=self.impuls_callback)
-        self.impulses_per_rotation=impulses_per_rotation
-        
+            self.sensor_pin=machine.Pin(sensor_pin,mode=machine.Pin.IN,pull=machine.Pin.PULL_DOWN)
+            self.sensor_pin.irq(trigger=machine.Pin.IRQ_RISING,handler=self.impuls_callback)
+
     def impuls_callback(self,pin):
-        self.interrupt_flag=True
-        self.period=utime.ticks_diff(utime.ticks_ms(),self.start_time_ticks)
-        self.start_time_ticks=utime.ticks_ms()
-        self.interrupt_flag=False
+        """Interrupt handler, stores the period since the previous impulse without allocating."""
+        now=utime.ticks_us()
+        if self.impulse_seen:
+            index=self.period_index
+            self.periods[index]=utime.ticks_diff(now,self.last_impulse)
+            index+=1
+            if index==self.PERIOD_BUFFER:
+                index=0
+            self.period_index=index
+            if self.period_count<self.PERIOD_BUFFER:
+                self.period_count+=1
+        else:
+            self.impulse_seen=True
+        self.last_impulse=now
+        if self.impulse_count<0x3FFFFFFF:
+            self.impulse_count+=1
+
+    def reset_impulse_count(self)->int:
+        """Returns the impulses counted so far and starts counting from 0."""
+        count=self.impulse_count
+        self.impulse_count=0
+        return count
+
+    def get_period(self)->int:
+        """Period between two impulses [us] from the recent periods, 0 if the shaft stopped."""
+        count=self.period_count
+        if not count:
+            return 0
+        since_last=utime.ticks_diff(utime.ticks_us(),self.last_impulse)
+        if since_last>self.timeout_us:
+            self.period_count=0
+            self.impulse_seen=False
+            return 0
+        if count>self.averaged_periods:
+            count=self.averaged_periods
+        index=self.period_index
+        periods=self.periods
+        if self.use_median:
+            values=self.sorted_periods
+            for i in range(count):
+                index-=1
+                if index<0:
+                    index=self.PERIOD_BUFFER-1
+                # insertion sort of the last count periods
+                value=periods[index]
+                j=i
+                while j>0 and values[j-1]>value:
+                    values[j]=values[j-1]
+                    j-=1
+                values[j]=value
+            period=values[count>>1]
+        else:
+            total=0
+            for i in range(count):
+                index-=1
+                if index<0:
+                    index=self.PERIOD_BUFFER-1
+                total+=periods[index]
+            period=total//count
+        if since_last>period:
+            # Slowing down: the next impulse is already later than the recent periods
+            period=since_last
+        return period
 
     def read_raw(self)->float:
         """Takes a reading and stores the value, overwrites parent method."""
-        #TO DO: Implement actual reading (check!!)
-        while not self.interrupt_flag:
-            utime.sleep_ms(1)
-        raw_value=1/(self.period*self.impulses_per_rotation/60000)
-        return raw_value
+        period=self.get_period()
+        if not period:
+            return 0
+        return 60000000/(period*self.impulses_per_rotation)
 
 class PressureSensor(general.Sensor):
     """A Class for all kinds of pressure sensors."""
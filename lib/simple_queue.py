@@ -6,6 +6,8 @@
 # Origin: https://github.com/peterhinch/micropython-async/blob/master/v3/primitives/queue.py
 Changes for RC-Tools by Simeon Hiertz.
 """
+import array
+
 # Exception raised by get_nowait().
 class QueueEmpty(Exception):
     """Raises an error when the queue is empty."""
@@ -18,48 +20,228 @@ class QueueFull(Exception):
     pass
 
 class Queue:
-    """Main Queue class, simplified for RC-usecases."""
-    def __init__(self, maxsize=100):
+    """Main Queue class, simplified for RC-usecases.
+    Values are kept in a preallocated array used as circular buffer, so put and get are O(1)
+    and do not allocate. A running sum makes get_avg O(1) as well.
+    typecode is the array typecode of the stored values, e.g. 'd' for float or 'l' for int.
+    'd' stores floats as exactly as Python floats, 'f' (float32) halves the memory but rounds
+    the values to about 7 digits, which makes no difference on ports with single precision floats."""
+    def __init__(self, maxsize=100, typecode='d'):
+        if maxsize <= 0:
+            raise ValueError("Queue needs a fixed maxsize > 0.")
         self.maxsize = maxsize #Default size for measurements is 100 values
-        self._queue = []
+        self._queue = array.array(typecode, [0] * maxsize)
+        self._is_int = typecode not in ('f', 'd')
+        self._head = 0 # Index of the oldest value
+        self._count = 0
+        self._sum = 0
 
     def get(self):
         """Retrieve an the first in element."""
-        if self.empty():
+        if self._count == 0:
             raise QueueEmpty()
-        return self._queue.pop(0)
+        val = self._queue[self._head]
+        self._sum -= val
+        self._head += 1
+        if self._head == self.maxsize:
+            self._head = 0
+        self._count -= 1
+        return val
 
     def put(self, val):
         """Put item in queue, delete last elemt if necessary."""
-        if self.full():
-            self._queue.pop(0)
-        self._queue.append(val)
+        queue = self._queue
+        if self._count == self.maxsize:
+            index = self._head
+            old = queue[index]
+            queue[index] = val
+            self._sum += queue[index] - old
+            index += 1
+            if index == self.maxsize:
+                index = 0
+                if not self._is_int:
+                    # Resum once per round to stop float rounding errors from accumulating.
+                    self._sum = sum(queue)
+            self._head = index
+        else:
+            index = self._head + self._count
+            if index >= self.maxsize:
+                index -= self.maxsize
+            queue[index] = val
+            self._sum += queue[index]
+            self._count += 1
 
     def qsize(self):   
         """Number of items in the queue."""
-        return len(self._queue)
+        return self._count
 
     def empty(self):
         """Return True if the queue is empty, False otherwise."""
-        return len(self._queue) == 0
+        return self._count == 0
 
     def full(self):
-        """Return True if there are maxsize items in the queue.
-        Note: if the Queue was initialized with maxsize=0 (the default) or
-        any negative number, then full() is never True."""
-        return self.maxsize > 0 and self.qsize() >= self.maxsize
+        """Return True if there are maxsize items in the queue."""
+        return self._count == self.maxsize
     
     def get_avg(self):
         """Returns the average of all elements in queue."""
-        x_int:int=0
-        x_float:float=0
-        if isinstance(self._queue[0],int):
-            x_int=sum(self._queue)//len(self._queue)
-            return x_int
-        else:
-            x_float=sum(self._queue)/len(self._queue)
-            return x_float
+        if self._count == 0:
+            raise QueueEmpty()
+        if self._is_int:
+            return self._sum // self._count
+        return self._sum / self._count
     
+class _MonotonicDeque:
+    """Positions of queue values in decreasing (or increasing) value order, front is the window extreme.
+    Backed by a preallocated array, every position enters and leaves once, so updates are amortized O(1)."""
+    def __init__(self, maxsize, keep_max):
+        self._pos = array.array('H', [0] * maxsize)
+        self._size = maxsize
+        self._head = 0
+        self._len = 0
+        self._keep_max = keep_max
+
+    def clear(self):
+        self._head = 0
+        self._len = 0
+
+    def push(self, pos, values):
+        """Adds the value at pos, dropping all values from the back that can never be the extreme again."""
+        val = values[pos]
+        while self._len:
+            back = self._head + self._len - 1
+            if back >= self._size:
+                back -= self._size
+            if self._keep_max:
+                if values[self._pos[back]] > val:
+                    break
+            elif values[self._pos[back]] < val:
+                break
+            self._len -= 1
+        index = self._head + self._len
+        if index >= self._size:
+            index -= self._size
+        self._pos[index] = pos
+        self._len += 1
+
+    def remove(self, pos):
+        """Called when the oldest queue value at pos leaves the window."""
+        if self._len and self._pos[self._head] == pos:
+            self._head += 1
+            if self._head == self._size:
+                self._head = 0
+            self._len -= 1
+
+    def front(self):
+        return self._pos[self._head]
+
+class StatsQueue(Queue):
+    """Queue that maintains rolling statistics of its window incrementally on each put/get:
+    min and max (monotonic deques), mean and variance (Welford) and an approximate median."""
+    def __init__(self, maxsize=100, typecode='d'):
+        super().__init__(maxsize, typecode)
+        self._max_deque = _MonotonicDeque(maxsize, True)
+        self._min_deque = _MonotonicDeque(maxsize, False)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._median = 0.0
+
+    def _drop_oldest(self):
+        """Removes the oldest value from the statistics, before it leaves the queue."""
+        pos = self._head
+        old = self._queue[pos]
+        self._max_deque.remove(pos)
+        self._min_deque.remove(pos)
+        return old
+
+    def get(self):
+        """Retrieve the first in element."""
+        if self._count == 0:
+            raise QueueEmpty()
+        old = self._drop_oldest()
+        n = self._count - 1
+        if n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+        else:
+            delta = old - self._mean
+            self._mean -= delta / n
+            self._m2 -= delta * (old - self._mean)
+        return super().get()
+
+    def put(self, val):
+        """Put item in queue, delete last element if necessary."""
+        if self._count == self.maxsize:
+            old = self._drop_oldest()
+            pos = self._head
+            super().put(val)
+            val = self._queue[pos]
+            delta = val - old
+            mean = self._mean
+            self._mean = mean + delta / self._count
+            self._m2 += delta * (val - self._mean + old - mean)
+        else:
+            pos = self._head + self._count
+            if pos >= self.maxsize:
+                pos -= self.maxsize
+            super().put(val)
+            val = self._queue[pos]
+            delta = val - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (val - self._mean)
+        self._max_deque.push(pos, self._queue)
+        self._min_deque.push(pos, self._queue)
+        # Frugal median estimate: move towards the new value by range/(2*size), never beyond it.
+        if self._count == 1:
+            self._median = val
+        else:
+            step = (self.get_max() - self.get_min()) / (2 * self.maxsize)
+            if val > self._median:
+                self._median = min(self._median + step, val)
+            elif val < self._median:
+                self._median = max(self._median - step, val)
+
+    def get_min(self):
+        """Returns the minimum of all elements in queue."""
+        if self._count == 0:
+            raise QueueEmpty()
+        return self._queue[self._min_deque.front()]
+
+    def get_max(self):
+        """Returns the maximum of all elements in queue."""
+        if self._count == 0:
+            raise QueueEmpty()
+        return self._queue[self._max_deque.front()]
+
+    def get_mean(self):
+        """Returns the mean of all elements in queue as float."""
+        if self._count == 0:
+            raise QueueEmpty()
+        return self._mean
+
+    def get_variance(self):
+        """Returns the sample variance of all elements in queue."""
+        if self._count < 2:
+            return 0.0
+        return max(self._m2, 0.0) / (self._count - 1)
+
+    def get_median(self):
+        """Returns an approximation of the median of all elements in queue."""
+        if self._count == 0:
+            raise QueueEmpty()
+        return self._median
+
+    def get_stats(self):
+        """Returns a dictionary with count, min, max, mean, variance and median of the window."""
+        stats = {}
+        stats['count'] = self._count
+        stats['min'] = self.get_min()
+        stats['max'] = self.get_max()
+        stats['mean'] = self.get_mean()
+        stats['variance'] = self.get_variance()
+        stats['median'] = self.get_median()
+        return stats
+
 
 if __name__=="__main__":
     q1=Queue(5)
@@ -69,4 +251,12 @@ if __name__=="__main__":
     q1.put(22)
     q1.put(10)
     q1.put(100)
-    q1.get_avg()
+    print(q1.get_avg())
+    q2=Queue(3,'l')
+    q2.put(1)
+    q2.put(2)
+    print(q2.get_avg(),q2.get(),q2.qsize())
+    q3=StatsQueue(5)
+    for val in (20,22,30,22,10,100):
+        q3.put(val)
+    print(q3.get_stats())
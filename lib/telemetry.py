@@ -0,0 +1,125 @@
+"""Node telemetry: one publisher sends the values of all broadcasting sensors of a node.
+
+Instead of a broadcast task per sensor, the publisher checks all its sensors at one cadence.
+Values that moved by no more than their deadband are suppressed, unless they were not sent for
+refresh_cycles cycles. The remaining values are packed three at a time into value blocks of the
+CAN message layer, values not fitting 16 bit are sent as single value messages."""
+import array
+import scheduler
+import can_messages
+
+class TelemetryPublisher():
+    """Publishes sensor values of this node over a can_messages.MessageEndpoint every period [ms]."""
+    def __init__(self,endpoint,period:int=1000,refresh_cycles:int=10) -> None:
+        self.endpoint=endpoint
+        self.registry=endpoint.registry
+        self.period=period
+        self.refresh_cycles=refresh_cycles # a value is sent at least every refresh_cycles cycles
+        self.Scheduler=scheduler.get_scheduler()
+        self.task=None
+        self.sensors=[]
+        self.signals=[]
+        self.deadbands=array.array('l') # [raw units]
+        self.last_raw=array.array('l') # last sent raw values
+        self.ages=array.array('H') # cycles since a value was sent
+        self.cycles:int=0
+        self.values_sent:int=0
+        self.values_suppressed:int=0
+        self.frames_sent:int=0
+
+    def add_sensor(self,sensor,deadband:float=0,scale:float=1,offset:float=0):
+        """Publishes the values of a general.Sensor, replacing its own broadcast task.
+        deadband in sensor units, scale and offset as for can_messages.Signal. Returns the signal."""
+        signal=self.registry.get_sensor_signal(sensor)
+        if signal is None:
+            signal=self.registry.add_sensor(self.endpoint.node_id,sensor,scale,offset)
+        if sensor.broadcast_task is not None:
+            sensor.stop_broadcasting()
+        sensor.broadcast=True
+        sensor.publisher=self
+        self.sensors.append(sensor)
+        self.signals.append(signal)
+        self.deadbands.append(int(abs(deadband*signal.scale)))
+        self.last_raw.append(0)
+        self.ages.append(self.refresh_cycles) # sent with the first cycle
+        return signal
+
+    def set_deadband(self,sensor,deadband:float)->None:
+        """Sets the deadband of a published sensor in sensor units."""
+        index=self.sensors.index(sensor)
+        self.deadbands[index]=int(abs(deadband*self.signals[index].scale))
+
+    def start(self)->None:
+        """Registers with the node scheduler and publishes every period."""
+        if self.task is not None:
+            self.Scheduler.remove(self.task)
+        self.task=self.Scheduler.add(self.callback_publish,period=self.period,name="Telemetry")
+
+    def stop(self)->None:
+        """Stops publishing."""
+        if self.task is not None:
+            self.Scheduler.remove(self.task)
+            self.task=None
+
+    def callback_publish(self,timer)->None:
+        self.publish()
+
+    def publish(self,force:bool=False)->int:
+        """Sends all changed values, or all values if force. Returns the number of frames sent."""
+        self.cycles+=1
+        endpoint=self.endpoint
+        frames=0
+        first=-1 # first channel of the open block
+        mask=0
+        raw0=raw1=raw2=0
+        for i in range(len(self.sensors)):
+            sensor=self.sensors[i]
+            if not sensor.broadcast:
+                continue
+            signal=self.signals[i]
+            raw=signal.to_raw(sensor.value)
+            diff=raw-self.last_raw[i]
+            if diff<0:
+                diff=-diff
+            age=self.ages[i]+1
+            if diff<=self.deadbands[i] and age<self.refresh_cycles and not force:
+                self.ages[i]=age
+                self.values_suppressed+=1
+                continue
+            self.ages[i]=0
+            self.last_raw[i]=raw
+            self.values_sent+=1
+            channel=signal.channel
+            if raw<can_messages.INT16_MIN or raw>can_messages.INT16_MAX:
+                if endpoint.send_raw(can_messages.MSG_VALUE,endpoint.node_id,channel,can_messages.FLAG_NONE,raw):
+                    frames+=1
+                continue
+            n=channel-first
+            if first<0 or n<0 or n>=can_messages.BLOCK_VALUES:
+                if mask and endpoint.send_value_block(first,mask,raw0,raw1,raw2):
+                    frames+=1
+                first=channel
+                mask=0
+                raw0=raw1=raw2=0
+                n=0
+            mask|=1<<n
+            if n==0:
+                raw0=raw
+            elif n==1:
+                raw1=raw
+            else:
+                raw2=raw
+        if mask and endpoint.send_value_block(first,mask,raw0,raw1,raw2):
+            frames+=1
+        self.frames_sent+=frames
+        return frames
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the telemetry of this node."""
+        rep={}
+        rep['Sensors']=len(self.sensors)
+        rep['Cycles']=self.cycles
+        rep['Values Sent']=self.values_sent
+        rep['Values Suppressed']=self.values_suppressed
+        rep['Frames Sent']=self.frames_sent
+        return rep
@@ -0,0 +1,247 @@
+"""Live values for the web frontend, pushed to the browsers with Server-Sent Events.
+
+An EventFeed reads its sources (sensor values, reports like SBUSReceiver.get_rx_report) and collects
+alarm events. Every browser opens its own stream (EventSource("/events") in JavaScript) which sends at
+most one update per interval [ms]: the sources that changed since the last send of that client are
+coalesced into one "values" event with their latest values only. Sources are read at most every
+period [ms] and only while a stream is connected. Alarms are sent as "alarm" events, the last
+max_alarms are kept for streams waiting for their next send and for browsers connecting later.
+The number of streams is limited, further browsers get 503. Keep max_clients below the
+max_connections of the server, so pages can still be loaded while all streams are connected."""
+import json
+import utime
+import web_server
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+MIN_INTERVAL=200 # [ms] shortest interval a browser may ask for with /events?interval=
+KEEPALIVE=15000 # [ms] a comment is sent if there was nothing else to send, closed connections are noticed
+RETRY=5000 # [ms] browsers reconnect after this time if the stream was closed
+
+def format_event(event:str,data:str,id:int=0)->bytes:
+    """An event in the text/event-stream format, data must be a single line (JSON)."""
+    text="event: "+event+"\n"
+    if id:
+        text+="id: "+str(id)+"\n"
+    return (text+"data: "+data+"\n\n").encode()
+
+class Source():
+    """A value of the feed, returned by read(). Numbers are only sent again if they changed by more than deadband."""
+    def __init__(self,name:str,read,unit:str="",deadband:float=0) -> None:
+        self.name=name
+        self.read=read
+        self.unit=unit
+        self.deadband=deadband
+        self.value=None
+        self.version:int=0 # feed version of the last change
+
+    def has_changed(self,value)->bool:
+        if self.value is None:
+            return True
+        if self.deadband and isinstance(value,(int,float)):
+            return abs(value-self.value)>self.deadband
+        return value!=self.value
+
+class EventStream(web_server.Response):
+    """Response streaming the events of a feed until the browser disconnects."""
+    streaming=True
+
+    def __init__(self,feed,interval:int) -> None:
+        super().__init__(b"",200,"text/event-stream",{"Cache-Control":"no-cache"})
+        self.feed=feed
+        self.interval=interval #[ms]
+        self.reader=None # set by the server
+        self.connected:bool=True
+
+    def get_length(self)->int:
+        return -1 # sent until the connection is closed
+
+    async def send(self,writer,keep_alive:bool,head_only:bool=False)->None:
+        try:
+            writer.write(self.get_head(False))
+            if head_only:
+                await writer.drain()
+                return
+            watcher=None
+            if self.reader is not None:
+                watcher=asyncio.create_task(self.watch())
+            try:
+                await self.feed.stream(self,writer)
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
+        finally:
+            self.feed.clients-=1
+
+    async def watch(self)->None:
+        """Clears connected when the browser closes the connection, it sends nothing after the request.
+        Writing to a closed connection does not always fail at once."""
+        try:
+            while await self.reader.read(64):
+                pass
+        except OSError:
+            pass
+        self.connected=False
+
+class EventFeed():
+    """Sources and alarms pushed to at most max_clients browsers. interval [ms] between sends of a
+    stream if the browser does not ask for another one, period [ms] between reads of the sources."""
+    def __init__(self,max_clients:int=2,interval:int=1000,period:int=200,max_alarms:int=8,send_timeout:float=5) -> None:
+        self.max_clients=max_clients
+        self.interval=interval #[ms]
+        self.period=period #[ms]
+        self.max_alarms=max_alarms
+        self.send_timeout=send_timeout #[s] a stream is closed if the browser does not take its data in time
+        self.sources=[]
+        self.version:int=0 # increased by every change of a source
+        self.last_read=None # ticks_ms of the last read of the sources
+        self.alarms=[] # [sequence number, JSON text] of the last alarms
+        self.alarm_sequence:int=0
+        self.running:bool=True
+        self.clients:int=0 # connected streams
+        self.streams:int=0
+        self.rejected:int=0 # browsers refused because max_clients streams were connected
+        self.reads:int=0
+        self.read_errors:int=0
+        self.changes:int=0 # changed values found by reading the sources
+        self.values_sent:int=0
+        self.events_sent:int=0
+        self.bytes_sent:int=0
+        self.alarms_missed:int=0 # alarms dropped before a stream could send them
+        self.timeouts:int=0
+
+    def add_source(self,name:str,read,unit:str="",deadband:float=0)->Source:
+        """Sends the value returned by read(), a number, string, list or dict."""
+        source=Source(name,read,unit,deadband)
+        self.sources.append(source)
+        return source
+
+    def add_sensor(self,sensor,average:bool=False,deadband:float=0)->Source:
+        """Sends the value of a general.Sensor, the average of its queue with average."""
+        return self.add_source(sensor.name,sensor.get_avg_value if average else sensor.get_value,sensor.unit,deadband)
+
+    def add_report(self,name:str,get_report)->Source:
+        """Sends a report dict, e.g. add_report("SBUS",receiver.get_rx_report)."""
+        return self.add_source(name,get_report)
+
+    def add_alarms(self,events)->None:
+        """Sends the alarms of a general.AlarmEvents ring. Alarms are logged as before."""
+        if not events.handlers:
+            events.add_handler(events.log_alarm) # logging is the default only without handlers
+        events.add_handler(self.callback_alarm)
+
+    def callback_alarm(self,alarm)->None:
+        """Alarm handler, keeps the last max_alarms alarms for the streams."""
+        self.alarm_sequence+=1
+        data={"Sensor":alarm.sensor.name,"Code":alarm.code,"Value":alarm.value,"Timestamp":alarm.timestamp,"Text":str(alarm)}
+        self.alarms.append([self.alarm_sequence,json.dumps(data)])
+        if len(self.alarms)>self.max_alarms:
+            self.alarms.pop(0)
+
+    def update(self)->None:
+        """Reads the sources, if period has passed since the last read."""
+        now=utime.ticks_ms()
+        if self.last_read is not None and utime.ticks_diff(now,self.last_read)<self.period:
+            return
+        self.last_read=now
+        self.reads+=1
+        for source in self.sources:
+            try:
+                value=source.read()
+            except Exception: # e.g. NoAvgValues, the source is skipped
+                self.read_errors+=1
+                continue
+            if source.has_changed(value):
+                self.version+=1
+                self.changes+=1
+                source.value=value
+                source.version=self.version
+
+    def get_values(self,version:int)->dict:
+        """Latest values of the sources changed after version."""
+        values={}
+        for source in self.sources:
+            if source.version>version:
+                values[source.name]=source.value
+        return values
+
+    def handler(self,request)->EventStream:
+        """Request handler of the event stream, e.g. Server.route("/events",Feed.handler).
+        /events?interval=500 asks for another interval [ms], not below MIN_INTERVAL."""
+        if self.clients>=self.max_clients:
+            self.rejected+=1
+            raise web_server.HTTPError(503)
+        interval=self.interval
+        for parameter in request.query.split("&"):
+            name,_,value=parameter.partition("=")
+            if name=="interval":
+                try:
+                    interval=int(value)
+                except ValueError:
+                    raise web_server.HTTPError(400)
+        self.clients+=1 # released by EventStream.send
+        return EventStream(self,max(interval,MIN_INTERVAL))
+
+    async def write(self,writer,data:bytes)->None:
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(),self.send_timeout)
+        self.bytes_sent+=len(data)
+
+    async def stream(self,stream:EventStream,writer)->None:
+        """Sends the events of one browser until it disconnects or close() is called."""
+        self.streams+=1
+        units={source.name:source.unit for source in self.sources}
+        try:
+            await self.write(writer,("retry: "+str(RETRY)+"\n\n").encode()+format_event("sources",json.dumps(units)))
+            version=0 # feed version sent to this browser
+            alarm_sequence=self.alarm_sequence-len(self.alarms) # the kept alarms are sent first
+            last_send=utime.ticks_ms()
+            while self.running and stream.connected:
+                self.update()
+                data=b""
+                if self.version!=version:
+                    values=self.get_values(version)
+                    version=self.version
+                    self.values_sent+=len(values)
+                    data+=format_event("values",json.dumps(values))
+                for sequence,text in self.alarms:
+                    if sequence>alarm_sequence:
+                        if sequence>alarm_sequence+1:
+                            self.alarms_missed+=sequence-alarm_sequence-1
+                        data+=format_event("alarm",text,sequence)
+                        alarm_sequence=sequence
+                now=utime.ticks_ms()
+                if data:
+                    self.events_sent+=1
+                    await self.write(writer,data)
+                    last_send=now
+                elif utime.ticks_diff(now,last_send)>=KEEPALIVE:
+                    await self.write(writer,b": keep-alive\n\n")
+                    last_send=now
+                await asyncio.sleep(stream.interval/1000)
+        except asyncio.TimeoutError:
+            self.timeouts+=1 # browser too slow, it reconnects after RETRY
+        except OSError:
+            pass # closed by the browser
+
+    def close(self)->None:
+        """Ends all streams."""
+        self.running=False
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the feed."""
+        rep={}
+        rep['Clients']=self.clients
+        rep['Streams']=self.streams
+        rep['Rejected']=self.rejected
+        rep['Reads']=self.reads
+        rep['Read Errors']=self.read_errors
+        rep['Changes']=self.changes
+        rep['Values Sent']=self.values_sent
+        rep['Events Sent']=self.events_sent
+        rep['Bytes Sent']=self.bytes_sent
+        rep['Alarms Missed']=self.alarms_missed
+        rep['Timeouts']=self.timeouts
+        return rep
@@ -0,0 +1,253 @@
+"""Web pages of the frontend, rendered once per change and served from a cache.
+
+A page is rendered piece by piece into the cache: pages up to max_ram_size bytes are kept in RAM,
+larger ones are written to flash and streamed in chunks, so the body is never built as one string.
+Every cached page has an ETag (CRC32 of its content), a client holding the current version gets
+304 Not Modified without a body. Static files are streamed from flash the same way, a precompressed
+file.gz is sent instead of file if the client accepts gzip."""
+import binascii
+import os
+import web_server
+
+CACHE_FOLDER="web_cache" # rendered pages larger than max_ram_size
+PAGE_TYPE="text/html; charset=utf-8"
+CONTENT_TYPES={
+    "html":"text/html; charset=utf-8",
+    "css":"text/css",
+    "js":"application/javascript",
+    "json":"application/json",
+    "svg":"image/svg+xml",
+    "png":"image/png",
+    "ico":"image/x-icon",
+    "txt":"text/plain",
+}
+
+LIVE_SCRIPT="""        <table id="live"></table>
+        <ul id="alarms"></ul>
+        <script>
+        var live=document.getElementById("live"),units={},rows={};
+        var events=new EventSource("URL");
+        events.addEventListener("sources",function(e){units=JSON.parse(e.data);});
+        events.addEventListener("values",function(e){
+            var values=JSON.parse(e.data);
+            for(var name in values){
+                if(!rows[name]){rows[name]=live.insertRow();rows[name].insertCell().textContent=name;rows[name].insertCell();}
+                var value=values[name];
+                rows[name].cells[1].textContent=(typeof value=="object"?JSON.stringify(value):value)+" "+(units[name]||"");
+            }
+        });
+        events.addEventListener("alarm",function(e){
+            var item=document.createElement("li");
+            item.textContent=JSON.parse(e.data).Text;
+            document.getElementById("alarms").prepend(item);
+        });
+        </script>
+""" # table of the values pushed by a web_events.EventFeed, URL is replaced by its route
+
+def escape(text)->str:
+    """Text for use in HTML."""
+    return str(text).replace("&","&amp;").replace("<","&lt;").replace(">","&gt;").replace('"',"&quot;")
+
+def make_dirs(folder:str)->None:
+    """Creates folder and its parents."""
+    path="/" if folder.startswith("/") else ""
+    for part in folder.split("/"):
+        if not part:
+            continue
+        path+=part
+        try:
+            os.mkdir(path)
+        except OSError: # exists
+            pass
+        path+="/"
+
+class WebPage():
+    """A framework for webpages: a heading and a table of rows x columns cells.
+    Every change of heading, size or cells increases version, which invalidates the cached page.
+    heading, rows and columns can be assigned, cells are changed with set_cell().
+    With live_url (the route of a web_events.EventFeed) the page shows the pushed values and alarms."""
+    def __init__(self,heading:str,rows:int,columns:int,name:str="index",live_url:str="") -> None:
+        """Create first html"""
+        self.name=name
+        self.live_url=live_url
+        self._heading=heading
+        self._cells=[]
+        self.version:int=0
+        self.set_size(rows,columns)
+        self.html:str=''
+
+    def set_heading(self,heading:str)->None:
+        if heading!=self._heading:
+            self._heading=heading
+            self.version+=1
+
+    def set_size(self,rows:int,columns:int)->None:
+        """Changes the size of the table, the text of the remaining cells is kept."""
+        cells=[[""]*columns for _ in range(rows)]
+        for row in range(min(rows,len(self._cells))):
+            for column in range(min(columns,len(self._cells[row]))):
+                cells[row][column]=self._cells[row][column]
+        self._rows=rows
+        self._columns=columns
+        self._cells=cells
+        self.version+=1
+
+    heading=property(lambda self:self._heading,set_heading)
+    rows=property(lambda self:self._rows,lambda self,rows:self.set_size(rows,self._columns))
+    columns=property(lambda self:self._columns,lambda self,columns:self.set_size(self._rows,columns))
+
+    def set_cell(self,row:int,column:int,text)->None:
+        text=str(text)
+        if self._cells[row][column]!=text:
+            self._cells[row][column]=text
+            self.version+=1
+
+    def get_cell(self,row:int,column:int)->str:
+        return self._cells[row][column]
+
+    def has_cells(self)->bool:
+        """True if any cell has text, a table without text is left out."""
+        for row in self._cells:
+            for cell in row:
+                if cell:
+                    return True
+        return False
+
+    def render(self):
+        """Yields the page in pieces."""
+        yield """<html>
+    <head>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    </head>
+    <body>
+        <h1>"""+escape(self._heading)+"""</h1>
+"""
+        if self.has_cells():
+            yield "        <table>\n"
+            for row in self._cells:
+                yield "            <tr>"
+                for cell in row:
+                    yield "<td>"+escape(cell)+"</td>"
+                yield "</tr>\n"
+            yield "        </table>\n"
+        if self.live_url:
+            yield LIVE_SCRIPT.replace("URL",escape(self.live_url))
+        yield """    </body>
+</html>"""
+
+    def create_html(self)->str:
+        """The whole page as one string, pages are served with a PageCache instead."""
+        self.html="".join(self.render())
+        return self.html
+
+class CachedPage():
+    """A rendered page, in RAM (body) or on flash (path). number and slot name its files."""
+    def __init__(self,number:int,slot:int,version:int,etag:str,size:int,body=None,path:str="") -> None:
+        self.number=number
+        self.slot=slot
+        self.version=version
+        self.etag=etag
+        self.size=size
+        self.body=body
+        self.path=path
+
+class PageCache():
+    """Renders pages once per version and returns responses streaming them from RAM or flash."""
+    def __init__(self,folder:str=CACHE_FOLDER,max_ram_size:int=1024,chunk_size:int=web_server.CHUNK_SIZE) -> None:
+        self.folder=folder
+        self.max_ram_size=max_ram_size #[bytes] larger pages are stored on flash
+        self.chunk_size=chunk_size
+        self.pages={} # WebPage -> CachedPage, pages with the same name are cached apart
+        self.renders:int=0
+        self.hits:int=0
+
+    def get(self,page:WebPage)->CachedPage:
+        """Returns the cached page, rendered again if the page changed."""
+        cached=self.pages.get(page)
+        if cached is not None and cached.version==page.version:
+            self.hits+=1
+            return cached
+        if cached is None:
+            cached=self.render(page,len(self.pages),0)
+        else:
+            cached=self.render(page,cached.number,1-cached.slot) # a response may still stream the previous file
+        self.pages[page]=cached
+        return cached
+
+    def render(self,page:WebPage,number:int=0,slot:int=0)->CachedPage:
+        """Renders page piece by piece, into RAM while it fits, else into a file."""
+        self.renders+=1
+        crc=0
+        size=0
+        parts=[]
+        path=self.folder+"/"+page.name+"-"+str(number)+"."+str(slot)+".html"
+        f=None
+        try:
+            for piece in page.render():
+                data=piece.encode()
+                crc=binascii.crc32(data,crc)
+                size+=len(data)
+                if f is not None:
+                    f.write(data)
+                    continue
+                parts.append(data)
+                if size>self.max_ram_size:
+                    make_dirs(self.folder)
+                    f=open(path,'wb')
+                    for part in parts:
+                        f.write(part)
+                    parts=None
+        finally:
+            if f is not None:
+                f.close()
+        etag='"'+hex(crc&0xFFFFFFFF)[2:]+'"'
+        if f is None:
+            return CachedPage(number,slot,page.version,etag,size,body=b"".join(parts))
+        return CachedPage(number,slot,page.version,etag,size,path=path)
+
+    def response(self,page:WebPage)->web_server.Response:
+        """Response for page, to be returned by a request handler."""
+        cached=self.get(page)
+        headers={"Cache-Control":"no-cache"} # browsers revalidate with the ETag
+        if cached.path:
+            return web_server.FileResponse(cached.path,PAGE_TYPE,headers,cached.etag,self.chunk_size)
+        return web_server.Response(cached.body,200,PAGE_TYPE,headers,cached.etag)
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the cache."""
+        rep={}
+        rep['Pages']=len(self.pages)
+        rep['Renders']=self.renders
+        rep['Hits']=self.hits
+        return rep
+
+class StaticFiles():
+    """Request handler serving the files of a folder below a path prefix, e.g. /static/style.css."""
+    def __init__(self,prefix:str,folder:str,max_age:int=3600,chunk_size:int=web_server.CHUNK_SIZE) -> None:
+        self.prefix=prefix
+        self.folder=folder
+        self.max_age=max_age #[s] browsers use their copy without asking
+        self.chunk_size=chunk_size
+
+    def __call__(self,request)->web_server.Response:
+        name=request.path[len(self.prefix):]
+        if not name or ".." in name:
+            raise web_server.HTTPError(404)
+        path=self.folder+"/"+name
+        headers={"Cache-Control":"max-age="+str(self.max_age),"Vary":"Accept-Encoding"}
+        stat=None
+        if "gzip" in request.get_header("accept-encoding"):
+            try:
+                stat=os.stat(path+".gz")
+                path+=".gz"
+                headers["Content-Encoding"]="gzip"
+            except OSError: # no precompressed file
+                pass
+        if stat is None:
+            try:
+                stat=os.stat(path)
+            except OSError:
+                raise web_server.HTTPError(404)
+        extension=name.rpartition(".")[2]
+        etag='"'+hex(stat[6])[2:]+"-"+hex(int(stat[8]))[2:]+("-gz" if "Content-Encoding" in headers else "")+'"'
+        return web_server.FileResponse(path,CONTENT_TYPES.get(extension,"application/octet-stream"),headers,etag,self.chunk_size)
@@ -0,0 +1,366 @@
+"""Asynchronous HTTP/1.1 server for the web frontend, runs on uasyncio and on CPython asyncio.
+
+Every connection is a task of the event loop, so a slow client only delays itself while other
+clients and tasks keep running. The number of open connections is bounded, further clients get a 503.
+Requests are parsed line by line with limits for the header size and the body (Content-Length),
+lines are read in chunks, so a client never sending a line end cannot fill the heap.
+Connections are kept alive between requests (HTTP/1.1 default) until the client closes them,
+the keep-alive timeout expires or max_requests requests were served. Reading a request and sending
+its response each have to finish within request_timeout [s].
+Responses with an ETag are answered with 304 Not Modified if the client sends it in If-None-Match,
+FileResponse streams a file in chunks instead of loading it. Streaming responses (e.g. the
+Server-Sent Events of web_events) are sent without Content-Length until the client disconnects,
+they limit the time of each write themselves."""
+import os
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+CHUNK_SIZE=512 # [bytes] read and sent at a time by FileResponse
+READ_SIZE=256 # [bytes] read at a time from the client
+
+STATUS_TEXT={
+    200:"OK",
+    204:"No Content",
+    304:"Not Modified",
+    400:"Bad Request",
+    404:"Not Found",
+    405:"Method Not Allowed",
+    408:"Request Timeout",
+    413:"Payload Too Large",
+    431:"Request Header Fields Too Large",
+    500:"Internal Server Error",
+    501:"Not Implemented",
+    503:"Service Unavailable",
+}
+
+class HTTPError(Exception):
+    """Error class for requests answered with an error status."""
+    def __init__(self,status:int,message:str="") -> None:
+        super().__init__(message if message else STATUS_TEXT.get(status,""))
+        self.status=status
+
+class Request():
+    """A parsed request, header names are lower case."""
+    def __init__(self,method:str,target:str,version:str) -> None:
+        self.method=method
+        self.target=target
+        path,_,query=target.partition("?")
+        self.path=path
+        self.query=query
+        self.version=version
+        self.headers={}
+        self.body=b""
+
+    def get_header(self,name:str,default:str="")->str:
+        return self.headers.get(name,default)
+
+    def keep_alive(self)->bool:
+        """True if the client wants to keep the connection open, the default of HTTP/1.1."""
+        connection=self.get_header("connection").lower()
+        if self.version=="HTTP/1.1":
+            return connection!="close"
+        return connection=="keep-alive"
+
+class RequestReader():
+    """Reads lines of limited length from a stream, StreamReader.readline() buffers lines of any length.
+    Bytes read beyond a line are kept for the next line, the body or a pipelined request."""
+    def __init__(self,reader,read_size:int=READ_SIZE) -> None:
+        self.reader=reader
+        self.read_size=read_size
+        self.buffer=b""
+
+    async def readline(self,limit:int)->bytes:
+        """Returns a line including its line end, the rest at the end of the stream (b"" if nothing is left).
+        Raises HTTPError(431) if the line is longer than limit [bytes]."""
+        while True:
+            end=self.buffer.find(b"\n")
+            if end>=0:
+                if end>=limit:
+                    raise HTTPError(431)
+                line=self.buffer[:end+1]
+                self.buffer=self.buffer[end+1:]
+                return line
+            if len(self.buffer)>=limit:
+                raise HTTPError(431)
+            chunk=await self.reader.read(self.read_size)
+            if not chunk:
+                line=self.buffer
+                self.buffer=b""
+                return line
+            self.buffer+=chunk
+
+    async def read(self,count:int)->bytes:
+        """Up to count bytes, b"" at the end of the stream."""
+        if self.buffer:
+            data=self.buffer[:count]
+            self.buffer=self.buffer[count:]
+            return data
+        return await self.reader.read(count)
+
+class Response():
+    """Status, headers and body of a response, str bodies are sent UTF-8 encoded."""
+    streaming=False # True for responses sent until the connection is closed
+    def __init__(self,body=b"",status:int=200,content_type:str="text/html; charset=utf-8",headers=None,etag:str="") -> None:
+        self.body=body.encode() if isinstance(body,str) else body
+        self.status=status
+        self.content_type=content_type
+        self.headers=headers if headers else {}
+        self.etag=etag # quoted entity tag of the body, e.g. '"1a2b3c"'
+
+    def get_length(self)->int:
+        return len(self.body)
+
+    def get_head(self,keep_alive:bool)->bytes:
+        """Status line and headers."""
+        head="HTTP/1.1 "+str(self.status)+" "+STATUS_TEXT.get(self.status,"")+"\r\n"
+        if self.content_type:
+            head+="Content-Type: "+self.content_type+"\r\n"
+        length=self.get_length()
+        if self.status!=304 and length>=0: # -1 if unknown, the body ends with the connection
+            head+="Content-Length: "+str(length)+"\r\n"
+        if self.etag:
+            head+="ETag: "+self.etag+"\r\n"
+        for name in self.headers:
+            head+=name+": "+str(self.headers[name])+"\r\n"
+        head+="Connection: "+("keep-alive" if keep_alive else "close")+"\r\n\r\n"
+        return head.encode()
+
+    async def send(self,writer,keep_alive:bool,head_only:bool=False)->None:
+        writer.write(self.get_head(keep_alive))
+        if not head_only:
+            await self.send_body(writer)
+        await writer.drain()
+
+    async def send_body(self,writer)->None:
+        if self.body:
+            writer.write(self.body)
+
+class FileResponse(Response):
+    """Streams a file, only chunk_size bytes of it are in RAM at a time."""
+    def __init__(self,path:str,content_type:str,headers=None,etag:str="",chunk_size:int=CHUNK_SIZE) -> None:
+        super().__init__(b"",200,content_type,headers,etag)
+        self.path=path
+        self.size=os.stat(path)[6]
+        self.chunk_size=chunk_size
+
+    def get_length(self)->int:
+        return self.size
+
+    async def send_body(self,writer)->None:
+        buffer=bytearray(self.chunk_size)
+        view=memoryview(buffer)
+        with open(self.path,'rb') as f:
+            while True:
+                count=f.readinto(buffer)
+                if not count:
+                    break
+                writer.write(view[:count]) # copied by the stream if it cannot be sent at once
+                await writer.drain()
+
+def error_response(status:int)->Response:
+    return Response(str(status)+" "+STATUS_TEXT.get(status,"")+"\n",status,"text/plain")
+
+def not_modified(response:Response)->Response:
+    """304 answer to a request for response, if the client already has its ETag."""
+    headers={}
+    if "Cache-Control" in response.headers:
+        headers["Cache-Control"]=response.headers["Cache-Control"]
+    return Response(b"",304,"",headers,response.etag)
+
+class WebServer():
+    """Serves the registered routes, handler(request) returns a Response or a str (HTML page)
+    and may be a coroutine."""
+    def __init__(self,max_connections:int=4,request_timeout:float=5,keepalive_timeout:float=10,max_header_size:int=2048,max_body_size:int=4096,max_requests:int=100) -> None:
+        self.max_connections=max_connections
+        self.request_timeout=request_timeout #[s]
+        self.keepalive_timeout=keepalive_timeout #[s] idle time between requests on a connection
+        self.max_header_size=max_header_size #[bytes] request line and headers
+        self.max_body_size=max_body_size #[bytes]
+        self.max_requests=max_requests # per connection
+        self.routes={} # path -> [handler, methods]
+        self.prefix_routes=[] # [prefix, handler, methods], for paths without an own route
+        self.server=None
+        self.active:int=0 # open connections
+        self.connections:int=0
+        self.rejected:int=0 # connections refused because the pool was full
+        self.requests:int=0
+        self.timeouts:int=0
+        self.errors:int=0 # parsed requests answered with an error status
+        self.not_modified:int=0
+
+    def route(self,path:str,handler,methods=("GET","HEAD"))->None:
+        """Registers handler for requests to path."""
+        self.routes[path]=[handler,methods]
+
+    def route_prefix(self,prefix:str,handler,methods=("GET","HEAD"))->None:
+        """Registers handler for all requests to paths starting with prefix, e.g. "/static/"."""
+        self.prefix_routes.append([prefix,handler,methods])
+
+    async def start(self,host:str="0.0.0.0",port:int=80,backlog:int=5):
+        """Starts listening, returns the asyncio server."""
+        self.server=await asyncio.start_server(self.handle_connection,host,port,backlog=backlog)
+        return self.server
+
+    def stop(self)->None:
+        if self.server is not None:
+            self.server.close()
+            self.server=None
+
+    async def serve(self,host:str="0.0.0.0",port:int=80,backlog:int=5)->None:
+        """Starts the server and runs until stop() is called."""
+        await self.start(host,port,backlog)
+        while self.server is not None:
+            await asyncio.sleep(1)
+
+    async def read_request(self,reader:RequestReader,line:bytes)->Request:
+        """Parses the request starting with line, reads headers and body."""
+        size=len(line)
+        try:
+            method,target,version=line.decode().split()
+        except ValueError: # also UnicodeError, bytes that are no UTF-8
+            raise HTTPError(400)
+        if not version.startswith("HTTP/1."):
+            raise HTTPError(400)
+        request=Request(method,target,version)
+        while True:
+            line=await reader.readline(self.max_header_size-size)
+            size+=len(line)
+            if not line:
+                raise HTTPError(400,"Incomplete header")
+            if line==b"\r\n" or line==b"\n":
+                break
+            try:
+                name,sep,value=line.decode().partition(":")
+            except UnicodeError:
+                raise HTTPError(400)
+            if not sep:
+                raise HTTPError(400)
+            request.headers[name.strip().lower()]=value.strip()
+        if "transfer-encoding" in request.headers:
+            raise HTTPError(501) # chunked request bodies are not supported
+        try:
+            length=int(request.get_header("content-length","0"))
+        except ValueError:
+            raise HTTPError(400)
+        if length>self.max_body_size or length<0:
+            raise HTTPError(413)
+        body=b""
+        while len(body)<length:
+            chunk=await reader.read(length-len(body))
+            if not chunk:
+                raise HTTPError(400,"Incomplete body")
+            body+=chunk
+        request.body=body
+        return request
+
+    async def dispatch(self,request:Request)->Response:
+        """Calls the handler of the request path."""
+        route=self.routes.get(request.path)
+        if route is None:
+            for prefix,handler,methods in self.prefix_routes:
+                if request.path.startswith(prefix):
+                    route=[handler,methods]
+                    break
+            else:
+                return error_response(404)
+        if request.method not in route[1]:
+            response=error_response(405)
+            response.headers["Allow"]=", ".join(route[1])
+            return response
+        try:
+            response=route[0](request)
+            if hasattr(response,"send") and not isinstance(response,Response): # coroutine
+                response=await response
+        except HTTPError as e:
+            return error_response(e.status)
+        except Exception:
+            return error_response(500)
+        if not isinstance(response,Response):
+            response=Response(response)
+        if response.etag and response.status==200 and response.etag in request.get_header("if-none-match"):
+            self.not_modified+=1
+            return not_modified(response)
+        return response
+
+    async def send(self,writer,response:Response,keep_alive:bool,head_only:bool=False)->None:
+        if response.streaming:
+            await response.send(writer,keep_alive,head_only)
+            return
+        await asyncio.wait_for(response.send(writer,keep_alive,head_only),self.request_timeout)
+
+    async def close(self,writer)->None:
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    async def handle_connection(self,reader,writer)->None:
+        """Serves the requests of one connection."""
+        if self.active>=self.max_connections:
+            self.rejected+=1
+            try:
+                await self.send(writer,error_response(503),False)
+            except (OSError,asyncio.TimeoutError):
+                pass
+            await self.close(writer)
+            return
+        self.active+=1
+        self.connections+=1
+        served=0
+        reader=RequestReader(reader)
+        try:
+            while served<self.max_requests:
+                try:
+                    line=await asyncio.wait_for(reader.readline(self.max_header_size),self.keepalive_timeout if served else self.request_timeout)
+                except asyncio.TimeoutError:
+                    break # idle connection
+                except HTTPError as e:
+                    await self.send(writer,error_response(e.status),False)
+                    break
+                if not line:
+                    break # closed by the client
+                if line==b"\r\n" or line==b"\n":
+                    continue
+                try:
+                    request=await asyncio.wait_for(self.read_request(reader,line),self.request_timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts+=1
+                    await self.send(writer,error_response(408),False)
+                    break
+                except HTTPError as e:
+                    await self.send(writer,error_response(e.status),False)
+                    break
+                served+=1
+                keep_alive=request.keep_alive() and served<self.max_requests
+                response=await self.dispatch(request)
+                if response.status>=400:
+                    self.errors+=1
+                if response.streaming:
+                    keep_alive=False
+                    response.reader=reader # to notice the client closing the connection
+                await self.send(writer,response,keep_alive,request.method=="HEAD")
+                self.requests+=1
+                if not keep_alive:
+                    break
+        except asyncio.TimeoutError:
+            self.timeouts+=1 # client too slow to receive the response
+        except OSError:
+            pass # connection reset by the client
+        finally:
+            self.active-=1
+            await self.close(writer)
+
+    def get_report(self)->dict:
+        """Used to retrieve some stats about the server."""
+        rep={}
+        rep['Active Connections']=self.active
+        rep['Connections']=self.connections
+        rep['Rejected']=self.rejected
+        rep['Requests']=self.requests
+        rep['Timeouts']=self.timeouts
+        rep['Errors']=self.errors
+        rep['Not Modified']=self.not_modified
+        return rep
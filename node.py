@@ -1,7 +1,82 @@
 """This is a class for a node running on a single microcontroller, 
-containing several (sub-) systems, sensors or actuators."""
+containing several (sub-) systems, sensors or actuators.
+The systems are set up from the boot plan of setup.json, their modules are imported through the
+device registry on first use, so a node only loads the classes its setup references."""
 
-import lib.systems
-import lib.sensors
-import lib.actuators
+import utime
+import lib.boot_plan as boot_plan
+import lib.devices as devices
 
+class Node:
+    """A microcontroller with the systems of its setup file, boot time and imports are profiled."""
+    def __init__(self,setup_file:str=boot_plan.SETUP_FILE) -> None:
+        self.Profiler=devices.BootProfiler()
+        self.Devices=devices.DeviceRegistry(self.Profiler)
+        self.name="Node"
+        self.ship_length=30 # [m]
+        self.NavSignals=None
+        self.Compartments=[]
+        plan=self.Profiler.measure("load plan",boot_plan.load,setup_file)
+        build_start=utime.ticks_us()
+        self.build(plan)
+        self.start_alarm_dispatch()
+        now=utime.ticks_us()
+        self.boot_report=boot_plan.get_report()
+        self.boot_report['Build [us]']=utime.ticks_diff(now,build_start)
+        self.boot_report['Boot [us]']=utime.ticks_diff(now,self.Profiler.start)
+        self.boot_report['Modules']=self.Devices.loaded_modules()
+
+    def get_navigation(self):
+        """Navigation signals of this node, created with the first navigation step."""
+        if self.NavSignals is None:
+            self.NavSignals=self.Devices.get("NavigationSignals")(self.ship_length)
+        return self.NavSignals
+
+    def build(self,plan:tuple)->None:
+        """Sets up the systems step by step as given by the plan."""
+        for step in plan:
+            kind=step[0]
+            if kind==boot_plan.STEP_SHIP:
+                self.name=step[1]
+                self.ship_length=step[2]
+            elif kind==boot_plan.STEP_POSITION_LIGHTS:
+                self.get_navigation().setup_position_lights(step[1],step[2],step[3],step[4],step[5])
+            elif kind==boot_plan.STEP_TOWLIGHTS:
+                self.get_navigation().setup_towlights(step[1],step[2],step[3])
+            elif kind==boot_plan.STEP_RESTRICTED_MANEUVERABILITY:
+                self.get_navigation().setup_restricted_manueverability(step[1],step[2],step[3])
+            elif kind==boot_plan.STEP_ANCHOR_LIGHTS:
+                self.get_navigation().setup_anchor_lights(step[1],step[2])
+            elif kind==boot_plan.STEP_DIM_POTI:
+                self.get_navigation().setup_dim_poti(step[1])
+            elif kind==boot_plan.STEP_COMPARTMENT:
+                compartment=self.Devices.get("BilgeSystem")(step[1],step[2],step[3])
+                compartment.check_period=step[4]
+                self.Compartments.append(compartment)
+
+    def start_alarm_dispatch(self)->None:
+        """Passes the alarms of the sensors to their handlers (logged if there are none) right after they
+        are recorded, see general.AlarmEvents.start_auto_dispatch()."""
+        self.Devices.get_module("general").alarm_events.start_auto_dispatch()
+
+    def start_log(self,period:int=200)->None:
+        """Prints the log of the lib modules from a scheduler task, see log.start_auto_drain()."""
+        self.Devices.get_module("log").start_auto_drain(period)
+
+    def start_bilge_systems(self)->None:
+        """Starts monitoring all watertight compartments."""
+        for compartment in self.Compartments:
+            compartment.start_system()
+
+    def get_boot_report(self)->dict:
+        """Used to retrieve how long the boot took, if the plan had to be compiled and the modules loaded."""
+        return self.boot_report
+
+    def get_profile(self)->dict:
+        """Used to retrieve time and heap use of every import and setup step."""
+        return self.Profiler.get_report()
+
+if __name__=="__main__":
+    Controller=Node()
+    print(Controller.get_boot_report())
+    print(Controller.get_profile())
@@ -0,0 +1,80 @@
+"""Hardware independent SBUS frame handling, shared by sbus_receiver.py and the host tools.
+
+An SBUS frame is 25 bytes long:
+byte 0      start byte (0x0F)
+byte 1-22   16 proportional channels, 11 bit each, LSB first
+byte 23     flags: bit 0/1 digital channels 17/18, bit 2 frame lost, bit 3 failsafe
+byte 24     end byte (0x00)
+"""
+
+SBUS_FRAME_LEN = 25
+SBUS_NUM_CHAN = 18
+SBUS_START_BYTE = 0x0F
+SBUS_END_BYTE = 0x00
+SBUS_FLAGS_BYTE = 23
+
+FLAG_DIGITAL_1 = 0x01
+FLAG_DIGITAL_2 = 0x02
+FLAG_FRAME_LOST = 0x04
+FLAG_FAILSAFE = 0x08
+
+
+def is_frame(buffer, offset:int=0)->bool:
+    """Returns True if start and end byte of the frame at offset are valid."""
+    return buffer[offset] == SBUS_START_BYTE and buffer[offset + SBUS_FRAME_LEN - 1] == SBUS_END_BYTE
+
+
+def decode_channels(frame, channels, offset:int=0, out_offset:int=0)->int:
+    """Unpacks the 16 proportional and 2 digital channels of one frame into channels.
+    Every channel is assembled with a few shifts and masks from the (at most three)
+    bytes it spans, so no per bit iteration is needed and channels are overwritten in place.
+    :param frame: bytes, bytearray or memoryview holding the frame
+    :param channels: array with at least out_offset+18 elements
+    :param offset: index of the start byte in frame
+    :param out_offset: index of the first channel in channels
+    :return: the flags byte of the frame
+    """
+    # 8 channels fit exactly into 11 bytes, so both halves share the same pattern.
+    b = offset + 1
+    c = out_offset
+    for _ in range(2):
+        b0 = frame[b]
+        b1 = frame[b + 1]
+        b2 = frame[b + 2]
+        b3 = frame[b + 3]
+        b4 = frame[b + 4]
+        b5 = frame[b + 5]
+        b6 = frame[b + 6]
+        b7 = frame[b + 7]
+        b8 = frame[b + 8]
+        b9 = frame[b + 9]
+        b10 = frame[b + 10]
+        channels[c] = (b0 | b1 << 8) & 0x07FF
+        channels[c + 1] = (b1 >> 3 | b2 << 5) & 0x07FF
+        channels[c + 2] = (b2 >> 6 | b3 << 2 | b4 << 10) & 0x07FF
+        channels[c + 3] = (b4 >> 1 | b5 << 7) & 0x07FF
+        channels[c + 4] = (b5 >> 4 | b6 << 4) & 0x07FF
+        channels[c + 5] = (b6 >> 7 | b7 << 1 | b8 << 9) & 0x07FF
+        channels[c + 6] = (b8 >> 2 | b9 << 6) & 0x07FF
+        channels[c + 7] = (b9 >> 5 | b10 << 3) & 0x07FF
+        b += 11
+        c += 8
+    flags = frame[offset + SBUS_FLAGS_BYTE]
+    channels[c] = flags & FLAG_DIGITAL_1
+    channels[c + 1] = (flags & FLAG_DIGITAL_2) >> 1
+    return flags
+
+
+def decode_frames(buffer, channels)->int:
+    """Bulk decoding of consecutive 25 byte frames in buffer.
+    Frame n is written to channels[n*18:(n+1)*18], start and end bytes are not validated.
+    :return: number of frames decoded, limited by the size of buffer and channels
+    """
+    count = min(len(buffer) // SBUS_FRAME_LEN, len(channels) // SBUS_NUM_CHAN)
+    offset = 0
+    out_offset = 0
+    for _ in range(count):
+        decode_channels(buffer, channels, offset, out_offset)
+        offset += SBUS_FRAME_LEN
+        out_offset += SBUS_NUM_CHAN
+    return count
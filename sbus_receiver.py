@@ -20,10 +20,12 @@ THE SOFTWARE.
 
 from machine import UART, Pin
 import array
+import sbus_frame
+import instrument
 
 
 class SBUSReceiver:
-    def __init__(self, uart_port):
+    def __init__(self, uart_port, buffer_frames=8):
         self.sbus = UART(uart_port, 100000, tx = Pin(4), rx = Pin(5), bits=8, parity=0, stop=2)
 #       self.sbus.init(rx = Pin(9), baudrate = 100000, bits=8, parity=0, stop=2)
 
@@ -32,7 +34,6 @@ class SBUSReceiver:
         self.END_BYTE = b'00'
         self.SBUS_FRAME_LEN = 25
         self.SBUS_NUM_CHAN = 18
-        self.OUT_OF_SYNC_THD = 10
         self.SBUS_NUM_CHANNELS = 18
         self.SBUS_SIGNAL_OK = 0
         self.SBUS_SIGNAL_LOST = 1
@@ -41,16 +42,32 @@ class SBUSReceiver:
         # Stack Variables initialization
         self.validSbusFrame = 0
         self.lostSbusFrame = 0
-        self.frameIndex = 0
         self.resyncEvent = 0
-        self.outOfSyncCounter = 0
-        self.sbusBuff = bytearray(1)  # single byte used for sync
-        self.sbusFrame = bytearray(25)  # single SBUS Frame
+        self.sbusFrame = bytearray(25)  # last valid SBUS Frame, copied out of rxBuff
         self.sbusChannels = array.array('H', [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])  # RC Channels
         self.isSync = False
-        self.startByteFound = False
+        self.wasSync = False  # the first sync after start up is not counted as resync event
         self.failSafeStatus = self.SBUS_SIGNAL_FAILSAFE
 
+        # Change notification
+        self.sbusLastChannels = array.array('H', [0] * self.SBUS_NUM_CHAN)  # values last reported as changed
+        self.sbusDeadband = array.array('H', [0] * self.SBUS_NUM_CHAN)  # minimum change per channel to be reported
+        self.changedMask = 0  # bit n set if channel n changed with the last decoded frame
+        self.subscribers = []  # [channel mask, callback] pairs
+
+        # Receive buffer: everything the UART holds is read in one go, frames are parsed in place.
+        # Unparsed bytes are moved to the front before each read instead of wrapping around,
+        # so every complete frame stays contiguous and can be handed out as memoryview.
+        self.rxBuff = bytearray(self.SBUS_FRAME_LEN * buffer_frames)
+        self.rxView = memoryview(self.rxBuff)
+        self.rxHead = 0  # first byte not parsed yet
+        self.rxTail = 0  # end of received data
+        self.skippedBytes = 0  # bytes discarded while searching for a frame boundary
+
+        # Measured per call if instrumentation was enabled before creating the receiver
+        if instrument.is_enabled():
+            self.get_new_data = instrument.wrap("SBUS get_new_data", self.get_new_data)
+
     def get_rx_channels(self):
         """
         Used to retrieve the last SBUS channels values reading
@@ -86,103 +103,188 @@ class SBUSReceiver:
 
         return rep
 
-    def decode_frame(self):
-
-        # TODO: DoubleCheck if it has to be removed
-        for i in range(0, self.SBUS_NUM_CHANNELS - 2):
-            self.sbusChannels[i] = 0
+    def get_changed_mask(self):
+        """
+        Used to retrieve which channels changed by more than their deadband with the last decoded frame
+        :return:  an int with bit n set for every changed channel n
+        """
+        return self.changedMask
 
-        # counters initialization
-        byte_in_sbus = 1
-        bit_in_sbus = 0
-        ch = 0
-        bit_in_channel = 0
+    def set_deadband(self, num_ch, deadband):
+        """
+        Sets the minimum change of a channel value to be reported as change, e.g. to ignore stick jitter
+        :param: num_ch: the channel which to set the deadband for
+        :param: deadband: changes less or equal to this value are ignored
+        """
+        self.sbusDeadband[num_ch] = deadband
 
-        for i in range(0, 175):  # TODO Generalization
-            if self.sbusFrame[byte_in_sbus] & (1 << bit_in_sbus):
-                self.sbusChannels[ch] |= (1 << bit_in_channel)
+    def subscribe(self, callback, channel_mask=0x3FFFF):
+        """
+        Registers a callback that is called as callback(num_ch, value) for every changed channel
+        :param: callback: the function to be called
+        :param: channel_mask: bit n set for every channel n the callback is interested in, default all 18
+        """
+        self.subscribers.append([channel_mask, callback])
 
-            bit_in_sbus += 1
-            bit_in_channel += 1
+    def unsubscribe(self, callback):
+        """Removes all subscriptions of callback."""
+        self.subscribers = [sub for sub in self.subscribers if sub[1] != callback]
 
-            if bit_in_sbus == 8:
-                bit_in_sbus = 0
-                byte_in_sbus += 1
+    def update_changes(self):
+        """Compares the decoded channels with the last reported values and notifies the subscribers."""
+        channels = self.sbusChannels
+        last = self.sbusLastChannels
+        deadband = self.sbusDeadband
+        mask = 0
+        for ch in range(self.SBUS_NUM_CHAN):
+            value = channels[ch]
+            if value > last[ch] + deadband[ch] or value + deadband[ch] < last[ch]:
+                last[ch] = value
+                mask |= 1 << ch
+        self.changedMask = mask
+        if mask:
+            for channel_mask, callback in self.subscribers:
+                wanted = mask & channel_mask
+                ch = 0
+                while wanted:
+                    if wanted & 1:
+                        callback(ch, channels[ch])
+                    wanted >>= 1
+                    ch += 1
 
-            if bit_in_channel == 11:
-                bit_in_channel = 0
-                ch += 1
+    def decode_frame(self):
+        """Decodes the frame in sbusFrame into sbusChannels and updates the failsafe status."""
+        flags = sbus_frame.decode_channels(self.sbusFrame, self.sbusChannels)
+        self.update_failsafe(flags)
+        self.update_changes()
 
-        # Decode Digitals Channels
+    def decode_frames(self, buffer):
+        """
+        Decodes consecutive 25 byte frames out of one buffer, e.g. a bulk read from the UART.
+        Invalid frames are counted as lost, sbusChannels holds the last valid frame afterwards.
+        :param buffer: bytes, bytearray or memoryview with a multiple of 25 bytes
+        :return: number of valid frames decoded
+        """
+        decoded = 0
+        for offset in range(0, len(buffer) - self.SBUS_FRAME_LEN + 1, self.SBUS_FRAME_LEN):
+            if sbus_frame.is_frame(buffer, offset):
+                self.validSbusFrame += 1
+                decoded += 1
+                self.update_failsafe(sbus_frame.decode_channels(buffer, self.sbusChannels, offset))
+                self.update_changes()
+            else:
+                self.lostSbusFrame += 1
+        return decoded
 
-        # Digital Channel 1
-        if self.sbusFrame[self.SBUS_FRAME_LEN - 2] & (1 << 0):
-            self.sbusChannels[self.SBUS_NUM_CHAN - 2] = 1
+    def update_failsafe(self, flags):
+        """Sets the failsafe status from the flags byte of a frame."""
+        if flags & sbus_frame.FLAG_FAILSAFE:
+            self.failSafeStatus = self.SBUS_SIGNAL_FAILSAFE
+        elif flags & sbus_frame.FLAG_FRAME_LOST:
+            self.failSafeStatus = self.SBUS_SIGNAL_LOST
         else:
-            self.sbusChannels[self.SBUS_NUM_CHAN - 2] = 0
+            self.failSafeStatus = self.SBUS_SIGNAL_OK
 
-        # Digital Channel 2
-        if self.sbusFrame[self.SBUS_FRAME_LEN - 2] & (1 << 1):
-            self.sbusChannels[self.SBUS_NUM_CHAN - 1] = 1
-        else:
-            self.sbusChannels[self.SBUS_NUM_CHAN - 1] = 0
+    def fill_buffer(self):
+        """
+        Reads all bytes the UART reports as available into the receive buffer with a single readinto.
+        Frames handed out by next_frame() before are invalid afterwards.
+        :return: number of bytes read
+        """
+        available = self.sbus.any()
+        if not available:
+            return 0
+        pending = self.rxTail - self.rxHead
+        if self.rxHead:
+            # Move the unparsed rest to the start, byte by byte: source and destination overlap,
+            # and slice assignment between views of the same buffer is a memcpy on MicroPython.
+            buff = self.rxBuff
+            head = self.rxHead
+            for index in range(pending):
+                buff[index] = buff[head + index]
+            self.rxHead = 0
+            self.rxTail = pending
+        free = len(self.rxBuff) - self.rxTail
+        if free == 0:
+            # Buffer full of unparsed data, the poll loop fell too far behind: start over.
+            self.lostSbusFrame += pending // self.SBUS_FRAME_LEN
+            self.rxHead = 0
+            self.rxTail = 0
+            self.isSync = False
+            free = len(self.rxBuff)
+        if available > 1:  # some ports only report 0 or 1, then read as much as fits
+            free = min(free, available)
+        count = self.sbus.readinto(self.rxView[self.rxTail:self.rxTail + free])
+        if count:
+            self.rxTail += count
+            return count
+        return 0
 
-        # Failsafe
-        self.failSafeStatus = self.SBUS_SIGNAL_OK
-        if self.sbusFrame[self.SBUS_FRAME_LEN - 2] & (1 << 2):
-            self.failSafeStatus = self.SBUS_SIGNAL_LOST
-        if self.sbusFrame[self.SBUS_FRAME_LEN - 2] & (1 << 3):
-            self.failSafeStatus = self.SBUS_SIGNAL_FAILSAFE
+    def find_sync(self):
+        """
+        Scans the receive buffer for the next 0x0F ... 0x00 frame boundary and discards the bytes before it.
+        :return: True if the buffer starts with a complete frame now
+        """
+        buff = self.rxBuff
+        head = self.rxHead
+        last = self.rxTail - self.SBUS_FRAME_LEN
+        while head <= last:
+            if buff[head] == sbus_frame.SBUS_START_BYTE and buff[head + self.SBUS_FRAME_LEN - 1] == sbus_frame.SBUS_END_BYTE:
+                self.skippedBytes += head - self.rxHead
+                self.rxHead = head
+                if self.wasSync:
+                    self.resyncEvent += 1
+                    self.lostSbusFrame += (self.skippedBytes + self.SBUS_FRAME_LEN - 1) // self.SBUS_FRAME_LEN
+                self.skippedBytes = 0
+                self.isSync = True
+                self.wasSync = True
+                return True
+            head += 1
+        self.skippedBytes += head - self.rxHead
+        self.rxHead = head
+        return False
 
-    def get_sync(self):
+    def next_frame(self):
+        """
+        Takes the next complete frame out of the receive buffer, resynchronising if the frame boundary is broken.
+        :return: a memoryview of the frame (valid until the next fill_buffer()) or None
+        """
+        while True:
+            if not self.isSync and not self.find_sync():
+                return None
+            head = self.rxHead
+            if self.rxTail - head < self.SBUS_FRAME_LEN:
+                return None
+            if sbus_frame.is_frame(self.rxBuff, head):
+                self.rxHead = head + self.SBUS_FRAME_LEN
+                self.validSbusFrame += 1
+                return self.rxView[head:self.rxHead]
+            self.isSync = False
 
-        if self.sbus.any() > 0:
-
-            if self.startByteFound:
-                if self.frameIndex == (self.SBUS_FRAME_LEN - 1):
-                    self.sbus.readinto(self.sbusBuff, 1)  # end of frame byte
-                    if self.sbusBuff[0] == 0:  # TODO: Change to use constant var value
-                        self.startByteFound = False
-                        self.isSync = True
-                        self.frameIndex = 0
-#                        return("found sync")
-                else:
-                    self.sbus.readinto(self.sbusBuff, 1)  # keep reading 1 byte until the end of frame
-                    self.frameIndex += 1
-#                    return("start byte found no sync")
-            else:
-                self.frameIndex = 0
-                self.sbus.readinto(self.sbusBuff, 1)  # read 1 byte
-                if self.sbusBuff[0] == 15:  # TODO: Change to use constant var value
-                    self.startByteFound = True
-                    self.frameIndex += 1
+    def get_sync(self):
+        """Reads the UART and searches for the first frame boundary."""
+        self.fill_buffer()
+        if not self.isSync:
+            self.find_sync()
+        return self.isSync
 
     def get_new_data(self):
         """
         This function must be called periodically according to the specific SBUS implementation in order to update
         the channels values.
         For FrSky the period is 300us.
+        All frames received since the last call are consumed, only the latest one is decoded.
         """
-
-        if self.isSync:
-            if self.sbus.any(): # uart.any() returns a 0 or a 1 in this implementation which 'self.sbus.any() >= self.SBUS_FRAME_LEN' would never be true. 3 days working on this. 
-                self.sbus.readinto(self.sbusFrame, self.SBUS_FRAME_LEN)  # read the whole frame
-                if (self.sbusFrame[0] == 15 and self.sbusFrame[
-                    self.SBUS_FRAME_LEN - 1] == 0):  # TODO: Change to use constant var value
-                    self.validSbusFrame += 1
-                    self.outOfSyncCounter = 0
-                    self.decode_frame()
-                    return("decode")
-                else:
-                    self.lostSbusFrame += 1
-                    self.outOfSyncCounter += 1
-
-                if self.outOfSyncCounter > self.OUT_OF_SYNC_THD:
-                    self.isSync = False
-                    self.resyncEvent += 1
-                    
-            return("is synced")       
-        else:
-            self.get_sync()
-
-
+        if not self.get_sync():
+            return None
+        frame = None
+        while True:
+            next_frame = self.next_frame()
+            if next_frame is None:
+                break
+            frame = next_frame
+        if frame is not None:
+            self.sbusFrame[:] = frame  # the view into rxBuff changes with the next fill_buffer()
+            self.decode_frame()
+            return("decode")
+        return("is synced")
@@ -7,22 +7,25 @@ Operational states:
 4 - Towing: All systems operational, towing lights / sign set.
 5 - Fire Fighting: All systems operational, restricted maneuverability indicated.
 """
-import lib.systems as systems
+import lib.boot_plan as boot_plan
+import node
 import utime
 
-class Ship:
-    """Main class to include all systems."""
-    def __init__(self) -> None:
-        #ToDo: Read settings for subsystems from file, initialize all systems.
-        self.ship_length=30 # [m]
-        self.Propulsion=systems.Propulsion()
-        self.NavSignals=systems.NavigationSignals(self.ship_length)
-        self.NavSignals.setup_position_lights(13,2,3,6)
-        self.NavSignals.setup_restricted_manueverability(7,8,9)
-        self.NavSignals.setup_towlights(10,11)
+class Ship(node.Node):
+    """Main class to include all systems, set up from the boot plan of setup_file."""
+    def __init__(self,setup_file:str=boot_plan.SETUP_FILE) -> None:
+        self.Propulsion=None
+        super().__init__(setup_file)
+
+    def build(self,plan:tuple)->None:
+        """Sets up the systems of the plan and the propulsion."""
+        super().build(plan)
+        self.Propulsion=self.Devices.get("Propulsion")()
         
 if __name__=="__main__":
     Schlepper=Ship()
+    Schlepper.start_log()
+    print(Schlepper.get_boot_report())
     Schlepper.NavSignals.setup_dim_poti(26)
     utime.sleep(10)
     Schlepper.NavSignals.debug=True
@@ -0,0 +1,58 @@
+"""Discrete event virtual clock shared by the simulated machine and utime modules.
+Time only advances when the simulation asks for it, events run in time order, so hours of
+operation of a node are simulated as fast as the callbacks can be executed."""
+import heapq
+
+
+class VirtualClock:
+    """Holds the current virtual time [us] and the queue of pending events."""
+    def __init__(self) -> None:
+        self.now_us = 0
+        self._events = []  # heap of (time_us, sequence, callback)
+        self._sequence = 0
+        self._running = False
+        self.events_run = 0
+
+    def reset(self) -> None:
+        """Back to time 0 without pending events."""
+        self.__init__()
+
+    def call_at(self, time_us: int, callback) -> None:
+        """Runs callback() once the virtual time reaches time_us."""
+        self._sequence += 1
+        heapq.heappush(self._events, (time_us, self._sequence, callback))
+
+    def call_later(self, delay_us: int, callback) -> None:
+        """Runs callback() delay_us after now."""
+        self.call_at(self.now_us + delay_us, callback)
+
+    def advance(self, delta_us: int) -> None:
+        """Advances the time by delta_us and runs all events due until then."""
+        self.run_until(self.now_us + delta_us)
+
+    def run_until(self, time_us: int) -> None:
+        """Runs all events up to time_us in order, the clock ends at time_us."""
+        if self._running:
+            # Sleeping inside a callback: only let time pass, the outer loop runs the events.
+            self.now_us = max(self.now_us, time_us)
+            return
+        self._running = True
+        try:
+            events = self._events
+            while events and events[0][0] <= time_us:
+                event_time, sequence, callback = heapq.heappop(events)
+                if event_time > self.now_us:
+                    self.now_us = event_time
+                self.events_run += 1
+                callback()
+            if time_us > self.now_us:
+                self.now_us = time_us
+        finally:
+            self._running = False
+
+    def pending(self) -> int:
+        """Number of queued events."""
+        return len(self._events)
+
+
+clock = VirtualClock()
@@ -0,0 +1,332 @@
+"""Host side stand-in for the MicroPython machine module, running on the virtual clock in clock.py.
+Put this directory first on sys.path to run rctools code on Linux.
+
+Inputs are scripted per pin number and outputs are recorded, for example:
+    machine.script_adc(27, lambda t: 20000 if 60 < t < 90 else 40000)  # t in seconds
+    machine.script_pin_edges(22, [(1000, 1), (1500, 0)])  # (time [us], level)
+    utime.sleep(3600)  # one hour of virtual time
+    machine.pwm_log(2)  # [(time [us], duty_u16), ...]
+    machine.attach_i2c(0x40)  # I2C device answering at address 0x40, its registers in machine.i2c_memory(0x40)
+"""
+from clock import clock
+
+_adc_sources = {}  # pin id -> constant, list (cycled per read) or function of the time [s]
+_pins = {}  # pin id -> Pin, the latest instance created for a pin id
+_pwm_logs = {}  # pin id -> [(time_us, duty_u16)]
+_pwms = {}  # pin id -> PWM
+_record_pwm = [True]
+_i2c_devices = {}  # address -> bytearray of the device registers
+
+
+def reset() -> None:
+    """Removes all scripted inputs and recorded outputs and resets the virtual clock."""
+    _adc_sources.clear()
+    _pins.clear()
+    _pwm_logs.clear()
+    _pwms.clear()
+    _i2c_devices.clear()
+    _record_pwm[0] = True
+    clock.reset()
+
+
+def script_adc(pin_id, source) -> None:
+    """Sets the values read by ADC(Pin(pin_id)): a number, a list cycled on every read,
+    or a function called with the virtual time in seconds."""
+    _adc_sources[pin_id] = source
+
+
+def script_pin_edges(pin_id, edges) -> None:
+    """Schedules level changes [(time_us, level), ...] on an input pin, firing its irq handler."""
+    for time_us, level in edges:
+        clock.call_at(time_us, lambda level=level: _get_pin(pin_id)._set_level(level))
+
+
+def record_pwm(enabled: bool) -> None:
+    """Switches recording of PWM duty changes on or off, e.g. for benchmarks."""
+    _record_pwm[0] = enabled
+
+
+def pwm_log(pin_id) -> list:
+    """Returns the recorded [(time_us, duty_u16), ...] changes of a PWM output."""
+    return _pwm_logs.get(pin_id, [])
+
+
+def pwm_duty(pin_id) -> int:
+    """Returns the current duty_u16 of a PWM output."""
+    pwm = _pwms.get(pin_id)
+    return pwm._duty if pwm is not None else 0
+
+
+def pwm_outputs() -> dict:
+    """Returns the recorded duty changes of all PWM outputs by pin id."""
+    return dict(_pwm_logs)
+
+
+def attach_i2c(address: int, size: int = 256) -> bytearray:
+    """Adds a device at address to every I2C bus, returns its register memory."""
+    _i2c_devices[address] = bytearray(size)
+    return _i2c_devices[address]
+
+
+def i2c_memory(address: int) -> bytearray:
+    """Returns the register memory of an attached I2C device."""
+    return _i2c_devices[address]
+
+
+def _get_pin(pin_id):
+    if pin_id not in _pins:
+        Pin(pin_id)
+    return _pins[pin_id]
+
+
+def _pin_id(pin):
+    return pin.id if isinstance(pin, Pin) else pin
+
+
+class Pin:
+    """GPIO with scripted input level and irq handlers."""
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None) -> None:
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self._level = value if value is not None else 0
+        self._handler = None
+        self._trigger = 0
+        _pins[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None) -> None:
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self._level = value
+
+    def value(self, level=None):
+        if level is None:
+            return self._level
+        self._level = 1 if level else 0
+
+    def on(self) -> None:
+        self._level = 1
+
+    def off(self) -> None:
+        self._level = 0
+
+    def toggle(self) -> None:
+        self._level ^= 1
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False) -> None:
+        self._handler = handler
+        self._trigger = trigger
+
+    def _set_level(self, level: int) -> None:
+        old = self._level
+        self._level = level
+        if self._handler is None or old == level:
+            return
+        if (level and self._trigger & self.IRQ_RISING) or (not level and self._trigger & self.IRQ_FALLING):
+            self._handler(self)
+
+
+class ADC:
+    """ADC returning the values scripted with script_adc() for its pin."""
+    def __init__(self, pin) -> None:
+        self.pin_id = _pin_id(pin)
+        self._reads = 0
+
+    def read_u16(self) -> int:
+        source = _adc_sources.get(self.pin_id, 0)
+        self._reads += 1
+        if callable(source):
+            value = source(clock.now_us / 1000000)
+        elif isinstance(source, (list, tuple)):
+            value = source[(self._reads - 1) % len(source)]
+        else:
+            value = source
+        return max(0, min(65535, int(value)))
+
+
+class PWM:
+    """PWM output recording every duty change with its virtual time."""
+    def __init__(self, pin, freq=0, duty_u16=0) -> None:
+        self.pin_id = _pin_id(pin)
+        self._freq = freq
+        self._duty = 0
+        self.writes = 0  # duty_u16 calls, changed or not
+        _pwms[self.pin_id] = self
+        _pwm_logs.setdefault(self.pin_id, [])
+        if duty_u16:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self.writes += 1
+        value = int(value)
+        if value != self._duty:
+            self._duty = value
+            if _record_pwm[0]:
+                _pwm_logs[self.pin_id].append((clock.now_us, value))
+
+    def deinit(self) -> None:
+        self.duty_u16(0)
+
+
+class I2C:
+    """I2C controller writing to the register memory of attached devices (attach_i2c()).
+    Counts transactions and bytes on the bus, address and register bytes included, and the bus time
+    they would take at freq: 9 clocks per byte plus about 2 for start and stop condition."""
+    def __init__(self, id=0, scl=None, sda=None, freq=400000) -> None:
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_us = 0.0
+
+    def _transfer(self, address: int, count: int) -> bytearray:
+        if address not in _i2c_devices:
+            raise OSError(19)  # ENODEV, no acknowledge from address
+        self.transactions += 1
+        self.bytes += count
+        self.bus_us += (9 * count + 2) * 1000000 / self.freq
+        return _i2c_devices[address]
+
+    def reset_counters(self) -> None:
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_us = 0.0
+
+    def scan(self) -> list:
+        return sorted(_i2c_devices)
+
+    def writeto(self, addr, buf, stop=True) -> int:
+        memory = self._transfer(addr, 1 + len(buf))
+        if len(buf):
+            memory[buf[0]:buf[0] + len(buf) - 1] = bytes(buf[1:])
+        return len(buf)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8) -> None:
+        memory = self._transfer(addr, 2 + len(buf))
+        if memaddr + len(buf) > len(memory):
+            raise OSError(5)  # EIO
+        memory[memaddr:memaddr + len(buf)] = bytes(buf)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8) -> None:
+        memory = self._transfer(addr, 3 + len(buf))  # write of the register, repeated start, read
+        buf[:] = memory[memaddr:memaddr + len(buf)]
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8) -> bytes:
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+
+class Timer:
+    """Virtual timer, periodic or one shot callbacks are run by the virtual clock."""
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1) -> None:
+        self.callback = None
+        self.mode = self.PERIODIC
+        self.period_us = 0
+        self._generation = 0  # invalidates events queued before the last init/deinit
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None) -> None:
+        self.mode = mode
+        self.period_us = int(1000000 / freq) if freq > 0 else int(period * 1000)
+        self.callback = callback
+        self._generation += 1
+        self._schedule(self._generation)
+
+    def deinit(self) -> None:
+        self.callback = None
+        self._generation += 1
+
+    def _schedule(self, generation: int) -> None:
+        clock.call_later(max(self.period_us, 1), lambda: self._expire(generation))
+
+    def _expire(self, generation: int) -> None:
+        if generation != self._generation or self.callback is None:
+            return
+        if self.mode == self.PERIODIC:
+            self._schedule(generation)
+        self.callback(self)
+
+    def fire(self) -> None:
+        """Runs the callback once right now, as if the timer expired."""
+        if self.callback is not None:
+            self.callback(self)
+
+
+class UART:
+    """UART that returns scripted data.
+    load_chunks(): every chunk is released as one burst when the previous one has been read (replay at full speed).
+    script_rx(): chunks arrive at their virtual time stamps."""
+    def __init__(self, id, baudrate=9600, **kwargs) -> None:
+        self.id = id
+        self.baudrate = baudrate
+        self.chunks = []
+        self.chunk_index = 0
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.polls = 0
+
+    def load_chunks(self, chunks) -> None:
+        """Queue a list of bytes objects to be received."""
+        self.chunks = chunks
+        self.chunk_index = 0
+        self.rx = bytearray()
+
+    def feed(self, data) -> None:
+        """Append data to the next chunk to be received."""
+        self.chunks.append(bytes(data))
+
+    def script_rx(self, chunks) -> None:
+        """Schedules [(time_us, bytes), ...] to arrive in the receive buffer at their virtual time."""
+        for time_us, data in chunks:
+            clock.call_at(time_us, lambda data=data: self.rx.extend(data))
+
+    def exhausted(self) -> bool:
+        """True if all scripted data has been read."""
+        return not self.rx and self.chunk_index >= len(self.chunks)
+
+    def any(self) -> int:
+        self.polls += 1
+        if not self.rx and self.chunk_index < len(self.chunks):
+            self.rx = bytearray(self.chunks[self.chunk_index])
+            self.chunk_index += 1
+        return len(self.rx)
+
+    def readinto(self, buf, nbytes=None):
+        count = len(buf) if nbytes is None else min(nbytes, len(buf))
+        count = min(count, len(self.rx))
+        if count == 0:
+            return None
+        buf[0:count] = self.rx[0:count]
+        del self.rx[0:count]
+        return count
+
+    def read(self, nbytes=None):
+        count = len(self.rx) if nbytes is None else min(nbytes, len(self.rx))
+        if count == 0:
+            return None
+        data = bytes(self.rx[0:count])
+        del self.rx[0:count]
+        return data
+
+    def write(self, buf) -> int:
+        self.tx.extend(buf)
+        return len(buf)
@@ -0,0 +1,26 @@
+"""Host side stand-in for the MicroPython micropython module."""
+
+
+def const(expr):
+    return expr
+
+
+def schedule(func, arg) -> None:
+    """Runs func(arg) right away, on the board it runs as soon as the current callback returns."""
+    func(arg)
+
+
+def heap_lock() -> int:
+    return 0
+
+
+def heap_unlock() -> int:
+    return 0
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
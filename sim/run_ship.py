@@ -0,0 +1,127 @@
+"""Runs a ship configuration on the simulated hardware, faster than real time.
+
+    python3 sim/run_ship.py --hours 6
+
+The ship is set up from setup.json. Scripted inputs: a slowly turned dimmer potentiometer, water
+entering the bilge now and then, nightfall and some towing. All PWM outputs are recorded and summarised at the end.
+The dimmer has a max alarm at its end stop, the run fails if its alarms are not dispatched and logged by the
+node while the ship is running.
+Callbacks take no virtual time, so the scheduler load report only counts ticks and tasks here.
+"""
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+
+import machine
+import utime
+from clock import clock
+
+SETUP_FILE = os.path.dirname(os.path.abspath(__file__)) + "/../setup.json"
+DIM_POTI_PIN = 26
+WATER_PIN = 27  # water detector pin of the compartments in setup.json
+DIM_ALARM = 60000  # max alarm of the dimmer, reached once per turn
+
+
+def dimmer_waveform(t: float) -> float:
+    """Potentiometer turned back and forth every 10 minutes, with some ADC noise."""
+    return 32768 + 30000 * math.sin(2 * math.pi * t / 600) + 300 * math.sin(t * 977)
+
+
+def water_waveform(t: float) -> int:
+    """Water detector goes wet for 20 s every 15 minutes."""
+    return 10000 if t % 900 < 20 else 50000
+
+
+def on_time(log, end_us: int) -> int:
+    """Time [us] a PWM output spent with a duty above 0, from its recorded changes."""
+    total = 0
+    since = None
+    for time_us, duty in log:
+        if duty and since is None:
+            since = time_us
+        elif not duty and since is not None:
+            total += time_us - since
+            since = None
+    if since is not None:
+        total += end_us - since
+    return total
+
+
+def alarms_logged(console: io.StringIO) -> dict:
+    """Alarm events recorded and dispatched so far, and the alarm lines printed by the log."""
+    import general
+    rep = general.alarm_events.get_report()
+    rep['Logged'] = console.getvalue().count("set Alarm point")
+    return rep
+
+
+def run(hours: float = 1, instrumented: bool = False) -> dict:
+    machine.reset()
+    machine.script_adc(DIM_POTI_PIN, dimmer_waveform)
+    machine.script_adc(WATER_PIN, water_waveform)
+    import ship_mgt
+    import general
+    import scheduler
+    import instrument
+    import log
+    if instrumented:
+        instrument.enable()
+    console = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(console):
+        boot_start = time.perf_counter()
+        ship = ship_mgt.Ship(SETUP_FILE)
+        boot_wall = time.perf_counter() - boot_start
+        ship.start_log()
+        ship.NavSignals.setup_dim_poti(DIM_POTI_PIN)
+        ship.NavSignals.DimPotentiometer.set_limits(0, 65535)
+        ship.NavSignals.DimPotentiometer.set_max_alarm(DIM_ALARM)
+        ship.start_bilge_systems()
+        nav = ship.NavSignals
+        nav.start_moving()
+        clock.call_at(30 * 60 * 1000000, nav.set_darkness)
+        for hour in range(int(hours) + 1):
+            clock.call_at((hour * 3600 + 40 * 60) * 1000000, nav.start_towing)
+            clock.call_at((hour * 3600 + 50 * 60) * 1000000, nav.stop_towing)
+        midway = {}
+        clock.call_at(int(hours * 1800 * 1000000), lambda: midway.update(alarms_logged(console)))
+        utime.sleep(hours * 3600)
+        log.drain()
+    wall = time.perf_counter() - start
+    outputs = {}
+    for pin_id, changes in machine.pwm_outputs().items():
+        outputs[pin_id] = {'changes': len(changes), 'on [s]': round(on_time(changes, clock.now_us) / 1000000, 1)}
+    report = {}
+    report['Simulated [s]'] = clock.now_us / 1000000
+    report['Wall [s]'] = round(wall, 2)
+    report['Speedup'] = int(clock.now_us / 1000000 / wall) if wall > 0 else 0
+    report['Events'] = clock.events_run
+    report['Boot'] = ship.get_boot_report()
+    report['Boot']['Wall [ms]'] = round(boot_wall * 1000, 2)
+    report['Console Lines'] = console.getvalue().count("\n")
+    report['Scheduler'] = scheduler.get_scheduler().get_load_report()
+    report['Alarms'] = general.alarm_events.get_report()
+    report['Alarms']['Midway'] = midway
+    assert midway['Recorded'] and midway['Logged'] == midway['Dispatched'] == midway['Recorded'], \
+        "Alarms were not dispatched and logged while the ship was running."
+    report['Log'] = log.get_report()
+    report['PWM Outputs'] = outputs
+    if instrumented:
+        report['Callbacks'] = instrument.get_report()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    base = sys.path[0] + "/.."
+    sys.path.append(base)
+    sys.path.append(base + "/lib")
+    parser = argparse.ArgumentParser(description="Run a ship on the virtual clock.")
+    parser.add_argument('--hours', type=float, default=1)
+    parser.add_argument('--instrument', action='store_true', help="report per callback latency and jitter")
+    args = parser.parse_args()
+    print(json.dumps(run(args.hours, args.instrument), indent=2))
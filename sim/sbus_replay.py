@@ -0,0 +1,215 @@
+"""Record and replay raw SBUS byte streams to test SBUSReceiver without hardware.
+
+Capture file format (little endian):
+    header  8 bytes  b'SBUSCAP' + format version (1)
+    chunk   uint32 timestamp [us], uint16 length, length bytes as received by one UART read
+Chunks keep the burst structure of the original stream, so replaying them through the
+simulated UART reproduces what the poll loop saw on the receiver.
+
+Usage on the host:
+    python3 sim/sbus_replay.py generate capture.sbus --frames 20000 --corrupt-every 50 --drop-every 70
+    python3 sim/sbus_replay.py replay capture.sbus
+    python3 sim/sbus_replay.py replay sim/captures/regression.sbus --expect sim/captures/regression.json
+
+sim/captures/regression.sbus is a small seeded capture with corrupted and shortened frames and failsafe
+flags, regression.json holds the options it was generated with and the counters its replay has to give.
+--expect exits with 1 if they differ, benchmarks/run.py --check runs the same check. After an intended
+change of the parser, --save-expected stores the new counters.
+"""
+import json
+import os
+import struct
+import sys
+
+CAPTURES = os.path.dirname(os.path.abspath(__file__)) + "/captures"
+REGRESSION_CAPTURE = CAPTURES + "/regression.sbus"
+REGRESSION_EXPECTED = CAPTURES + "/regression.json"
+EXPECTED_COUNTERS = ('Valid Frames', 'Lost Frames', 'Resync Events', 'Polls', 'Failsafe Decodes', 'Last Channels')
+
+CAPTURE_MAGIC = b'SBUSCAP\x01'
+CHUNK_HEADER = '<IH'
+CHUNK_HEADER_LEN = 6
+FRAME_PERIOD_US = 7000  # high speed mode, 14000 in analog mode
+
+
+def write_capture(filename: str, chunks) -> None:
+    """Writes a list of (timestamp_us, bytes) tuples as capture file."""
+    with open(filename, 'wb') as f:
+        f.write(CAPTURE_MAGIC)
+        for timestamp, data in chunks:
+            f.write(struct.pack(CHUNK_HEADER, timestamp, len(data)))
+            f.write(data)
+
+
+def read_capture(filename: str):
+    """Returns the chunks of a capture file as list of (timestamp_us, bytes) tuples."""
+    with open(filename, 'rb') as f:
+        content = f.read()
+    if content[0:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError(filename + " is not a SBUS capture file.")
+    chunks = []
+    offset = len(CAPTURE_MAGIC)
+    while offset + CHUNK_HEADER_LEN <= len(content):
+        timestamp, length = struct.unpack_from(CHUNK_HEADER, content, offset)
+        offset += CHUNK_HEADER_LEN
+        chunks.append((timestamp, content[offset:offset + length]))
+        offset += length
+    return chunks
+
+
+def record(uart, filename: str, duration_ms: int) -> int:
+    """Records everything received on uart for duration_ms into a capture file (runs on the board).
+    :return: number of chunks recorded"""
+    import utime
+    buff = bytearray(256)
+    chunks = []
+    start = utime.ticks_us()
+    while utime.ticks_diff(utime.ticks_us(), start) < duration_ms * 1000:
+        if uart.any():
+            count = uart.readinto(buff)
+            if count:
+                chunks.append((utime.ticks_diff(utime.ticks_us(), start), bytes(buff[0:count])))
+    write_capture(filename, chunks)
+    return len(chunks)
+
+
+def encode_frame(channels, flags: int = 0) -> bytearray:
+    """Packs 16 channel values of 11 bit into a 25 byte SBUS frame."""
+    frame = bytearray(25)
+    frame[0] = 0x0F
+    bits = 0
+    for ch in range(16):
+        bits |= (channels[ch] & 0x07FF) << (11 * ch)
+    for i in range(22):
+        frame[1 + i] = (bits >> (8 * i)) & 0xFF
+    frame[23] = flags
+    frame[24] = 0x00
+    return frame
+
+
+def generate(frames: int = 10000, frames_per_chunk: int = 1, corrupt_every: int = 0, drop_every: int = 0,
+             failsafe_every: int = 0, seed: int = 1):
+    """Generates a deterministic stream of frames with sweeping stick positions and injected errors.
+    corrupt_every: every n-th frame gets a broken end byte
+    drop_every: every n-th frame loses one byte
+    failsafe_every: every n-th frame has the failsafe flag set
+    :return: (chunks, injected) with injected counting the errors put into the stream
+    """
+    import random
+    rnd = random.Random(seed)
+    injected = {'Frames': frames, 'Corrupted Frames': 0, 'Dropped Bytes': 0, 'Failsafe Frames': 0}
+    chunks = []
+    pending = bytearray()
+    channels = [992] * 16
+    for n in range(1, frames + 1):
+        for ch in range(16):
+            # Sticks sweep slowly between 172 and 1811, the usual SBUS range.
+            channels[ch] = 172 + (n * (ch + 1) * 3) % 1640
+        flags = 0
+        if failsafe_every and n % failsafe_every == 0:
+            flags |= 0x08
+            injected['Failsafe Frames'] += 1
+        frame = encode_frame(channels, flags)
+        if corrupt_every and n % corrupt_every == 0:
+            frame[24] = rnd.randrange(1, 256)
+            injected['Corrupted Frames'] += 1
+        if drop_every and n % drop_every == 0:
+            del frame[rnd.randrange(0, 25)]
+            injected['Dropped Bytes'] += 1
+        pending.extend(frame)
+        if n % frames_per_chunk == 0 or n == frames:
+            chunks.append((n * FRAME_PERIOD_US, bytes(pending)))
+            pending = bytearray()
+    return chunks, injected
+
+
+def replay(chunks, receiver=None):
+    """Replays chunks through SBUSReceiver.get_new_data at maximum speed.
+    :return: report dict with decoded frames per second and the receiver counters
+    """
+    import time
+    if receiver is None:
+        import sbus_receiver
+        receiver = sbus_receiver.SBUSReceiver(0)
+    receiver.sbus.load_chunks([data for timestamp, data in chunks])
+    failsafe_polls = 0
+    polls = 0
+    start = time.perf_counter()
+    while not receiver.sbus.exhausted():
+        if receiver.get_new_data() == "decode":
+            if receiver.get_failsafe_status() == receiver.SBUS_SIGNAL_FAILSAFE:
+                failsafe_polls += 1
+        polls += 1
+    elapsed = time.perf_counter() - start
+    report = receiver.get_rx_report()
+    report['Polls'] = polls
+    report['Failsafe Decodes'] = failsafe_polls
+    report['Last Channels'] = list(receiver.get_rx_channels())
+    report['Frames/s'] = int(report['Valid Frames'] / elapsed) if elapsed > 0 else 0
+    return report
+
+
+def compare(report: dict, expected: dict) -> list:
+    """Returns a message for every counter of expected that the replay report does not match."""
+    return [name + ": " + str(report.get(name)) + ", expected " + str(expected[name])
+            for name in EXPECTED_COUNTERS if name in expected and report.get(name) != expected[name]]
+
+
+def check_capture(capture: str = REGRESSION_CAPTURE, expected_file: str = REGRESSION_EXPECTED) -> list:
+    """Replays capture and compares the counters with the 'Expected' entry of expected_file."""
+    with open(expected_file) as f:
+        expected = json.load(f)['Expected']
+    return [os.path.basename(capture) + " " + message for message in compare(replay(read_capture(capture)), expected)]
+
+
+def save_expected(report: dict, expected_file: str) -> None:
+    """Stores the counters of report as 'Expected' entry of expected_file, other entries are kept."""
+    content = {}
+    if os.path.exists(expected_file):
+        with open(expected_file) as f:
+            content = json.load(f)
+    content['Expected'] = {name: report[name] for name in EXPECTED_COUNTERS}
+    with open(expected_file, 'w') as f:
+        f.write(json.dumps(content, indent=2) + "\n")
+
+
+def main(argv) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Record/replay harness for SBUSReceiver.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help="write a synthetic capture file")
+    gen.add_argument('filename')
+    gen.add_argument('--frames', type=int, default=10000)
+    gen.add_argument('--frames-per-chunk', type=int, default=1)
+    gen.add_argument('--corrupt-every', type=int, default=0)
+    gen.add_argument('--drop-every', type=int, default=0)
+    gen.add_argument('--failsafe-every', type=int, default=0)
+    gen.add_argument('--seed', type=int, default=1)
+    rep = commands.add_parser('replay', help="replay a capture file through SBUSReceiver")
+    rep.add_argument('filename')
+    rep.add_argument('--expect', metavar='FILE', help="exit with 1 if the counters differ from the expected ones")
+    rep.add_argument('--save-expected', metavar='FILE', help="store the counters as the expected ones")
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        chunks, injected = generate(args.frames, args.frames_per_chunk, args.corrupt_every, args.drop_every,
+                                    args.failsafe_every, args.seed)
+        write_capture(args.filename, chunks)
+        print(json.dumps(injected))
+        return 0
+    report = replay(read_capture(args.filename))
+    print(json.dumps(report))
+    if args.save_expected:
+        save_expected(report, args.save_expected)
+    if args.expect:
+        with open(args.expect) as f:
+            mismatches = compare(report, json.load(f)['Expected'])
+        for message in mismatches:
+            print(message, file=sys.stderr)
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.append(sys.path[0] + "/..")
+    sys.path.append(sys.path[0] + "/../lib")  # instrument, imported by sbus_receiver
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""Host side stand-in for the MicroPython utime module, running on the virtual clock in clock.py.
+Sleeping advances the virtual time and runs all timers, pin edges etc. due meanwhile."""
+from clock import clock
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def ticks_ms() -> int:
+    return (clock.now_us // 1000) % _TICKS_PERIOD
+
+
+def ticks_us() -> int:
+    return clock.now_us % _TICKS_PERIOD
+
+
+def ticks_cpu() -> int:
+    return ticks_us()
+
+
+def ticks_add(ticks: int, delta: int) -> int:
+    return (ticks + delta) % _TICKS_PERIOD
+
+
+def ticks_diff(ticks1: int, ticks2: int) -> int:
+    diff = (ticks1 - ticks2) % _TICKS_PERIOD
+    if diff >= _TICKS_HALFPERIOD:
+        diff -= _TICKS_PERIOD
+    return diff
+
+
+def time() -> int:
+    return clock.now_us // 1000000
+
+
+def sleep(seconds: float) -> None:
+    clock.advance(int(seconds * 1000000))
+
+
+def sleep_ms(ms: int) -> None:
+    clock.advance(int(ms * 1000))
+
+
+def sleep_us(us: int) -> None:
+    clock.advance(int(us))